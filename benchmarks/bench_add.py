@@ -0,0 +1,56 @@
+"""
+Compare serial and parallel staging of a synthetic tree.
+
+    python benchmarks/bench_add.py --files 2000 --size 65536 --workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.index import Index
+
+
+def make_tree(root: Path, files: int, size: int) -> None:
+    for i in range(files):
+        path = root / "data" / f"d{i % 64:02d}" / f"f{i}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size))
+
+
+def stage(workers: int, files: int, size: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository.init(root)
+        make_tree(root, files, size)
+
+        start = time.perf_counter()
+        Index(repo).add_many([root / "data"], ObjectStore(repo), workers=workers)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    total_mb = args.files * args.size / 1e6
+    serial = stage(1, args.files, args.size)
+    parallel = stage(args.workers, args.files, args.size)
+
+    print(f"{args.files} files, {total_mb:.1f} MB")
+    print(f"serial:              {serial:.3f}s ({total_mb / serial:.1f} MB/s)")
+    print(f"parallel ({args.workers:2d} thr):   {parallel:.3f}s ({total_mb / parallel:.1f} MB/s)")
+    print(f"speedup:             {serial / parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
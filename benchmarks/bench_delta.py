@@ -0,0 +1,94 @@
+"""
+Measure delta compression on a generated history: one large config file
+committed in many slightly different revisions.
+
+    python benchmarks/bench_delta.py --revisions 1000 --lines 5000
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.commit import create_commit
+from vcs.repack import object_names
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def read_latency(repo: Repository, hashes, samples: int) -> float:
+    rng = random.Random(1)
+    picks = [rng.choice(hashes) for _ in range(samples)]
+    store = ObjectStore(repo)  # cold delta-base cache
+    start = time.perf_counter()
+    for h in picks:
+        store.load(h)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revisions", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    lines = [f"option_{i} = {rng.randint(0, 10**6)}\n" for i in range(args.lines)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository.init(root)
+        store = ObjectStore(repo)
+        config = root / "app.conf"
+        blobs = []
+
+        start = time.perf_counter()
+        for rev in range(args.revisions):
+            for _ in range(3):
+                lines[rng.randrange(len(lines))] = f"option_r{rev} = {rng.randint(0, 10**6)}\n"
+            config.write_text("".join(lines))
+            index = Index(repo)
+            index.add(config, store)
+            blobs.append(index.entries["app.conf"].hash)
+            create_commit(repo, f"revision {rev}")
+        print(f"generated {args.revisions} revisions in {time.perf_counter() - start:.1f}s")
+
+        raw_total = sum(len(store.load(h)) for h in set(blobs))
+        loose = dir_size(repo.objects_dir)
+
+        names = object_names(repo, store)
+        start = time.perf_counter()
+        stats = store.repack(names=names, window=0)
+        plain_time = time.perf_counter() - start
+        plain = dir_size(repo.objects_dir)
+        plain_latency = read_latency(repo, blobs, args.samples)
+
+        start = time.perf_counter()
+        stats = store.repack(full=True, names=names)
+        delta_time = time.perf_counter() - start
+        packed = dir_size(repo.objects_dir)
+        delta_latency = read_latency(repo, blobs, args.samples)
+
+        print(f"uncompressed blob bytes: {raw_total / 1e6:9.2f} MB")
+        print(f"loose objects (zlib):    {loose / 1e6:9.2f} MB")
+        print(f"pack, no deltas:         {plain / 1e6:9.2f} MB  packed in {plain_time:.2f}s, "
+              f"read {plain_latency:.0f} us/blob")
+        print(f"pack, deltas:            {packed / 1e6:9.2f} MB  packed in {delta_time:.2f}s, "
+              f"read {delta_latency:.0f} us/blob ({stats.deltas} deltas)")
+        print(f"ratio vs loose:          {loose / packed:9.1f}x")
+        print(f"ratio vs raw:            {raw_total / packed:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
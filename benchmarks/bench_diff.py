@@ -0,0 +1,58 @@
+"""
+Measure the line diff engine on two large generated files with many
+scattered edits, against difflib.
+
+    python benchmarks/bench_diff.py --lines 200000 --edits 5000
+"""
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.linediff import unified_diff
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--edits", type=int, default=5000)
+    parser.add_argument("--skip-difflib", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    old = [f"value_{i} = {rng.randint(0, 10**9)}\n" for i in range(args.lines)]
+    new = list(old)
+    for _ in range(args.edits):
+        i = rng.randrange(len(new))
+        op = rng.random()
+        if op < 0.4:
+            new[i] = f"changed {rng.random()}\n"
+        elif op < 0.7:
+            del new[i]
+        else:
+            new.insert(i, f"inserted {rng.random()}\n")
+
+    old_data = "".join(old).encode()
+    new_data = "".join(new).encode()
+
+    start = time.perf_counter()
+    text = unified_diff(old_data, new_data, "generated.txt")
+    elapsed = time.perf_counter() - start
+    print(f"{args.lines} lines, {args.edits} edits, {len(text)} bytes of diff")
+    print(f"pyvcs diff: {elapsed:6.2f} s")
+
+    if not args.skip_difflib:
+        start = time.perf_counter()
+        "".join(difflib.unified_diff(
+            old_data.decode().splitlines(keepends=True),
+            new_data.decode().splitlines(keepends=True),
+        ))
+        print(f"difflib:    {time.perf_counter() - start:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
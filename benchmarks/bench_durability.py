@@ -0,0 +1,60 @@
+"""
+Cost of each core.durability mode: stage and commit a tree of small
+files with none, batch and full.
+
+    python benchmarks/bench_durability.py --files 2000 --dir /path/on/disk
+
+fsync is nearly free on tmpfs, so point --dir at the filesystem the
+repositories will live on.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.commit import create_commit
+from vcs.utils import DURABILITY_MODES
+
+
+def run(mode: str, files: int, size: int, base: str, workers: int) -> float:
+    with tempfile.TemporaryDirectory(dir=base) as tmp:
+        root = Path(tmp)
+        repo = Repository.init(root)
+        repo.config.set("core.durability", mode)
+        for i in range(files):
+            path = root / "data" / f"d{i % 64:02d}" / f"f{i}.txt"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(os.urandom(size))
+
+        start = time.perf_counter()
+        Index(repo).add_many([root / "data"], ObjectStore(repo), workers=workers)
+        create_commit(repo, "benchmark")
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--dir", default=None, help="where to create the repositories")
+    args = parser.parse_args()
+
+    print(f"{args.files} files of {args.size} bytes, add + commit")
+    baseline = None
+    for mode in DURABILITY_MODES:
+        elapsed = run(mode, args.files, args.size, args.dir, args.workers)
+        baseline = baseline or elapsed
+        per_file = elapsed / args.files * 1e6
+        print(f"{mode:6s} {elapsed:8.3f}s  {per_file:8.1f} us/file  {elapsed / baseline:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Garbage collection of a repository with many objects.
+
+    python benchmarks/bench_gc.py --objects 100000 1000000
+
+For each size, half the loose blobs are committed, in directories of
+1000 files, and the other half are unreachable. Reports the time gc
+takes to mark and prune them, the memory it allocates, and the memory a
+Python set of the object hashes would take for comparison.
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.objects import Commit, Tree, TreeEntry
+from vcs.refs import update_ref
+from vcs.gc import gc
+
+DIR_SIZE = 1000
+
+
+def populate(repo: Repository, count: int) -> None:
+    repo.config.set("core.durability", "none")
+    repo.config.set("core.compression", "none")
+    store = ObjectStore(repo)
+    with store.batch():
+        reachable = [store.store(f"blob {i}\n".encode()) for i in range(0, count, 2)]
+        for i in range(1, count, 2):
+            store.store(f"blob {i}\n".encode())
+
+        dirs = {}
+        for start in range(0, len(reachable), DIR_SIZE):
+            entries = {
+                f"f{i}.txt": TreeEntry("blob", h)
+                for i, h in enumerate(reachable[start:start + DIR_SIZE])
+            }
+            dirs[f"d{start // DIR_SIZE}"] = TreeEntry("tree", Tree(entries).store(store))
+        commit = Commit.create(Tree(dirs).store(store), "objects").store(store)
+    update_ref(repo, repo.head_ref_path(), commit)
+    # Write the index, which is otherwise seeded from HEAD on each load
+    index = Index(repo)
+    path, entry = next(iter(index.entries.items()))
+    index.update_entries({path: entry})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for count in args.objects:
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = Repository.init(Path(tmp))
+            populate(repo, count)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            stats = gc(repo, prune_expire=0)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            tracemalloc.start()
+            hashes = {f"{i:040x}" for i in range(stats.objects)}
+            as_set = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del hashes
+
+            print(
+                f"{stats.objects} objects, {stats.reachable} reachable, {stats.pruned} pruned "
+                f"({stats.bytes_reclaimed / 1e6:.1f} MB): gc {elapsed:6.2f} s, "
+                f"peak {peak / 1e6:7.1f} MB (set of hashes: {as_set / 1e6:7.1f} MB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
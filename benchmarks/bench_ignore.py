@@ -0,0 +1,97 @@
+"""
+Measure ignore matching: a generated .pyvcsignore of many patterns
+checked against many paths, compiled matcher vs one fnmatch per pattern.
+
+    python benchmarks/bench_ignore.py --patterns 200 --paths 500000
+"""
+import argparse
+import fnmatch
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.ignore import IgnoreRules
+
+
+EXTENSIONS = ["py", "js", "ts", "c", "h", "o", "log", "tmp", "md", "json", "pyc", "so"]
+DIRS = ["src", "lib", "build", "dist", "node_modules", "docs", "tests", "vendor", "out", "cache"]
+
+
+def make_patterns(rng: random.Random, count: int):
+    patterns = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            patterns.append(f"*.{rng.choice(EXTENSIONS)}{i}")
+        elif kind == 1:
+            patterns.append(f"{rng.choice(DIRS)}{i}/")
+        elif kind == 2:
+            patterns.append(f"/{rng.choice(DIRS)}/gen_{i}_*.{rng.choice(EXTENSIONS)}")
+        elif kind == 3:
+            patterns.append(f"**/{rng.choice(DIRS)}/tmp{i}/**")
+        else:
+            patterns.append(f"!important_{i}.{rng.choice(EXTENSIONS)}")
+    patterns += ["*.pyc", "*.log", "build/", "node_modules/"]
+    return patterns
+
+
+def make_paths(rng: random.Random, count: int):
+    paths = []
+    for i in range(count):
+        depth = rng.randint(1, 5)
+        dirs = [rng.choice(DIRS) for _ in range(depth)]
+        paths.append("/".join(dirs) + f"/file_{i}.{rng.choice(EXTENSIONS)}")
+    return paths
+
+
+def naive_match(patterns, path: str) -> bool:
+    """
+    Reference: check every pattern in order against every path component.
+    """
+    ignored = False
+    name = path.rpartition("/")[2]
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        body = pattern.lstrip("!").rstrip("/")
+        target = path if "/" in body else name
+        if fnmatch.fnmatchcase(target, body.lstrip("/")):
+            ignored = not negated
+    return ignored
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patterns", type=int, default=200)
+    parser.add_argument("--paths", type=int, default=500_000)
+    parser.add_argument("--naive-sample", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    patterns = make_patterns(rng, args.patterns)
+    paths = make_paths(rng, args.paths)
+
+    start = time.perf_counter()
+    rules = IgnoreRules(patterns)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ignored = sum(1 for p in paths if rules.match(p, False))
+    compiled = time.perf_counter() - start
+
+    sample = paths[:args.naive_sample]
+    start = time.perf_counter()
+    for p in sample:
+        naive_match(patterns, p)
+    naive = (time.perf_counter() - start) * len(paths) / len(sample)
+
+    print(f"{len(patterns)} patterns, {len(paths)} paths, {ignored} ignored")
+    print(f"compile:          {compile_time * 1000:8.1f} ms")
+    print(f"compiled matcher: {compiled:8.2f} s  ({compiled / len(paths) * 1e6:.2f} us/path)")
+    print(f"fnmatch per rule: {naive:8.2f} s  (extrapolated from {len(sample)} paths)")
+
+
+if __name__ == "__main__":
+    main()
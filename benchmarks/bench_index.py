@@ -0,0 +1,124 @@
+"""
+Loading and saving a large index: the binary format vs the JSON format
+the index used to be written in.
+
+    python benchmarks/bench_index.py --entries 10000 100000 1000000
+
+For each size, reports the file size, the time to construct Index(repo)
+with and without one lookup, the time to load, change one entry and save,
+and the memory allocated while loading and iterating all entries. The
+split index (index.split_threshold) is measured the same way, with the
+size of the index file written on each change.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.repo import Repository
+from vcs.index import Index
+from vcs.indexfile import IndexEntries, IndexEntry, encode_index
+
+
+def make_entries(count: int) -> IndexEntries:
+    entries = IndexEntries()
+    for i in range(count):
+        path = f"src/d{i % 997:03d}/module_{i:07d}.py"
+        entries[path] = IndexEntry(
+            hashlib.sha1(str(i).encode()).hexdigest(),
+            1000 + i % 5000, 1_700_000_000_000_000_000 + i, 1_700_000_000_000_000_000 + i,
+            1_000_000 + i, 0o100644,
+        )
+    return entries
+
+
+def write_json(path: Path, entries: IndexEntries) -> None:
+    """
+    The previous index format.
+    """
+    payload = {
+        "snapshot": True,
+        "entries": {path: entry._asdict() for path, entry in entries.items()},
+        "cache_tree": {},
+    }
+    path.write_text(json.dumps(payload, sort_keys=True, separators=(",", ":")))
+
+
+def timed(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def save_one(repo: Repository, probe: str) -> None:
+    index = Index(repo)
+    entry = index.entries[probe]
+    index.update_entries({probe: entry._replace(size=entry.size + 1)})
+
+
+def bench(repo: Repository, label: str, write, probe: str) -> None:
+    index_file = repo.index_file
+    write()
+    size = index_file.stat().st_size
+
+    load = timed(lambda: Index(repo))
+    lookup = timed(lambda: Index(repo).entries[probe])
+    save = timed(lambda: (write(), save_one(repo, probe))) - timed(write)
+    memory = peak_memory(lambda: sum(1 for _ in Index(repo).entries.items()))
+    print(
+        f"  {label:7s} {size / 1e6:8.1f} MB  load {load * 1e3:9.1f} ms  "
+        f"load+lookup {lookup * 1e3:9.1f} ms  save {save * 1e3:9.1f} ms  "
+        f"load+iterate peak {memory / 1e6:7.1f} MB"
+    )
+
+
+def bench_split(repo: Repository, write, probe: str) -> None:
+    write()
+    repo.config.set("index.split_threshold", 1000)
+    save_one(repo, probe)  # writes the shared index
+    shared = sum(p.stat().st_size for p in repo.vcs_dir.glob("sharedindex.*"))
+
+    load = timed(lambda: Index(repo))
+    save = timed(lambda: save_one(repo, probe))
+    print(
+        f"  split   {shared / 1e6:8.1f} MB  load {load * 1e3:9.1f} ms  "
+        f"save {save * 1e3:9.1f} ms, writing {repo.index_file.stat().st_size} bytes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for count in args.entries:
+        entries = make_entries(count)
+        binary = encode_index(entries, {})
+        probe = sorted(entries)[count // 2]
+        print(f"{count} entries")
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = Repository.init(Path(tmp))
+            bench(repo, "JSON", lambda: write_json(repo.index_file, entries), probe)
+            bench(repo, "binary", lambda: repo.index_file.write_bytes(binary), probe)
+            bench_split(repo, lambda: repo.index_file.write_bytes(binary), probe)
+
+
+if __name__ == "__main__":
+    main()
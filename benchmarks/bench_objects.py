@@ -0,0 +1,78 @@
+"""
+Encode/decode of a large tree: the binary format vs the JSON format
+trees used to be written in.
+
+    python benchmarks/bench_objects.py --entries 10000
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vcs.objects import Tree, TreeEntry
+
+
+def json_encode(tree: Tree) -> bytes:
+    """
+    The previous tree encoding.
+    """
+    payload = {
+        "type": "tree",
+        "entries": {
+            name: {"kind": entry.kind, "hash": entry.hash}
+            for name, entry in tree.entries.items()
+        },
+    }
+    return json.dumps(payload, sort_keys=True).encode("utf-8")
+
+
+def report(label: str, func, number: int) -> None:
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{label:28s} {best * 1e3:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    tree = Tree({
+        f"file_{i:06d}.{rng.choice(['py', 'txt', 'json'])}": TreeEntry(
+            rng.choice(["blob", "tree"]),
+            hashlib.sha1(str(i).encode()).hexdigest(),
+        )
+        for i in range(args.entries)
+    })
+    names = rng.sample(sorted(tree.entries), min(args.lookups, args.entries))
+
+    as_json = json_encode(tree)
+    as_binary = tree.serialize()
+    json_tree = Tree.deserialize(as_json)
+    binary_tree = Tree.deserialize(as_binary)
+
+    print(f"{args.entries} entries: JSON {len(as_json)} bytes, binary {len(as_binary)} bytes")
+    report("encode JSON", lambda: json_encode(tree), 5)
+    report("encode binary", lambda: tree.serialize(), 5)
+    report("decode JSON", lambda: Tree.deserialize(as_json), 5)
+    report("decode binary", lambda: Tree.deserialize(as_binary), 5)
+    report("iterate JSON", lambda: list(json_tree.entries.items()), 5)
+    report("iterate binary", lambda: list(binary_tree.entries.items()), 5)
+    report("decode+iterate JSON", lambda: list(Tree.deserialize(as_json).entries.items()), 5)
+    report("decode+iterate binary", lambda: list(Tree.deserialize(as_binary).entries.items()), 5)
+    report(f"{len(names)} lookups JSON", lambda: [json_tree.entries[n] for n in names], 5)
+    report(f"{len(names)} lookups binary", lambda: [binary_tree.entries[n] for n in names], 5)
+    report("decode+1 lookup JSON",
+           lambda: [Tree.deserialize(as_json).entries.get(n) for n in names[:1]], 5)
+    report(f"decode+1 lookup binary",
+           lambda: [Tree.deserialize(as_binary).entries.get(n) for n in names[:1]], 5)
+
+
+if __name__ == "__main__":
+    main()
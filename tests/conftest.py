@@ -6,6 +6,9 @@ sys.path.insert(0, str(ROOT))
 
 import pytest
 from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.commit import create_commit
 import os
 
 
@@ -18,4 +21,22 @@ def temp_repo(tmp_path):
 
     yield repo
 
-    os.chdir(cwd)
\ No newline at end of file
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def commit_files():
+    """
+    commit_files(repo, files, message): write each path's content (None
+    leaves the path as it is on disk), add the paths and commit.
+    Returns the commit hash.
+    """
+    def commit(repo, files, message):
+        for path, content in files.items():
+            if content is not None:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                Path(path).write_text(content)
+        Index(repo).add_many([Path(p) for p in files], ObjectStore(repo))
+        return create_commit(repo, message)
+
+    return commit
@@ -19,4 +19,127 @@ def test_branch_checkout(temp_repo):
     create_branch(temp_repo, "feature")
     checkout_branch(temp_repo, "feature")
 
-    assert temp_repo.current_branch() == "feature"
\ No newline at end of file
+    assert temp_repo.current_branch() == "feature"
+
+def test_checkout_only_touches_changed_paths(temp_repo, commit_files):
+    import os
+
+    commit_files(temp_repo, {"same.txt": "same"}, "base")
+    create_branch(temp_repo, "feature")
+
+    checkout_branch(temp_repo, "feature")
+    commit_files(temp_repo, {"same.txt": None, "dir/new.txt": "new"}, "feature work")
+
+    Path("untracked.txt").write_text("keep me")
+    same_inode = os.stat("same.txt").st_ino
+    os.utime("same.txt", ns=(1, 1))
+
+    checkout_branch(temp_repo, "main")
+    assert not Path("dir").exists()
+    assert Path("untracked.txt").read_text() == "keep me"
+    assert os.stat("same.txt").st_mtime_ns == 1
+    assert os.stat("same.txt").st_ino == same_inode
+
+    checkout_branch(temp_repo, "feature")
+    assert Path("dir/new.txt").read_text() == "new"
+
+
+def test_checkout_refuses_to_clobber_local_changes(temp_repo, commit_files):
+    import pytest
+    from vcs.checkout import CheckoutError
+
+    commit_files(temp_repo, {"file.txt": "v1"}, "base")
+    create_branch(temp_repo, "feature")
+    checkout_branch(temp_repo, "feature")
+    commit_files(temp_repo, {"file.txt": "v2"}, "change")
+
+    Path("file.txt").write_text("local edit")
+    with pytest.raises(CheckoutError):
+        checkout_branch(temp_repo, "main")
+
+    assert temp_repo.current_branch() == "feature"
+    assert Path("file.txt").read_text() == "local edit"
+
+
+def test_parallel_checkout_streams_blobs(temp_repo, commit_files, monkeypatch):
+    import vcs.storage
+
+    monkeypatch.setattr(vcs.storage, "OUTPUT_CHUNK", 1024)
+    files = {f"d{i % 4}/f{i}.txt": f"content {i}\n" * (1 + i) for i in range(40)}
+    files["big.bin"] = "x" * 200_000
+    commit_files(temp_repo, files, "many files")
+
+    from vcs.refs import checkout as update_head
+    (temp_repo.heads_dir / "blank").write_text("")
+    update_head(temp_repo, "blank")
+    for path in files:
+        Path(path).unlink()
+
+    checkout_branch(temp_repo, "main", workers=4)
+
+    for path, content in files.items():
+        assert Path(path).read_text() == content
+
+
+def test_checkout_keeps_index_and_cache_tree_in_sync(temp_repo, commit_files):
+    from vcs.storage import ObjectStore
+    from vcs.index import Index
+    from vcs.objects import Commit
+
+    commit_files(temp_repo, {"a/one.txt": "1", "b/two.txt": "2"}, "base")
+    create_branch(temp_repo, "feature")
+    checkout_branch(temp_repo, "feature")
+    feature = commit_files(temp_repo, {"a/one.txt": "changed"}, "feature")
+
+    checkout_branch(temp_repo, "main")
+    index = Index(temp_repo)
+    store = ObjectStore(temp_repo)
+    master_tree = Commit.deserialize(store.load(temp_repo.head_commit())).tree
+    assert index.cache_tree[""] == master_tree
+    assert index.entries["a/one.txt"].hash == store.hash_object(b"1")
+
+    checkout_branch(temp_repo, "feature")
+    index = Index(temp_repo)
+    assert index.cache_tree[""] == Commit.deserialize(store.load(feature)).tree
+    assert Path("a/one.txt").read_text() == "changed"
+
+
+def _replace_file_with_directory(repo, commit_files):
+    """
+    Commit a file "d" on main, and "d/x" in its place on "feature".
+    """
+    from vcs.index import Index
+
+    commit_files(repo, {"d": "file\n"}, "file")
+    create_branch(repo, "feature")
+    checkout_branch(repo, "feature")
+    Path("d").unlink()
+    Index(repo).remove(Path("d"))
+    commit_files(repo, {"d/x": "x\n"}, "directory")
+
+
+def test_checkout_between_a_file_and_a_directory(temp_repo, commit_files):
+    from vcs.status import get_status
+
+    _replace_file_with_directory(temp_repo, commit_files)
+
+    checkout_branch(temp_repo, "main")
+    assert Path("d").read_text() == "file\n"
+
+    checkout_branch(temp_repo, "feature")
+    assert Path("d/x").read_text() == "x\n"
+    status = get_status(temp_repo)
+    assert (status.staged, status.modified, status.untracked) == ([], [], [])
+
+
+def test_checkout_keeps_untracked_files_in_a_directory_in_the_way(temp_repo, commit_files):
+    import pytest
+    from vcs.checkout import CheckoutError
+
+    _replace_file_with_directory(temp_repo, commit_files)
+    Path("d/untracked.txt").write_text("keep me")
+
+    with pytest.raises(CheckoutError, match="  d$"):
+        checkout_branch(temp_repo, "main")
+    assert Path("d/x").read_text() == "x\n"
+    assert Path("d/untracked.txt").read_text() == "keep me"
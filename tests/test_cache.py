@@ -0,0 +1,63 @@
+from vcs.cache import ENTRY_OVERHEAD, ObjectCache
+from vcs.objects import Commit, Tree, TreeEntry
+from vcs.repo import Repository
+from vcs.storage import CACHED_BLOB_SIZE, ObjectStore
+
+
+def test_lru_eviction_by_bytes():
+    cache = ObjectCache(8 * (100 + ENTRY_OVERHEAD))
+    for key in "abcdefgh":
+        cache.put(key, key, 100)
+    assert cache.get("a") == "a"  # now most recently used
+
+    cache.put("i", "i", 100)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (2, 1, 1, 8)
+
+
+def test_trees_and_commits_shared_across_stores(temp_repo):
+    store = ObjectStore(temp_repo)
+    blob = store.store(b"content")
+    tree_hash = Tree({"file.txt": TreeEntry("blob", blob)}).store(store)
+    commit_hash = Commit.create(tree_hash, "message").store(store)
+
+    first = Commit.read(ObjectStore(temp_repo), commit_hash)
+    second = Commit.read(ObjectStore(temp_repo), commit_hash)
+    assert first is second
+    assert Tree.read(store, tree_hash) is Tree.read(store, tree_hash)
+
+    stats = temp_repo.object_cache.stats()
+    assert (stats.hits, stats.misses) == (2, 2)
+
+    # A separate Repository object has its own cache
+    other = Repository(temp_repo.root)
+    assert Commit.read(ObjectStore(other), commit_hash) is not first
+
+
+def test_only_small_blobs_are_cached(temp_repo):
+    store = ObjectStore(temp_repo)
+    small = store.store(b"x" * 100)
+    large = store.store(b"y" * (CACHED_BLOB_SIZE + 1))
+
+    for _ in range(2):
+        store.load(small)
+        store.load(large)
+
+    stats = temp_repo.object_cache.stats()
+    assert stats.hits == 1
+    assert stats.entries == 1
+
+
+def test_disabled_cache_counts_misses_only(temp_repo):
+    temp_repo.config.set("core.object_cache_bytes", 0)
+    repo = Repository(temp_repo.root)
+    store = ObjectStore(repo)
+    tree_hash = Tree({}).store(store)
+
+    assert Tree.read(store, tree_hash) is not Tree.read(store, tree_hash)
+    stats = repo.object_cache.stats()
+    assert not repo.object_cache.enabled
+    assert (stats.hits, stats.misses, stats.entries) == (0, 2, 0)
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from vcs.cli import main
+from vcs.objects import Commit
+from vcs.storage import ObjectStore
+from vcs.trees import flatten_tree
+from vcs.status import get_status
+
+
+def _run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["pyvcs", *argv])
+    main()
+
+
+def _head_files(repo):
+    store = ObjectStore(repo)
+    commit = Commit.read(store, repo.head_commit())
+    return set(flatten_tree(store, commit.tree))
+
+
+def test_add_stages_removed_files(temp_repo, monkeypatch, capsys):
+    Path("src").mkdir()
+    for name in ("a.txt", "b.txt", "src/c.txt", "src/d.txt"):
+        Path(name).write_text(f"{name}\n")
+    _run(monkeypatch, "add", ".")
+    _run(monkeypatch, "commit", "-m", "first")
+
+    Path("a.txt").unlink()
+    _run(monkeypatch, "add", "a.txt")
+    Path("src/c.txt").unlink()
+    _run(monkeypatch, "add", "src")
+    _run(monkeypatch, "commit", "-m", "remove")
+
+    assert _head_files(temp_repo) == {"b.txt", "src/d.txt"}
+    status = get_status(temp_repo)
+    assert not (status.staged or status.modified or status.untracked)
+
+    # A removed directory stands for the files it held
+    Path("src/d.txt").unlink()
+    Path("src").rmdir()
+    capsys.readouterr()
+    _run(monkeypatch, "add", "src")
+    assert capsys.readouterr().out == "Removed src/d.txt from staging area\n"
+    _run(monkeypatch, "commit", "-m", "remove src")
+    assert _head_files(temp_repo) == {"b.txt"}
+
+
+def test_add_reports_missing_untracked_files(temp_repo, monkeypatch, capsys):
+    with pytest.raises(SystemExit) as exc:
+        _run(monkeypatch, "add", "missing.txt")
+
+    assert exc.value.code == 1
+    assert capsys.readouterr().out.startswith("Error: File not found")
+
+
+def test_log_rejects_paths_outside_the_repository(temp_repo, monkeypatch, capsys):
+    with pytest.raises(SystemExit) as exc:
+        _run(monkeypatch, "log", str(temp_repo.root.parent))
+
+    assert exc.value.code == 1
+    assert capsys.readouterr().out == f"Error: {temp_repo.root.parent} is outside the repository\n"
@@ -14,4 +14,90 @@ def test_commit_creation(temp_repo):
     index.add(file, store)
     commit_hash = create_commit(temp_repo, "initial commit")
 
-    assert commit_hash is not None
\ No newline at end of file
+    assert commit_hash is not None
+
+def test_tree_entries_record_kind(temp_repo):
+    from vcs.objects import Commit, Tree
+
+    Path("dir").mkdir()
+    Path("dir/b.txt").write_text("b")
+    Path("a.txt").write_text("a")
+
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+    index.add(Path("a.txt"), store)
+    index.add(Path("dir/b.txt"), store)
+    commit_hash = create_commit(temp_repo, "kinds")
+
+    commit = Commit.deserialize(store.load(commit_hash))
+    tree = Tree.deserialize(store.load(commit.tree))
+
+    assert tree.entries["a.txt"].kind == "blob"
+    assert tree.entries["dir"].kind == "tree"
+    assert store.type_of(commit.tree) == "tree"
+    assert store.type_of(commit_hash) == "commit"
+
+
+def test_index_is_a_snapshot(temp_repo):
+    import pytest
+    from vcs.objects import Commit
+    from vcs.commit import CommitError
+    from vcs.trees import flatten_tree
+
+    store = ObjectStore(temp_repo)
+    Path("a.txt").write_text("a")
+    Index(temp_repo).add(Path("a.txt"), store)
+    create_commit(temp_repo, "first")
+
+    Path("b.txt").write_text("b")
+    Index(temp_repo).add(Path("b.txt"), store)
+    second = create_commit(temp_repo, "second")
+
+    tree = Commit.deserialize(store.load(second)).tree
+    assert set(flatten_tree(store, tree)) == {"a.txt", "b.txt"}
+
+    with pytest.raises(CommitError):
+        create_commit(temp_repo, "unchanged")
+
+
+def test_commit_rewrites_only_changed_directories(temp_repo, monkeypatch):
+    from vcs.objects import Commit, Tree
+    from vcs.trees import flatten_tree
+
+    store = ObjectStore(temp_repo)
+    for d in ("x/deep", "y", "z"):
+        Path(d).mkdir(parents=True)
+        Path(d, "f.txt").write_text(d)
+    Index(temp_repo).add_many([Path(".")], store)
+    create_commit(temp_repo, "first")
+
+    written = []
+    original = Tree.serialize
+    monkeypatch.setattr(Tree, "serialize", lambda self: written.append(self) or original(self))
+
+    Path("x/deep/f.txt").write_text("changed")
+    Index(temp_repo).add(Path("x/deep/f.txt"), store)
+    second = create_commit(temp_repo, "second")
+
+    assert len(written) == 3  # x/deep, x and the root
+    files = flatten_tree(store, Commit.deserialize(store.load(second)).tree)
+    assert set(files) == {"x/deep/f.txt", "y/f.txt", "z/f.txt"}
+
+
+def test_legacy_cleared_index_is_seeded_from_head(temp_repo):
+    from vcs.objects import Commit
+    from vcs.trees import flatten_tree
+
+    store = ObjectStore(temp_repo)
+    Path("a.txt").write_text("a")
+    Index(temp_repo).add(Path("a.txt"), store)
+    create_commit(temp_repo, "first")
+
+    # Index as written by older versions: cleared after commit
+    temp_repo.index_file.write_text("{}")
+    Path("b.txt").write_text("b")
+    Index(temp_repo).add(Path("b.txt"), store)
+    second = create_commit(temp_repo, "second")
+
+    tree = Commit.deserialize(store.load(second)).tree
+    assert set(flatten_tree(store, tree)) == {"a.txt", "b.txt"}
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+import pytest
+
+from vcs.commit import CommitError, create_commit
+from vcs.index import Index
+from vcs.lock import LockError
+from vcs.objects import Commit
+from vcs.refs import RefError, update_ref
+from vcs.repo import Repository
+from vcs.storage import ObjectStore
+from vcs.trees import flatten_tree
+
+COMMITTERS = 6
+ROUNDS = 8
+
+
+def _committer(root: str, worker: int) -> int:
+    repo = Repository(Path(root))
+    path = Path(root) / f"w{worker}.txt"
+    commits = 0
+    for round_ in range(ROUNDS):
+        path.write_text(f"{worker}:{round_}\n")
+        Index(repo).add(path, ObjectStore(repo))
+        try:
+            create_commit(repo, f"worker {worker} round {round_}")
+            commits += 1
+        except CommitError:
+            pass  # another committer already included this change
+    return commits
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_concurrent_committers_lose_no_updates(temp_repo):
+    temp_repo.config.set("core.durability", "none")
+    context = multiprocessing.get_context("fork")
+    with context.Pool(COMMITTERS) as pool:
+        results = pool.starmap(_committer, [(str(temp_repo.root), w) for w in range(COMMITTERS)])
+
+    store = ObjectStore(temp_repo)
+    chain = []
+    commit_hash = temp_repo.head_commit()
+    while commit_hash:
+        chain.append(commit_hash)
+        commit_hash = Commit.deserialize(store.load(commit_hash)).parent
+    assert len(chain) == sum(results)
+
+    head_files = flatten_tree(store, Commit.deserialize(store.load(chain[0])).tree)
+    expected = {
+        f"w{w}.txt": store.hash_object(f"{w}:{ROUNDS - 1}\n".encode())
+        for w in range(COMMITTERS)
+    }
+    assert head_files == expected
+    assert Index(temp_repo).list_entries() == expected
+    assert not list(temp_repo.vcs_dir.rglob("*.lock"))
+
+
+def test_update_ref_compare_and_swap(temp_repo):
+    ref_path = temp_repo.heads_dir / "main"
+    update_ref(temp_repo, ref_path, "a" * 40, old="")
+    with pytest.raises(RefError):
+        update_ref(temp_repo, ref_path, "b" * 40, old="")
+    update_ref(temp_repo, ref_path, "b" * 40, old="a" * 40)
+    assert ref_path.read_text() == "b" * 40
+
+
+def test_held_index_lock_blocks_writers(temp_repo):
+    temp_repo.config.set("core.lock_timeout", 0)
+    Path("file.txt").write_text("hello")
+    Path("other.txt").write_text("other")
+    store = ObjectStore(temp_repo)
+    Index(temp_repo).add(Path("file.txt"), store)
+
+    lock_path = temp_repo.index_file.with_name("index.lock")
+    lock_path.write_text("")
+    with pytest.raises(LockError):
+        Index(temp_repo).add(Path("other.txt"), store)
+
+    # Stat-cache refreshes are skipped instead of failing
+    Index(temp_repo).refresh({"file.txt": os.lstat("file.txt")})
+
+    lock_path.unlink()
+    Index(temp_repo).add(Path("other.txt"), store)
+    assert sorted(Index(temp_repo).entries) == ["file.txt", "other.txt"]
+
+
+def test_batch_reloads_index_written_meanwhile(temp_repo):
+    Path("a.txt").write_text("a")
+    Path("b.txt").write_text("b")
+    store = ObjectStore(temp_repo)
+    first = Index(temp_repo)
+    second = Index(temp_repo)
+
+    first.add(Path("a.txt"), store)
+    second.add(Path("b.txt"), store)
+
+    assert sorted(Index(temp_repo).entries) == ["a.txt", "b.txt"]
@@ -0,0 +1,21 @@
+import os
+
+from vcs.delta import apply_delta, create_delta
+
+
+def test_delta_roundtrip_small_edit():
+    base = b"".join(b"line %d\n" % i for i in range(1000))
+    target = base.replace(b"line 500\n", b"edited line\n")
+
+    delta = create_delta(base, target)
+
+    assert len(delta) < 100
+    assert apply_delta(base, delta) == target
+
+
+def test_delta_roundtrip_unrelated_data():
+    base = os.urandom(1000)
+    target = os.urandom(500)
+    assert apply_delta(base, create_delta(base, target)) == target
+    assert apply_delta(b"", create_delta(b"", target)) == target
+    assert apply_delta(base, create_delta(base, b"")) == b""
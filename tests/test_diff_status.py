@@ -23,4 +23,112 @@ def test_diff_and_status(temp_repo):
     assert len(diffs) == 1
 
     status = get_status(temp_repo)
-    assert "file.txt" in status.modified
\ No newline at end of file
+    assert "file.txt" in status.modified
+
+def test_diff_skips_files_with_matching_stat(temp_repo, monkeypatch):
+    import os
+    import vcs.diff
+
+    file = Path("file.txt")
+    file.write_text("hello")
+    os.utime(file, ns=(1_000_000_000, 1_000_000_000))
+
+    index = Index(temp_repo)
+    index.add(file, ObjectStore(temp_repo))
+
+    def fail(*args):
+        raise AssertionError("clean file was read")
+
+    monkeypatch.setattr(ObjectStore, "hash_file", fail)
+    monkeypatch.setattr(vcs.diff, "_open_working_file", fail)
+    assert diff_working_vs_index(temp_repo) == []
+
+
+def test_diff_refreshes_touched_files(temp_repo):
+    import os
+
+    file = Path("file.txt")
+    file.write_text("hello")
+    os.utime(file, ns=(1_000_000_000, 1_000_000_000))
+
+    index = Index(temp_repo)
+    index.add(file, ObjectStore(temp_repo))
+
+    os.utime(file, ns=(2_000_000_000, 2_000_000_000))
+    assert diff_working_vs_index(temp_repo) == []
+    assert Index(temp_repo).entries["file.txt"].mtime_ns == 2_000_000_000
+
+
+def test_status_reports_each_category(temp_repo):
+    store = ObjectStore(temp_repo)
+    for name in ("clean.txt", "edited.txt", "removed.txt"):
+        Path(name).write_text(name)
+    Index(temp_repo).add_many([Path(".")], store)
+    create_commit(temp_repo, "initial")
+
+    Path("edited.txt").write_text("edited")
+    Path("removed.txt").unlink()
+    Path("new.txt").write_text("new")
+    Path("sub").mkdir()
+    Path("sub/staged.txt").write_text("staged")
+    Index(temp_repo).add(Path("sub/staged.txt"), store)
+
+    status = get_status(temp_repo)
+    assert status.staged == ["sub/staged.txt"]
+    assert status.modified == ["edited.txt", "removed.txt"]
+    assert status.untracked == ["new.txt"]
+
+
+def test_clean_status_skips_head_tree(temp_repo, monkeypatch):
+    import vcs.status
+
+    Path("a.txt").write_text("a")
+    Index(temp_repo).add(Path("a.txt"), ObjectStore(temp_repo))
+    create_commit(temp_repo, "initial")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("HEAD tree was flattened")
+
+    monkeypatch.setattr(vcs.status, "flatten_tree", fail)
+    status = get_status(temp_repo)
+    assert (status.staged, status.modified, status.untracked) == ([], [], [])
+
+
+def test_diff_context_setting(temp_repo):
+    file = Path("file.txt")
+    file.write_text("".join(f"{i}\n" for i in range(10)))
+    Index(temp_repo).add(file, ObjectStore(temp_repo))
+    file.write_text("".join(f"{i}\n" for i in range(10)).replace("5\n", "five\n"))
+
+    temp_repo.config.set("diff.context", 0)
+    (entry,) = diff_working_vs_index(temp_repo)
+    assert entry.diff.splitlines()[2:] == ["@@ -6 +6 @@", "-5", "+five"]
+
+
+def test_status_reports_files_under_a_directory_replaced_by_a_file(temp_repo):
+    Path("d").mkdir()
+    Path("d/x").write_text("x")
+    Index(temp_repo).add(Path("d/x"), ObjectStore(temp_repo))
+    create_commit(temp_repo, "initial")
+
+    Path("d/x").unlink()
+    Path("d").rmdir()
+    Path("d").write_text("f")
+
+    status = get_status(temp_repo)
+    assert status.modified == ["d/x"]
+    assert status.untracked == ["d"]
+
+
+def test_diff_shows_files_under_a_directory_replaced_by_a_file(temp_repo):
+    Path("d").mkdir()
+    Path("d/x").write_text("x\n")
+    Index(temp_repo).add(Path("d/x"), ObjectStore(temp_repo))
+
+    Path("d/x").unlink()
+    Path("d").rmdir()
+    Path("d").write_text("f\n")
+
+    (entry,) = diff_working_vs_index(temp_repo)
+    assert entry.path == "d/x"
+    assert "-x" in entry.diff.splitlines()
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from vcs import fsmonitor
+from vcs.commit import create_commit
+from vcs.index import Index
+from vcs.status import get_status
+from vcs.storage import ObjectStore
+
+
+@pytest.fixture(params=["inotify", "poll"])
+def monitored_repo(request, temp_repo):
+    Path("src").mkdir()
+    for name in ("a.txt", "src/b.txt", "src/c.txt"):
+        Path(name).write_text(name)
+    Index(temp_repo).add_many([Path(".")], ObjectStore(temp_repo))
+    create_commit(temp_repo, "initial")
+
+    try:
+        fsmonitor.start(temp_repo, mode=request.param, interval=0.05)
+    except fsmonitor.FSMonitorError:
+        pytest.skip(f"{request.param} monitor unavailable")
+    yield temp_repo
+    fsmonitor.stop(temp_repo)
+
+
+def test_query_without_daemon_requests_full_scan(temp_repo):
+    assert fsmonitor.query(temp_repo, []) is None
+
+
+def test_status_examines_only_reported_paths(monitored_repo, monkeypatch):
+    import vcs.status
+
+    # First run has no token yet: full scan
+    assert get_status(monitored_repo).modified == []
+
+    Path("src/b.txt").write_text("changed")
+    Path("new").mkdir()
+    Path("new/d.txt").write_text("d")
+
+    monkeypatch.setattr(vcs.status, "iter_files", None)  # a full walk would fail
+    status = get_status(monitored_repo)
+    assert status.modified == ["src/b.txt"]
+    assert status.untracked == ["new/d.txt"]
+
+    # Still reported on the next run, without new events
+    status = get_status(monitored_repo)
+    assert status.modified == ["src/b.txt"]
+    assert status.untracked == ["new/d.txt"]
+
+    Path("src/b.txt").write_text("src/b.txt")
+    assert get_status(monitored_repo).modified == []
+
+
+def test_removed_directory_reports_tracked_files(monitored_repo):
+    import shutil
+
+    get_status(monitored_repo)
+    shutil.rmtree("src")
+    assert get_status(monitored_repo).modified == ["src/b.txt", "src/c.txt"]
+
+
+def test_overflow_falls_back_to_full_scan(monitored_repo, monkeypatch):
+    get_status(monitored_repo)
+
+    with (fsmonitor.monitor_dir(monitored_repo) / fsmonitor.EVENTS_FILE).open("a") as f:
+        f.write(json.dumps({"overflow": True}) + "\n")
+    index_paths = sorted(Index(monitored_repo).entries)
+    assert fsmonitor.query(monitored_repo, index_paths).paths is None
@@ -0,0 +1,104 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.objects import Commit
+from vcs.refs import create_branch, delete_branch
+from vcs.checkout import checkout_branch
+from vcs.repack import repack
+from vcs.pack import iter_loose_objects
+from vcs.gc import GCError, gc
+
+
+def _age_objects(repo, seconds=3600):
+    then = time.time() - seconds
+    for _, path in iter_loose_objects(repo.objects_dir):
+        os.utime(path, (then, then))
+
+
+def _loose(repo):
+    return {h for h, _ in iter_loose_objects(repo.objects_dir)}
+
+
+def test_gc_prunes_only_old_unreachable_objects(temp_repo, commit_files):
+    first = commit_files(temp_repo, {"a.txt": "one\n", "src/b.txt": "b\n"}, "first")
+    create_branch(temp_repo, "topic")
+    checkout_branch(temp_repo, "topic")
+    commit_files(temp_repo, {"src/b.txt": "topic\n"}, "topic")
+    checkout_branch(temp_repo, "main")
+    second = commit_files(temp_repo, {"a.txt": "two\n"}, "second")
+
+    store = ObjectStore(temp_repo)
+    garbage = store.store(b"never committed\n")
+    garbage_size = store._object_path(garbage).stat().st_size
+    _age_objects(temp_repo)
+    recent = store.store(b"just written\n")
+    before = _loose(temp_repo)
+
+    stats = gc(temp_repo, prune_expire=60)
+
+    assert (stats.objects, stats.pruned, stats.bytes_reclaimed) == (len(before), 1, garbage_size)
+    assert stats.reachable == len(before) - 2
+    assert _loose(temp_repo) == before - {garbage}
+    assert store.exists(recent)
+    assert Commit.read(ObjectStore(temp_repo), second).parents == (first,)
+
+    # Once its branch is deleted, the topic commit, its two trees and blob
+    # go, and with no grace period the recent blob too
+    delete_branch(temp_repo, "topic")
+    assert gc(temp_repo, prune_expire=0).pruned == 5
+    assert gc(temp_repo, prune_expire=0).pruned == 0
+
+
+def test_gc_keeps_staged_objects_and_marks_packed_ones(temp_repo, commit_files):
+    commit_files(temp_repo, {"a.txt": "a\n", "dir/b.txt": "b\n"}, "packed")
+    repack(temp_repo)
+    Path("dir/b.txt").write_text("staged\n")
+    Index(temp_repo).add(Path("dir/b.txt"), ObjectStore(temp_repo))
+    _age_objects(temp_repo)
+
+    stats = gc(temp_repo, prune_expire=0)
+
+    assert stats.pruned == 0
+    assert stats.reachable == stats.objects
+    assert ObjectStore(temp_repo).exists(ObjectStore(temp_repo).hash_file(Path("dir/b.txt")))
+
+
+def test_gc_refuses_to_prune_with_missing_objects(temp_repo, commit_files):
+    commit = commit_files(temp_repo, {"a.txt": "a\n"}, "first")
+    store = ObjectStore(temp_repo)
+    blob = store.hash_file(Path("a.txt"))
+    garbage = store.store(b"garbage\n")
+    store._object_path(blob).unlink()
+
+    with pytest.raises(GCError):
+        gc(temp_repo, prune_expire=0)
+    assert store.exists(garbage) and store.exists(commit)
+
+
+def test_gc_keeps_old_objects_stored_again(temp_repo):
+    store = ObjectStore(temp_repo)
+    blob = store.store(b"stored again\n")
+    _age_objects(temp_repo)
+
+    assert ObjectStore(temp_repo).store(b"stored again\n") == blob
+    assert gc(temp_repo, prune_expire=60).pruned == 0
+    assert store.exists(blob)
+
+
+def test_gc_deletes_stale_temp_files(temp_repo):
+    stale = temp_repo.objects_dir / ".object.stale.tmp"
+    recent = temp_repo.objects_dir / ".object.recent.tmp"
+    stale.write_bytes(b"interrupted")
+    recent.write_bytes(b"in flight")
+    then = time.time() - 3600
+    os.utime(stale, (then, then))
+
+    stats = gc(temp_repo, prune_expire=60)
+
+    assert (stats.pruned, stats.bytes_reclaimed) == (0, len(b"interrupted"))
+    assert not stale.exists() and recent.exists()
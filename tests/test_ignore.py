@@ -0,0 +1,81 @@
+from pathlib import Path
+from vcs.ignore import IgnoreMatcher, IgnoreRules
+from vcs.index import Index
+from vcs.status import get_status
+from vcs.storage import ObjectStore
+
+
+def test_rules_follow_gitignore_semantics():
+    rules = IgnoreRules([
+        "# comment",
+        "*.log",
+        "!keep.log",
+        "build/",
+        "/top.txt",
+        "docs/*.md",
+        "**/cache/**",
+        "a/**/z",
+    ])
+
+    assert rules.match("x.log", False) is True
+    assert rules.match("deep/dir/x.log", False) is True
+    assert rules.match("deep/keep.log", False) is False
+    assert rules.match("build", True) is True
+    assert rules.match("build", False) is None  # directories only
+    assert rules.match("top.txt", False) is True
+    assert rules.match("sub/top.txt", False) is None  # anchored
+    assert rules.match("docs/a.md", False) is True
+    assert rules.match("docs/sub/a.md", False) is None  # "*" stops at "/"
+    assert rules.match("x/cache/y/z.bin", False) is True
+    assert rules.match("a/z", False) is True
+    assert rules.match("a/b/c/z", False) is True
+    assert rules.match("src/main.py", False) is None
+
+
+
+def test_bracket_classes_follow_gitignore_semantics():
+    rules = IgnoreRules(["x[]]", "y[!]]", "z[]ab]", "w[\\[]", "v[z-a]"])
+
+    assert rules.match("x]", False) is True
+    assert rules.match("x", False) is None
+    assert rules.match("ya", False) is True
+    assert rules.match("y]", False) is None
+    assert rules.match("zb", False) is True
+    assert rules.match("z]", False) is True
+    assert rules.match("w[", False) is True
+    assert rules.match("w\\", False) is True
+    # Not a valid class: "[" is literal
+    assert rules.match("v[z-a]", False) is True
+    assert rules.match("vb", False) is None
+
+def test_nested_ignore_files_take_precedence(temp_repo):
+    Path(".pyvcsignore").write_text("*.tmp\n")
+    Path("sub").mkdir()
+    Path("sub/.pyvcsignore").write_text("!wanted.tmp\n")
+
+    matcher = IgnoreMatcher(temp_repo.root)
+    assert matcher.match("other.tmp", False)
+    assert matcher.match("sub/other.tmp", False)
+    assert not matcher.match("sub/wanted.tmp", False)
+
+
+def test_status_and_add_skip_ignored_paths(temp_repo, monkeypatch):
+    import vcs.worktree
+
+    Path(".pyvcsignore").write_text("node_modules/\n*.pyc\n")
+    Path("node_modules/pkg").mkdir(parents=True)
+    Path("node_modules/pkg/index.js").write_text("x")
+    Path("main.py").write_text("print()")
+    Path("main.pyc").write_text("bytecode")
+
+    entered = []
+    scandir = vcs.worktree.os.scandir
+    monkeypatch.setattr(
+        vcs.worktree.os, "scandir", lambda p: entered.append(str(p)) or scandir(p)
+    )
+
+    assert get_status(temp_repo).untracked == [".pyvcsignore", "main.py"]
+    assert not any("node_modules" in p for p in entered)
+
+    added = Index(temp_repo).add_many([Path(".")], ObjectStore(temp_repo))
+    assert added == [".pyvcsignore", "main.py"]
@@ -12,4 +12,269 @@ def test_index_add(temp_repo):
 
     index.add(file, store)
 
-    assert "file.txt" in index.entries
\ No newline at end of file
+    assert "file.txt" in index.entries
+
+def test_index_caches_stat_data(temp_repo):
+    import os
+
+    file = Path("file.txt")
+    file.write_text("hello")
+    os.utime(file, ns=(1_000_000_000, 1_000_000_000))
+
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+    index.add(file, store)
+
+    entry = Index(temp_repo).entries["file.txt"]
+    assert entry.size == 5
+    assert entry.mtime_ns == 1_000_000_000
+    assert index.stat_unchanged("file.txt", os.lstat(file))
+
+
+def test_racily_clean_entry_is_not_trusted(temp_repo):
+    import os
+
+    file = Path("file.txt")
+    file.write_text("hello")
+
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+    index.add(file, store)
+
+    # File modified in the same tick the index was written
+    index.timestamp_ns = index.entries["file.txt"].mtime_ns
+    assert not index.stat_unchanged("file.txt", os.lstat(file))
+
+
+def test_racily_clean_entry_stays_untrusted_after_next_write(temp_repo):
+    import os
+    import time
+
+    # Modified in the tick the index is written, or later
+    file = Path("file.txt")
+    file.write_text("hello")
+    future = time.time_ns() + 3600 * 10**9
+    os.utime(file, ns=(future, future))
+
+    store = ObjectStore(temp_repo)
+    Index(temp_repo).add(file, store)
+    other = Path("other.txt")
+    other.write_text("other")
+    os.utime(other, ns=(1_000_000_000, 1_000_000_000))
+    Index(temp_repo).add(other, store)
+
+    index = Index(temp_repo)
+    assert index.entries["file.txt"].size == -1
+    assert not index.stat_unchanged("file.txt", os.lstat(file))
+    assert index.stat_unchanged("other.txt", os.lstat(other))
+
+
+def test_add_many_writes_index_once(temp_repo, monkeypatch):
+    Path("a.txt").write_text("a")
+    Path("src/pkg").mkdir(parents=True)
+    Path("src/pkg/b.txt").write_text("b")
+    Path("src/c.txt").write_text("c")
+
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+
+    saves = []
+    original_save = index._save
+    monkeypatch.setattr(index, "_save", lambda: (saves.append(1), original_save()))
+
+    staged = index.add_many([Path("a.txt"), Path("src")], store)
+
+    assert staged == ["a.txt", "src/c.txt", "src/pkg/b.txt"]
+    assert len(saves) == 1
+    assert set(Index(temp_repo).entries) == set(staged)
+
+
+def test_batch_discards_changes_on_error(temp_repo):
+    import pytest
+
+    Path("a.txt").write_text("a")
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+
+    with pytest.raises(RuntimeError):
+        with index.batch():
+            index.add(Path("a.txt"), store)
+            raise RuntimeError("boom")
+
+    assert index.entries == {}
+    assert Index(temp_repo).entries == {}
+
+
+def test_add_many_parallel_matches_serial(temp_repo):
+    for i in range(20):
+        Path(f"dir{i % 3}").mkdir(exist_ok=True)
+        Path(f"dir{i % 3}/f{i}.txt").write_text(f"content {i % 5}")
+
+    store = ObjectStore(temp_repo)
+    serial = Index(temp_repo)
+    serial_paths = serial.add_many([Path(".")], store)
+    serial_hashes = serial.list_entries()
+
+    serial.clear()
+    parallel = Index(temp_repo)
+    parallel_paths = parallel.add_many([Path(".")], store, workers=8)
+
+    assert parallel_paths == serial_paths
+    assert parallel.list_entries() == serial_hashes
+
+
+def test_binary_index_roundtrip(temp_repo):
+    from vcs.commit import create_commit
+    from vcs.indexfile import MAGIC, IndexEntries
+
+    Path("src").mkdir()
+    for name in ["b.txt", "a.txt", "src/z.txt", "src/é.txt"]:
+        Path(name).write_text(name)
+    store = ObjectStore(temp_repo)
+    index = Index(temp_repo)
+    index.add_many([Path(".")], store)
+    create_commit(temp_repo, "initial")
+
+    assert temp_repo.index_file.read_bytes().startswith(MAGIC)
+    loaded = Index(temp_repo)
+    assert isinstance(loaded.entries, IndexEntries)
+    assert list(loaded.entries) == ["a.txt", "b.txt", "src/z.txt", "src/é.txt"]
+    assert loaded.list_entries() == index.list_entries()
+    assert loaded.entries["src/é.txt"].size == len("src/é.txt".encode())
+    assert "src/missing.txt" not in loaded.entries
+    assert set(loaded.cache_tree) == {"", "src"}
+
+    # Insertions and deletions on top of the mapped file
+    Path("src/m.txt").write_text("m")
+    loaded.add(Path("src/m.txt"), store)
+    loaded.remove(Path("a.txt"))
+    assert list(loaded.entries) == ["b.txt", "src/m.txt", "src/z.txt", "src/é.txt"]
+    reloaded = Index(temp_repo)
+    assert reloaded.list_entries() == loaded.list_entries()
+    assert reloaded.entries["src/é.txt"] == index.entries["src/é.txt"]
+    assert len(reloaded.entries) == 4
+
+
+def test_add_many_stages_file_replaced_by_directory(temp_repo):
+    Path("a").write_text("file")
+    Path("b.txt").write_text("b")
+    store = ObjectStore(temp_repo)
+    Index(temp_repo).add_many([Path(".")], store)
+
+    Path("a").unlink()
+    Path("a").mkdir()
+    Path("a/x.txt").write_text("x")
+    staged = Index(temp_repo).add_many([Path(".")], store)
+
+    assert staged == ["a/x.txt", "b.txt", "a"]
+    assert list(Index(temp_repo).entries) == ["a/x.txt", "b.txt"]
+
+
+def test_json_index_is_upgraded(temp_repo):
+    import json
+    from vcs.indexfile import INDEX_VERSION, MAGIC
+
+    blob = ObjectStore(temp_repo).hash_object(b"hello")
+    temp_repo.index_file.write_text(json.dumps({
+        "snapshot": True,
+        "entries": {"file.txt": {"hash": blob, "size": 5, "mtime_ns": 1,
+                                 "ctime_ns": 2, "ino": 3, "mode": 4}},
+        "cache_tree": {},
+    }, indent=2))
+
+    index = Index(temp_repo)
+    assert index.version == 1
+    assert index.entries["file.txt"].ino == 3
+    assert index.upgrade()
+
+    assert temp_repo.index_file.read_bytes().startswith(MAGIC)
+    upgraded = Index(temp_repo)
+    assert upgraded.version == INDEX_VERSION
+    assert upgraded.entries == index.entries
+    assert not upgraded.upgrade()
+
+
+def test_corrupt_index_is_detected(temp_repo):
+    import pytest
+    from vcs.indexfile import IndexFormatError
+
+    Path("file.txt").write_text("hello")
+    Index(temp_repo).add(Path("file.txt"), ObjectStore(temp_repo))
+
+    data = bytearray(temp_repo.index_file.read_bytes())
+    data[-30] ^= 0xFF
+    temp_repo.index_file.write_bytes(bytes(data))
+
+    with pytest.raises(IndexFormatError, match="checksum"):
+        Index(temp_repo)
+
+
+def test_split_index_writes_only_changes(temp_repo, monkeypatch):
+    import vcs.index
+    from vcs.commit import create_commit
+
+    temp_repo.config.set("index.split_threshold", 3)
+    Path("src").mkdir()
+    for i in range(50):
+        Path(f"src/f{i:02d}.txt").write_text(f"file {i}")
+    store = ObjectStore(temp_repo)
+    Index(temp_repo).add_many([Path("src")], store)
+    create_commit(temp_repo, "initial")
+
+    shared = list(temp_repo.vcs_dir.glob("sharedindex.*"))
+    assert len(shared) == 1
+    full_size = shared[0].stat().st_size
+
+    # Changes go to the small index file, on top of the shared index
+    Path("src/f07.txt").write_text("changed")
+    Path("new.txt").write_text("new")
+    index = Index(temp_repo)
+    index.add_many([Path("src/f07.txt"), Path("new.txt")], store)
+    index.remove(Path("src/f00.txt"))
+    assert temp_repo.index_file.stat().st_size < full_size // 4
+    assert list(temp_repo.vcs_dir.glob("sharedindex.*")) == shared
+
+    loaded = Index(temp_repo)
+    assert loaded.list_entries() == index.list_entries()
+    assert len(loaded.entries) == 50
+    assert "src/f00.txt" not in loaded.entries
+    assert loaded.entries["src/f07.txt"].hash == store.hash_object(b"changed")
+    assert loaded.cache_tree == index.cache_tree
+
+    # Past the threshold, the changes are folded into a new shared index
+    monkeypatch.setattr(vcs.index, "SHARED_INDEX_EXPIRE", -1)
+    Path("more.txt").write_text("more")
+    loaded.add(Path("more.txt"), store)
+    assert list(temp_repo.vcs_dir.glob("sharedindex.*")) != shared
+    assert len(list(temp_repo.vcs_dir.glob("sharedindex.*"))) == 1
+    assert Index(temp_repo).list_entries() == loaded.list_entries()
+
+    # Turning splitting off writes the whole index again
+    temp_repo.config.set("index.split_threshold", 0)
+    Path("last.txt").write_text("last")
+    index = Index(temp_repo)
+    index.add(Path("last.txt"), store)
+    assert list(temp_repo.vcs_dir.glob("sharedindex.*")) == []
+    assert Index(temp_repo).list_entries() == index.list_entries()
+
+
+def test_replaced_shared_index_outlives_its_readers(temp_repo):
+    import os
+
+    temp_repo.config.set("index.split_threshold", 1)
+    store = ObjectStore(temp_repo)
+    for name in ("a.txt", "b.txt"):
+        Path(name).write_text(name)
+        Index(temp_repo).add(Path(name), store)
+    (shared,) = temp_repo.vcs_dir.glob("sharedindex.*")
+    os.utime(shared, (0, 0))  # written long ago
+
+    # A reader has read the index file but not opened its shared index
+    reader_view = temp_repo.index_file.read_bytes()
+    Path("c.txt").write_text("c")
+    Path("d.txt").write_text("d")
+    Index(temp_repo).add_many([Path("c.txt"), Path("d.txt")], store)
+    assert len(list(temp_repo.vcs_dir.glob("sharedindex.*"))) == 2
+
+    temp_repo.index_file.write_bytes(reader_view)
+    assert sorted(Index(temp_repo).entries) == ["a.txt", "b.txt"]
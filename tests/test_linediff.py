@@ -0,0 +1,74 @@
+import random
+
+from vcs.linediff import opcodes, unified_diff
+
+
+def _apply(a, b, codes):
+    out = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+        out += b[j1:j2]
+    return out
+
+
+def test_opcodes_rebuild_target():
+    rng = random.Random(0)
+    for _ in range(500):
+        a = [rng.choice("abcdef") for _ in range(rng.randint(0, 40))]
+        b = [rng.choice("abcdef") for _ in range(rng.randint(0, 40))]
+        assert _apply(a, b, opcodes(a, b)) == b
+
+
+def test_unified_diff_format_and_context():
+    old = b"".join(b"line %d\n" % i for i in range(20))
+    new = old.replace(b"line 10\n", b"changed\n")
+
+    text = unified_diff(old, new, "f.txt", context=1)
+    assert text == (
+        "--- a/f.txt\n"
+        "+++ b/f.txt\n"
+        "@@ -10,3 +10,3 @@\n"
+        " line 9\n"
+        "-line 10\n"
+        "+changed\n"
+        " line 11\n"
+    )
+    assert unified_diff(old, old, "f.txt") == ""
+
+
+def test_missing_newline_is_marked():
+    text = unified_diff(b"a\n", b"a\nb", "f.txt")
+    assert text.endswith("+b\n\\ No newline at end of file\n")
+
+
+def test_binary_content_is_not_diffed():
+    assert unified_diff(b"\x00\x01", b"\x00\x02", "img.png") == (
+        "Binary files a/img.png and b/img.png differ\n"
+    )
+
+
+def test_merge_lines_takes_changes_from_both_sides():
+    from vcs.linediff import merge_lines
+
+    base = b"".join(b"line %d\n" % i for i in range(10))
+    ours = base.replace(b"line 2\n", b"ours\n")
+    theirs = base.replace(b"line 7\n", b"theirs\n") + b"appended\n"
+
+    merged, clean = merge_lines(base, ours, theirs)
+    assert clean
+    assert merged == ours.replace(b"line 7\n", b"theirs\n") + b"appended\n"
+
+
+def test_merge_lines_marks_conflicts_diff3_style():
+    from vcs.linediff import merge_lines
+
+    merged, clean = merge_lines(b"a\nb\nc\n", b"a\nX\nc\n", b"a\nY", ("HEAD", "feature"))
+    assert not clean
+    assert merged == (
+        b"a\n"
+        b"<<<<<<< HEAD\nX\nc\n"
+        b"||||||| base\nb\nc\n"
+        b"=======\nY\n"
+        b">>>>>>> feature\n"
+    )
@@ -0,0 +1,66 @@
+import pytest
+
+from vcs.storage import ObjectStore
+from vcs.commitgraph import CommitGraph
+from vcs.log import iter_log
+from vcs.lock import LockError
+
+
+def test_log_lists_history_newest_first(temp_repo, commit_files):
+    hashes = [commit_files(temp_repo, {"a.txt": str(i)}, f"commit {i}") for i in range(5)]
+
+    assert list(iter_log(temp_repo)) == hashes[::-1]
+
+
+def test_log_walk_does_not_open_commits(temp_repo, commit_files, monkeypatch):
+    hashes = [commit_files(temp_repo, {"a.txt": str(i)}, f"commit {i}") for i in range(5)]
+
+    def fail(self, obj_hash):
+        raise AssertionError("commit object loaded")
+
+    monkeypatch.setattr(ObjectStore, "load", fail)
+    assert list(iter_log(temp_repo)) == hashes[::-1]
+
+
+def test_commit_graph_records_generations(temp_repo, commit_files):
+    hashes = [commit_files(temp_repo, {"a.txt": str(i)}, f"commit {i}") for i in range(3)]
+
+    graph = CommitGraph(temp_repo)
+    assert len(graph) == 3
+    assert [graph.generation(graph.lookup(h)) for h in hashes] == [1, 2, 3]
+    assert graph.parents(graph.lookup(hashes[2])) == [graph.lookup(hashes[1])]
+
+
+def test_commit_graph_is_rebuilt_when_missing(temp_repo, commit_files):
+    hashes = [commit_files(temp_repo, {"a.txt": str(i)}, f"commit {i}") for i in range(3)]
+    (temp_repo.vcs_dir / "commit-graph").unlink()
+
+    assert list(iter_log(temp_repo)) == hashes[::-1]
+    assert len(CommitGraph(temp_repo)) == 3
+
+
+def test_commit_graph_appends_hold_the_lock(temp_repo, commit_files):
+    hashes = [commit_files(temp_repo, {"a.txt": str(i)}, f"commit {i}") for i in range(3)]
+    (temp_repo.vcs_dir / "commit-graph").unlink()
+    CommitGraph(temp_repo).ensure(ObjectStore(temp_repo), hashes[1])
+    temp_repo.config.set("core.lock_timeout", 0)
+    lock = temp_repo.vcs_dir / "commit-graph.lock"
+    lock.touch()
+
+    # Another process is appending: reading needs no lock, appending waits
+    assert CommitGraph(temp_repo).ensure(ObjectStore(temp_repo), hashes[1]) == 1
+    with pytest.raises(LockError):
+        CommitGraph(temp_repo).ensure(ObjectStore(temp_repo), hashes[2])
+
+    lock.unlink()
+    graph = CommitGraph(temp_repo)
+    assert graph.ensure(ObjectStore(temp_repo), hashes[2]) == 2
+    assert [graph.hash_at(pos) for pos in range(len(graph))] == hashes
+
+def test_log_filters_by_path(temp_repo, commit_files):
+    first = commit_files(temp_repo, {"src/a.txt": "a"}, "add a")
+    commit_files(temp_repo, {"b.txt": "b", "src/a.txt": None}, "add b")
+    third = commit_files(temp_repo, {"src/a.txt": "a2"}, "edit a")
+
+    assert list(iter_log(temp_repo, paths=["src/a.txt"])) == [third, first]
+    assert list(iter_log(temp_repo, paths=["src"])) == [third, first]
@@ -0,0 +1,174 @@
+from pathlib import Path
+
+import pytest
+
+from vcs.storage import ObjectStore
+from vcs.index import Index
+from vcs.objects import Commit, Tree
+from vcs.refs import create_branch
+from vcs.checkout import CheckoutError, checkout_branch
+from vcs.status import get_status
+from vcs.merge import MergeError, merge, merge_abort, merge_base, merge_trees
+
+
+def _diverge(repo, commit_files, ours, theirs, base=None):
+    """
+    Commit base on main, then theirs on a "feature" branch and ours on main.
+    """
+    base_commit = commit_files(repo, base or {"a.txt": "a\n", "src/b.txt": "b\n"}, "base")
+    create_branch(repo, "feature")
+    checkout_branch(repo, "feature")
+    their_commit = commit_files(repo, theirs, "theirs")
+    checkout_branch(repo, "main")
+    our_commit = commit_files(repo, ours, "ours")
+    return base_commit, our_commit, their_commit
+
+
+def test_merge_base_of_diverged_branches(temp_repo, commit_files, monkeypatch):
+    base, ours, theirs = _diverge(temp_repo, commit_files, {"a.txt": "ours\n"}, {"src/b.txt": "theirs\n"})
+    for i in range(3):
+        ours = commit_files(temp_repo, {"c.txt": str(i)}, f"more {i}")
+
+    # The walk runs on the commit-graph, without opening commits
+    monkeypatch.setattr(Commit, "read", lambda *args: pytest.fail("commit object loaded"))
+    assert merge_base(temp_repo, ours, theirs) == base
+    assert merge_base(temp_repo, theirs, ours) == base
+    assert merge_base(temp_repo, ours, base) == base
+    assert merge_base(temp_repo, ours, ours) == ours
+
+
+def test_clean_merge_creates_merge_commit(temp_repo, commit_files):
+    _, ours, theirs = _diverge(
+        temp_repo,
+        commit_files,
+        {"a.txt": "a\nours\n"},
+        {"src/b.txt": "theirs\n", "src/new.txt": "new\n"},
+    )
+
+    result = merge(temp_repo, "feature")
+
+    assert result.status == "merged"
+    commit = Commit.read(ObjectStore(temp_repo), result.commit)
+    assert commit.parents == (ours, theirs)
+    assert commit.message == "Merge branch 'feature'"
+    assert temp_repo.head_commit() == result.commit
+    assert Path("a.txt").read_text() == "a\nours\n"
+    assert Path("src/b.txt").read_text() == "theirs\n"
+    assert Path("src/new.txt").read_text() == "new\n"
+    status = get_status(temp_repo)
+    assert (status.staged, status.modified, status.untracked) == ([], [], [])
+    assert not temp_repo.merge_head_file.exists()
+
+    assert merge(temp_repo, "feature").status == "up-to-date"
+
+
+def test_fast_forward_merge(temp_repo, commit_files):
+    commit_files(temp_repo, {"a.txt": "a\n"}, "base")
+    create_branch(temp_repo, "feature")
+    checkout_branch(temp_repo, "feature")
+    ahead = commit_files(temp_repo, {"a.txt": "ahead\n"}, "ahead")
+    checkout_branch(temp_repo, "main")
+
+    result = merge(temp_repo, "feature")
+
+    assert (result.status, result.commit) == ("fast-forward", ahead)
+    assert temp_repo.head_commit() == ahead
+    assert Path("a.txt").read_text() == "ahead\n"
+
+
+def test_conflicting_merge_is_concluded_by_commit(temp_repo, commit_files):
+    _, ours, theirs = _diverge(
+        temp_repo,
+        commit_files,
+        {"a.txt": "ours\n", "src/b.txt": "b\nours\n"},
+        {"a.txt": "theirs\n", "src/b.txt": "theirs\nb\n"},
+    )
+
+    result = merge(temp_repo, "feature")
+
+    assert (result.status, result.commit, result.conflicts) == ("conflicts", None, ["a.txt"])
+    assert temp_repo.head_commit() == ours
+    assert temp_repo.merge_head_file.read_text() == theirs
+    assert Path("a.txt").read_text() == (
+        "<<<<<<< HEAD\nours\n||||||| base\na\n=======\ntheirs\n>>>>>>> feature\n"
+    )
+    assert Path("src/b.txt").read_text() == "theirs\nb\nours\n"
+    assert get_status(temp_repo).modified == ["a.txt"]
+    with pytest.raises(MergeError):
+        merge(temp_repo, "feature")
+
+    merge_commit = commit_files(temp_repo, {"a.txt": "resolved\n"}, "Merge feature")
+
+    assert Commit.read(ObjectStore(temp_repo), merge_commit).parents == (ours, theirs)
+    assert not temp_repo.merge_head_file.exists()
+
+
+def test_merge_trees_skips_subtrees_changed_on_one_side(temp_repo, commit_files, monkeypatch):
+    files = {f"dir{d}/sub/f{i}.txt": f"{d} {i}\n" for d in range(5) for i in range(3)}
+    base, ours, theirs = _diverge(
+        temp_repo, commit_files, {"dir0/sub/f0.txt": "ours\n"}, {"dir1/sub/f1.txt": "theirs\n"}, base=files
+    )
+    store = ObjectStore(temp_repo)
+    trees = [Commit.read(store, c).tree for c in (base, ours, theirs)]
+
+    read = []
+    original = Tree.read
+    monkeypatch.setattr(Tree, "read", lambda s, h: (read.append(h), original(s, h))[1])
+    merged, conflicts = merge_trees(store, *trees)
+
+    assert conflicts == []
+    # Only the three root trees: dir0 and dir1 each changed on one side
+    assert len(read) == 3
+    entries = Tree.read(store, merged).entries
+    assert entries["dir0"] == Tree.read(store, trees[1]).entries["dir0"]
+    assert entries["dir1"] == Tree.read(store, trees[2]).entries["dir1"]
+
+
+def test_checkout_is_refused_during_a_merge(temp_repo, commit_files):
+    _diverge(temp_repo, commit_files, {"a.txt": "ours\n"}, {"a.txt": "theirs\n"})
+    create_branch(temp_repo, "other")
+    assert merge(temp_repo, "feature").status == "conflicts"
+
+    with pytest.raises(CheckoutError):
+        checkout_branch(temp_repo, "other")
+    assert temp_repo.current_branch() == "main"
+
+
+def test_merge_abort_restores_head(temp_repo, commit_files):
+    _, ours, _ = _diverge(
+        temp_repo,
+        commit_files,
+        {"a.txt": "ours\n"},
+        {"a.txt": "theirs\n", "src/b.txt": "theirs\n", "src/new.txt": "new\n"},
+    )
+    Path("untouched.txt").write_text("local\n")
+    assert merge(temp_repo, "feature").status == "conflicts"
+    Path("a.txt").write_text("resolved\n")
+    Index(temp_repo).add(Path("a.txt"), ObjectStore(temp_repo))
+
+    merge_abort(temp_repo)
+
+    assert not temp_repo.merge_head_file.exists()
+    assert temp_repo.head_commit() == ours
+    assert Path("a.txt").read_text() == "ours\n"
+    assert Path("src/b.txt").read_text() == "b\n"
+    assert not Path("src/new.txt").exists()
+    assert Path("untouched.txt").read_text() == "local\n"
+    status = get_status(temp_repo)
+    assert (status.staged, status.modified, status.untracked) == ([], [], ["untouched.txt"])
+    with pytest.raises(MergeError):
+        merge_abort(temp_repo)
+
+
+def test_failed_merge_removes_merge_head(temp_repo, commit_files, monkeypatch):
+    import vcs.merge
+
+    _diverge(temp_repo, commit_files, {"a.txt": "a\nours\n"}, {"src/b.txt": "theirs\n"})
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(vcs.merge, "create_commit", fail)
+
+    with pytest.raises(OSError):
+        merge(temp_repo, "feature")
+    assert not temp_repo.merge_head_file.exists()
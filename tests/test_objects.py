@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from vcs.objects import Commit, ObjectError, Tree, TreeEntries, TreeEntry
+from vcs.storage import ObjectStore
+from vcs.trees import diff_trees
+
+
+def _hash(n: int) -> str:
+    return f"{n:040x}"
+
+
+def test_tree_binary_roundtrip():
+    entries = {
+        "zeta.txt": TreeEntry("blob", _hash(1)),
+        "src": TreeEntry("tree", _hash(2)),
+        "ünïcode.md": TreeEntry("blob", _hash(3)),
+        "a.txt": TreeEntry("blob", _hash(4)),
+    }
+    data = Tree(entries).serialize()
+    assert data[:1] == b"\x01"
+
+    tree = Tree.deserialize(data)
+    assert isinstance(tree.entries, TreeEntries)
+    assert list(tree.entries) == ["a.txt", "src", "zeta.txt", "ünïcode.md"]
+    assert dict(tree.entries.items()) == entries
+    assert tree.entries == entries
+    assert tree.serialize() == data
+
+    assert tree.entries["src"] == TreeEntry("tree", _hash(2))
+    assert tree.entries.get("ünïcode.md").hash == _hash(3)
+    assert "missing" not in tree.entries
+    with pytest.raises(KeyError):
+        tree.entries["b.txt"]
+
+
+def test_commit_binary_roundtrip():
+    commit = Commit(tree=_hash(1), parents=(_hash(2),), message="fix: ünïcode\n\nbody", timestamp=1700000000)
+    assert Commit.deserialize(commit.serialize()) == commit
+    assert commit.parent == _hash(2)
+
+    root = Commit(tree=_hash(1), parents=(), message="", timestamp=0)
+    assert Commit.deserialize(root.serialize()) == root
+    assert root.parent is None
+
+    merge = Commit(tree=_hash(1), parents=(_hash(2), _hash(3)), message="Merge", timestamp=1)
+    assert Commit.deserialize(merge.serialize()).parents == (_hash(2), _hash(3))
+
+
+def test_json_objects_still_readable(temp_repo):
+    store = ObjectStore(temp_repo)
+    blob = store.store(b"content")
+    json_tree = store.store(json.dumps({
+        "type": "tree",
+        "entries": {"a.txt": {"kind": "blob", "hash": blob}, "old.txt": blob},
+    }, sort_keys=True).encode(), "tree")
+    json_commit = store.store(json.dumps({
+        "type": "commit", "tree": json_tree, "parent": None, "message": "old", "timestamp": 1,
+    }, sort_keys=True).encode(), "commit")
+
+    assert Commit.read(store, json_commit).tree == json_tree
+    entries = Tree.read(store, json_tree).entries
+    assert entries == {"a.txt": TreeEntry("blob", blob), "old.txt": TreeEntry(None, blob)}
+
+    # Diffs work across formats
+    new_tree = Tree({"a.txt": TreeEntry("blob", blob), "b.txt": TreeEntry("blob", blob)}).store(store)
+    assert list(diff_trees(store, json_tree, new_tree)) == [("b.txt", None, blob), ("old.txt", blob, None)]
+
+
+def test_unknown_format_version():
+    with pytest.raises(ObjectError):
+        Tree.deserialize(b"\x07" + bytes(4))
+    with pytest.raises(ObjectError):
+        Commit.deserialize(b"\x07" + bytes(29))
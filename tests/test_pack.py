@@ -0,0 +1,119 @@
+import pytest
+
+from vcs.storage import ObjectStore
+from vcs.pack import load_packs
+
+
+def test_repack_moves_loose_objects(temp_repo):
+    store = ObjectStore(temp_repo)
+
+    hashes = [store.store(f"object {i}".encode()) for i in range(50)]
+    tree_hash = store.store(b'{"entries": {}, "type": "tree"}', "tree")
+
+    stats = store.repack()
+    assert stats.objects == 51
+    assert not any(store._object_path(h).exists() for h in hashes)
+
+    fresh = ObjectStore(temp_repo)
+    for i, h in enumerate(hashes):
+        assert fresh.exists(h)
+        assert fresh.load(h) == f"object {i}".encode()
+    assert fresh.type_of(tree_hash) == "tree"
+    assert not fresh.exists("0" * 40)
+
+
+def test_pack_index_lookup(temp_repo):
+    store = ObjectStore(temp_repo)
+    hashes = sorted(store.store(bytes([i])) for i in range(256))
+    store.repack()
+
+    (pack,) = load_packs(store.pack_dir)
+    assert len(pack.index) == 256
+    assert list(pack.index) == hashes
+    for pos, h in enumerate(hashes):
+        assert pack.index.find(bytes.fromhex(h)) == pos
+
+
+def test_store_skips_objects_already_packed(temp_repo):
+    store = ObjectStore(temp_repo)
+    obj_hash = store.store(b"packed")
+    store.repack()
+
+    assert store.store(b"packed") == obj_hash
+    assert not store._object_path(obj_hash).exists()
+
+
+def test_full_repack_stores_deltas(temp_repo):
+    from vcs.repack import repack
+
+    store = ObjectStore(temp_repo)
+    base = b"".join(b"setting_%d = %d\n" % (i, i) for i in range(2000))
+    versions = [base.replace(b"= %d\n" % i, b"= changed\n") for i in range(10)]
+    hashes = [store.store(v) for v in versions]
+    store.repack()
+
+    stats = repack(temp_repo, full=True)
+    assert stats.deltas >= 8
+    assert len(load_packs(store.pack_dir)) == 1
+
+    fresh = ObjectStore(temp_repo)
+    for h, v in zip(hashes, versions):
+        assert fresh.load(h) == v
+
+
+def test_delta_chain_depth_is_bounded(temp_repo):
+    store = ObjectStore(temp_repo)
+    base = b"x" * 4096
+    hashes = [store.store(base + b"%d" % i) for i in range(6)]
+
+    def chain(pack, h):
+        raw = pack.raw_entry(h)
+        if b" delta\0" not in raw[:64]:
+            return 0
+        return 1 + chain(pack, raw[raw.index(b"\0") + 1:][:20].hex())
+
+    assert store.repack(depth=0).deltas == 0
+    (pack,) = load_packs(store.pack_dir)
+    assert max(chain(pack, h) for h in hashes) == 0
+
+    assert store.repack(full=True, depth=1).deltas == 5
+    (pack,) = load_packs(store.pack_dir)
+    assert max(chain(pack, h) for h in hashes) == 1
+    assert [ObjectStore(temp_repo).load(h) for h in hashes] == [base + b"%d" % i for i in range(6)]
+
+
+def test_repack_indexes_each_delta_base_once(temp_repo, monkeypatch):
+    import vcs.delta
+
+    store = ObjectStore(temp_repo)
+    base = b"".join(b"line %d\n" % i for i in range(500))
+    versions = [base + b"version %d\n" % i for i in range(5)]
+    hashes = [store.store(v) for v in versions]
+
+    # The window passes its own index; create_delta must not build one
+    monkeypatch.setattr(vcs.delta, "index_base", lambda base: pytest.fail("base indexed again"))
+    assert store.repack().deltas == 4
+    assert [ObjectStore(temp_repo).load(h) for h in hashes] == versions
+
+
+def test_repack_copies_big_blobs_without_delta_search(temp_repo, monkeypatch):
+    temp_repo.config.set("core.big_file_threshold", 1000)
+    store = ObjectStore(temp_repo)
+    base = bytes(range(256)) * 16
+    big = [store.store(base + bytes([i])) for i in range(3)]
+    small = [store.store(b"small %d" % i) for i in range(3)]
+
+    load_typed = ObjectStore.load_typed
+
+    def load_small(self, obj_hash, cache=True):
+        assert obj_hash not in big, "big blob loaded"
+        return load_typed(self, obj_hash, cache)
+
+    monkeypatch.setattr(ObjectStore, "load_typed", load_small)
+    stats = store.repack()
+    assert (stats.objects, stats.deltas) == (6, 0)
+    monkeypatch.undo()
+
+    fresh = ObjectStore(temp_repo)
+    assert [fresh.load(h) for h in big] == [base + bytes([i]) for i in range(3)]
+    assert [fresh.load(h) for h in small] == [b"small %d" % i for i in range(3)]
@@ -8,4 +8,169 @@ def test_object_store_roundtrip(temp_repo):
     obj_hash = store.store(data)
 
     loaded = store.load(obj_hash)
-    assert loaded == data
\ No newline at end of file
+    assert loaded == data
+
+def test_type_of_reads_header(temp_repo):
+    store = ObjectStore(temp_repo)
+
+    obj_hash = store.store(b'{"type": "tree"}', "blob")
+
+    assert store.type_of(obj_hash) == "blob"
+    assert store.load(obj_hash) == b'{"type": "tree"}'
+
+
+def test_legacy_objects_readable_and_migrated(temp_repo):
+    store = ObjectStore(temp_repo)
+
+    data = b'{"entries": {}, "type": "tree"}'
+    obj_hash = store.hash_object(data)
+    obj_path = store._object_path(obj_hash)
+    obj_path.parent.mkdir(parents=True)
+    obj_path.write_bytes(data)
+
+    assert store.load(obj_hash) == data
+    assert store.type_of(obj_hash) == "tree"
+
+    assert store.migrate() == 1
+    assert obj_path.read_bytes().startswith(b"tree ")
+    assert store.load(obj_hash) == data
+    assert store.migrate() == 0
+
+
+def test_objects_are_compressed(temp_repo):
+    store = ObjectStore(temp_repo)
+
+    data = b"line of text\n" * 1000
+    obj_hash = store.store(data)
+
+    raw = store._object_path(obj_hash).read_bytes()
+    assert raw.startswith(b"blob 13000 zlib\0")
+    assert len(raw) < len(data) // 10
+    assert store.load(obj_hash) == data
+
+
+def test_uncompressed_objects_stay_readable(temp_repo):
+    temp_repo.config.set("core.compression", "none")
+    plain = ObjectStore(temp_repo)
+    obj_hash = plain.store(b"plain data")
+    assert plain._object_path(obj_hash).read_bytes() == b"blob 10\0plain data"
+
+    temp_repo.config.set("core.compression", "zlib")
+    assert ObjectStore(temp_repo).load(obj_hash) == b"plain data"
+
+
+def test_iter_chunks_bounds_chunk_size(temp_repo, monkeypatch):
+    import vcs.storage
+
+    monkeypatch.setattr(vcs.storage, "OUTPUT_CHUNK", 4096)
+    store = ObjectStore(temp_repo)
+    data = b"\0" * 1_000_000  # compresses to ~1 KB
+    obj_hash = store.store(data)
+
+    chunks = list(store.iter_chunks(obj_hash))
+
+    assert max(len(c) for c in chunks) <= 4096
+    assert b"".join(chunks) == data
+
+
+def test_store_stream_matches_store(temp_repo, monkeypatch):
+    import io
+    import os
+    import vcs.storage
+
+    monkeypatch.setattr(vcs.storage, "STREAM_THRESHOLD", 1000)
+    store = ObjectStore(temp_repo)
+    data = os.urandom(50_000) + b"text\n" * 20_000
+
+    path = temp_repo.root / "big.bin"
+    path.write_bytes(data)
+    with path.open("rb") as f:
+        obj_hash = store.store_stream(f)
+    assert obj_hash == store.hash_object(data) == store.hash_file(path)
+
+    # Streams of unknown size are spooled first
+    assert store.store_stream(io.BytesIO(data)) == obj_hash
+    assert store.store_stream(io.BytesIO(b"small")) == store.hash_object(b"small")
+
+    with store.open_object(obj_hash) as reader:
+        assert reader.read(10) == data[:10]
+        assert reader.read() == data[10:]
+    assert not [p for p in store.objects_dir.iterdir() if p.name.startswith(".")]
+
+
+def test_store_stream_rejects_short_content(temp_repo, monkeypatch):
+    import io
+    import pytest
+    import vcs.storage
+    from vcs.storage import StorageError
+
+    monkeypatch.setattr(vcs.storage, "STREAM_THRESHOLD", 10)
+    store = ObjectStore(temp_repo)
+    with pytest.raises(StorageError):
+        store.store_stream(io.BytesIO(b"x" * 100), size=200)
+    assert not [p for p in store.objects_dir.iterdir() if p.name.startswith(".")]
+
+
+def test_adding_large_file_uses_constant_memory(temp_repo):
+    import tracemalloc
+    from pathlib import Path
+    from vcs.index import Index
+
+    path = Path("large.bin")
+    with path.open("wb") as f:
+        for i in range(64):
+            f.write(bytes([i]) * (1024 * 1024))
+
+    store = ObjectStore(temp_repo)
+    tracemalloc.start()
+    Index(temp_repo).add(path, store)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < 8 * 1024 * 1024
+    entry = Index(temp_repo).entries["large.bin"]
+    assert entry.hash == store.hash_file(path)
+
+
+def test_batch_publishes_objects_on_exit(temp_repo):
+    store = ObjectStore(temp_repo)
+    assert store.durability == "batch"
+
+    with store.batch():
+        obj_hash = store.store(b"batched")
+        assert not store._object_path(obj_hash).exists()
+        assert store.exists(obj_hash)
+        assert store.load(obj_hash) == b"batched"
+        assert store.store(b"batched") == obj_hash
+
+    assert store._object_path(obj_hash).exists()
+    assert ObjectStore(temp_repo).load(obj_hash) == b"batched"
+    assert not [p for p in store.objects_dir.iterdir() if p.name.startswith(".")]
+
+
+def test_failed_write_leaves_no_object(temp_repo, monkeypatch):
+    import os
+    import pytest
+
+    temp_repo.config.set("core.durability", "full")
+    store = ObjectStore(temp_repo)
+
+    def crash(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "fsync", crash)
+    with pytest.raises(OSError):
+        store.store(b"never written")
+
+    obj_hash = store.hash_object(b"never written")
+    assert not store.exists(obj_hash)
+    assert not [p for p in store.objects_dir.rglob("*") if p.is_file()]
+
+
+def test_unknown_durability_mode(temp_repo):
+    import pytest
+    from vcs.storage import StorageError
+
+    temp_repo.config.set("core.durability", "sometimes")
+    with pytest.raises(StorageError):
+        ObjectStore(temp_repo)
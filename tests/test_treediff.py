@@ -0,0 +1,85 @@
+from pathlib import Path
+
+from vcs.commit import create_commit
+from vcs.index import Index
+from vcs.storage import ObjectStore
+from vcs.treediff import diff_commits, diff_index_vs_head, format_change, format_name_status
+
+
+def _stage(repo, files):
+    store = ObjectStore(repo)
+    index = Index(repo)
+    for path, content in files.items():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(content)
+        index.add(Path(path), store)
+
+
+def _body(n):
+    return "".join(f"line {i} of a file that is long enough to compare\n" for i in range(n))
+
+
+def test_diff_commits_detects_renames(temp_repo):
+    _stage(temp_repo, {
+        "keep.txt": "keep",
+        "edit.txt": "old",
+        "moved.txt": "same content",
+        "src/big.py": _body(40),
+        "gone.txt": "bye",
+    })
+    first = create_commit(temp_repo, "first")
+
+    index = Index(temp_repo)
+    for path in ("moved.txt", "src/big.py", "gone.txt"):
+        Path(path).unlink()
+        index.remove(Path(path))
+    _stage(temp_repo, {
+        "edit.txt": "new",
+        "lib/moved.txt": "same content",
+        "lib/big.py": _body(40) + "one more line\n",
+        "fresh.txt": "hi",
+    })
+    second = create_commit(temp_repo, "second")
+
+    changes = [format_name_status(c) for c in diff_commits(temp_repo, first, second[:8])]
+    assert changes == [
+        "M\tedit.txt",
+        "A\tfresh.txt",
+        "D\tgone.txt",
+        "R099\tsrc/big.py\tlib/big.py",
+        "R100\tmoved.txt\tlib/moved.txt",
+    ]
+
+
+def test_rename_limit_keeps_exact_renames_only(temp_repo):
+    _stage(temp_repo, {"a.py": _body(40), "b.txt": "exact"})
+    first = create_commit(temp_repo, "first")
+
+    index = Index(temp_repo)
+    for path in ("a.py", "b.txt"):
+        Path(path).unlink()
+        index.remove(Path(path))
+    _stage(temp_repo, {"c.py": _body(40) + "x\n", "d.txt": "exact"})
+    create_commit(temp_repo, "second")
+
+    temp_repo.config.set("diff.rename_limit", 0)
+    statuses = [c.status for c in diff_commits(temp_repo, first, "HEAD")]
+    assert sorted(statuses) == ["A", "D", "R"]
+
+
+def test_cached_diff(temp_repo):
+    _stage(temp_repo, {"a.txt": "one\n", "dir/b.txt": "b\n"})
+    create_commit(temp_repo, "first")
+    assert diff_index_vs_head(temp_repo) == []
+
+    _stage(temp_repo, {"a.txt": "two\n"})
+    (change,) = diff_index_vs_head(temp_repo)
+    assert change.status == "M"
+    assert format_change(ObjectStore(temp_repo), change).splitlines() == [
+        "diff --git a/a.txt b/a.txt",
+        "--- a/a.txt",
+        "+++ b/a.txt",
+        "@@ -1 +1 @@",
+        "-one",
+        "+two",
+    ]
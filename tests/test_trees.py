@@ -0,0 +1,28 @@
+from vcs.storage import ObjectStore
+from vcs.objects import Tree, TreeEntry
+from vcs.trees import diff_trees, flatten_tree
+
+
+def _tree(store, entries):
+    return Tree(entries).store(store)
+
+
+def test_diff_trees_skips_identical_subtrees(temp_repo):
+    store = ObjectStore(temp_repo)
+    a = store.store(b"a")
+    b = store.store(b"b")
+    shared = _tree(store, {"lib.txt": TreeEntry("blob", a)})
+
+    old = _tree(store, {"vendor": TreeEntry("tree", shared), "x.txt": TreeEntry("blob", a)})
+    new = _tree(store, {"vendor": TreeEntry("tree", shared), "x.txt": TreeEntry("blob", b),
+                        "y.txt": TreeEntry("blob", a)})
+
+    loaded = []
+    original = store.load
+    store.load = lambda h, *args, **kwargs: (loaded.append(h), original(h, *args, **kwargs))[1]
+
+    changes = list(diff_trees(store, old, new))
+
+    assert changes == [("x.txt", a, b), ("y.txt", None, a)]
+    assert shared not in loaded
+    assert flatten_tree(store, new) == {"vendor/lib.txt": a, "x.txt": b, "y.txt": a}
@@ -0,0 +1,13 @@
+from pathlib import Path
+from vcs.worktree import iter_files
+
+
+def test_iter_files_in_path_order_and_pruned(temp_repo):
+    for path in ("a.txt", "a/b.txt", "a-b.txt", "build/out.o", "z.txt"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(path)
+
+    paths = [p for p, _ in iter_files(temp_repo.root, prune=lambda d: d == "build")]
+
+    assert paths == ["a-b.txt", "a.txt", "a/b.txt", "z.txt"]
+    assert paths == sorted(paths)
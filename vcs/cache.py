@@ -0,0 +1,80 @@
+"""
+In-process cache of objects read from the store, shared by everything
+working on one Repository: decoded trees and commits, and the raw
+content of small blobs. Objects are immutable, so entries never go
+stale; the least recently used ones are evicted to stay within a byte
+budget.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+# Approximate cost of a cached entry beyond its encoded size
+ENTRY_OVERHEAD = 200
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+class ObjectCache:
+    """
+    Byte-bounded LRU cache. A max_bytes of 0 disables it: nothing is
+    stored, but lookups are still counted.
+    Cached values are shared and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Cache value, charged as size bytes plus a fixed overhead.
+        """
+        cost = size + ENTRY_OVERHEAD
+        if cost > self.max_bytes // 4:
+            return  # too large to be worth evicting others for
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = (value, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._items), self._bytes)
@@ -1,94 +1,291 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+import os
 import shutil
+import stat
+from typing import Dict, List, Optional, Set
 
 from .repo import Repository
 from .storage import ObjectStore
-from .objects import Blob, Tree
-from .index import Index
+from .objects import Commit, Tree, entry_kind
+from .index import Index, IndexEntry
 from .refs import RefError
+from .trees import TreeChange, changed_entries, diff_trees
+from .utils import lstat_or_none
+from .worktree import iter_files
 
 
 class CheckoutError(Exception):
     pass
 
 
-def _restore_tree(repo: Repository, store: ObjectStore, tree_hash: str, target: Path):
+def _commit_tree(store: ObjectStore, commit_hash: Optional[str]) -> Optional[str]:
+    if not commit_hash:
+        return None
+    return Commit.read(store, commit_hash).tree
+
+
+def _is_dirty(
+    repo: Repository,
+    store: ObjectStore,
+    index: Index,
+    path: str,
+    old_blob: Optional[str],
+    new_blob: Optional[str],
+    removed: Set[str],
+) -> bool:
     """
-    Recursively restore a Tree object into target directory.
+    Return True if checking out would lose local changes to path:
+    staged changes, edits to a tracked file, or an untracked file in
+    the way of a new one. removed holds the paths the checkout deletes.
     """
-    tree_data = store.load(tree_hash)
-    tree = Tree.deserialize(tree_data)
+    entry = index.entries.get(path)
+    if entry is not None and entry.hash not in (old_blob, new_blob):
+        return True  # staged content would be lost
+
+    abs_path = repo.root / path
+    st = lstat_or_none(abs_path)
+    if st is None:
+        return False  # nothing on disk to lose
+    if stat.S_ISDIR(st.st_mode):
+        # A directory in the way of a new file can go if it only holds
+        # files the checkout removes; those are checked on their own
+        return any(
+            rel_path not in removed
+            for rel_path, _ in iter_files(abs_path, prefix=path + "/")
+        )
+    if not abs_path.is_file():
+        return True  # a special file is in the way
+
+    if entry is not None and index.stat_unchanged(path, st):
+        return entry.hash not in (old_blob, new_blob)
+
+    current = store.hash_file(abs_path)
+    return current not in (old_blob, new_blob)
+
 
-    for name, obj_hash in tree.entries.items():
-        obj_path = target / name
-        # Check if it's a blob or subtree
-        obj_data = store.load(obj_hash)
+def _remove_empty_parents(repo: Repository, path: Path) -> None:
+    parent = path.parent
+    while parent != repo.root:
         try:
-            subtree = Tree.deserialize(obj_data)
-            # It's a Tree
-            obj_path.mkdir(exist_ok=True)
-            _restore_tree(repo, store, obj_hash, obj_path)
-        except Exception:
-            # Not a Tree → assume Blob
-            blob = Blob.deserialize(obj_data)
-            obj_path.parent.mkdir(parents=True, exist_ok=True)
-            obj_path.write_bytes(blob.data)
+            parent.rmdir()
+        except OSError:
+            return  # not empty
+        parent = parent.parent
 
 
-def checkout_branch(repo: Repository, branch_name: str):
+def _write_blob(store: ObjectStore, path: str, blob_hash: str, abs_path: Path):
     """
-    Switch to a branch:
-    - Updates HEAD
-    - Restores working directory from commit tree
+    Stream a blob into a working file chunk by chunk.
+    Returns (path, stat of the written file).
     """
-    from .refs import checkout as update_head
+    with abs_path.open("wb") as f:
+        for chunk in store.iter_chunks(blob_hash):
+            f.write(chunk)
+    return path, os.lstat(abs_path)
 
-    update_head(repo, branch_name)
 
-    commit_hash = repo.head_commit()
-    if not commit_hash:
-        return  # empty branch, nothing to restore
+def _write_files(store: ObjectStore, writes, workers: int) -> Dict[str, os.stat_result]:
+    """
+    Write planned files, using a thread pool when workers > 1.
+    At most a few tasks per worker are queued at a time, so memory stays
+    bounded by workers x chunk size regardless of the number of files.
+    """
+    if workers <= 1 or len(writes) <= 1:
+        return dict(_write_blob(store, *w) for w in writes)
 
-    store = ObjectStore(repo)
-    commit_data = store.load(commit_hash)
-    from .objects import Commit
+    store.packs  # map pack files once, before threads share the store
+    results: Dict[str, os.stat_result] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for w in writes:
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.update(f.result() for f in done)
+            pending.add(pool.submit(_write_blob, store, *w))
+        results.update(f.result() for f in pending)
+    return results
 
-    commit = Commit.deserialize(commit_data)
-    root_tree_hash = commit.tree
 
-    # Clear working directory (except .pyvcs)
-    for item in repo.root.iterdir():
-        if item.name == ".pyvcs":
+def _carry_cache_tree(
+    store: ObjectStore,
+    index: Index,
+    before: Dict[str, str],
+    old_tree: Optional[str],
+    new_tree: Optional[str],
+) -> None:
+    """
+    After switching trees, mark directories that matched old_tree in the
+    cache-tree as matching new_tree, so the next commit or status does
+    not rewrite them. Only directories that differ are visited.
+    """
+    trees: Dict[str, str] = {}
+    stack = [("", old_tree, new_tree)]
+    while stack:
+        directory, old_hash, new_hash = stack.pop()
+        if old_hash is None or new_hash is None or old_hash == new_hash:
             continue
-        if item.is_dir():
-            shutil.rmtree(item)
-        else:
-            item.unlink()
+        if before.get(directory) == old_hash:
+            trees[directory] = new_hash
 
-    # Restore tree
-    _restore_tree(repo, store, root_tree_hash, repo.root)
+        old = Tree.read(store, old_hash).entries
+        new = Tree.read(store, new_hash).entries
+        prefix = directory + "/" if directory else ""
+        for name, old_entry, new_entry in changed_entries(old, new):
+            if old_entry is None or new_entry is None:
+                continue
+            if entry_kind(old_entry, store) == "tree" and entry_kind(new_entry, store) == "tree":
+                stack.append((prefix + name, old_entry.hash, new_entry.hash))
+    index.update_cache_tree(trees)
 
 
-def checkout_commit(repo: Repository, commit_hash: str):
+def _apply_changes(
+    repo: Repository,
+    store: ObjectStore,
+    index: Index,
+    changes: List[TreeChange],
+    old_tree: Optional[str],
+    new_tree: Optional[str],
+    workers: Optional[int] = None,
+) -> None:
     """
-    Checkout a specific commit (detached HEAD).
-    Currently updates files only; does not change symbolic HEAD.
+    Update the working tree and index for a list of tree changes, in two
+    stages: first remove files and plan the directories and files to
+    create, then write file contents in parallel.
     """
-    store = ObjectStore(repo)
-    commit_data = store.load(commit_hash)
-    from .objects import Commit
+    if workers is None:
+        workers = int(repo.config.get("checkout.workers")) or os.cpu_count() or 1
 
-    commit = Commit.deserialize(commit_data)
-    root_tree_hash = commit.tree
+    before = dict(index.cache_tree)
+    updates: Dict[str, Optional[IndexEntry]] = {}
 
-    # Clear working directory (except .pyvcs)
-    for item in repo.root.iterdir():
-        if item.name == ".pyvcs":
+    # Stage 1: removals first, so files can replace directories and back
+    writes = []
+    for path, old_blob, new_blob in changes:
+        abs_path = repo.root / path
+        if new_blob is not None:
+            writes.append((path, new_blob, abs_path))
             continue
-        if item.is_dir():
-            shutil.rmtree(item)
-        else:
-            item.unlink()
 
-    # Restore tree
-    _restore_tree(repo, store, root_tree_hash, repo.root)
\ No newline at end of file
+        if abs_path.is_file() or abs_path.is_symlink():
+            abs_path.unlink()
+            _remove_empty_parents(repo, abs_path)
+        updates[path] = None
+
+    for path, blob_hash, abs_path in writes:
+        if abs_path.is_dir() and not abs_path.is_symlink():
+            shutil.rmtree(abs_path)
+
+    for directory in sorted({abs_path.parent for _, _, abs_path in writes}):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # Stage 2: file contents
+    written = _write_files(store, writes, workers)
+
+    for path, blob_hash, _ in writes:
+        updates[path] = IndexEntry.from_stat(blob_hash, written[path])
+
+    with index.batch():
+        index.update_entries(updates)
+        _carry_cache_tree(store, index, before, old_tree, new_tree)
+
+
+def switch_tree(
+    repo: Repository,
+    store: ObjectStore,
+    old_tree: Optional[str],
+    new_tree: Optional[str],
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Move the working tree from old_tree to new_tree, touching only the
+    paths that differ. Untracked files are left alone.
+    """
+    changes = list(diff_trees(store, old_tree, new_tree))
+    if not changes:
+        return
+
+    # The index stays locked from the safety check to the update
+    index = Index(repo)
+    with index.batch():
+        removed = {path for path, _, new_blob in changes if new_blob is None}
+        dirty = [
+            path for path, old_blob, new_blob in changes
+            if _is_dirty(repo, store, index, path, old_blob, new_blob, removed)
+        ]
+        if dirty:
+            listing = "\n".join(f"  {p}" for p in dirty)
+            raise CheckoutError(
+                f"Your local changes would be overwritten by checkout:\n{listing}"
+            )
+
+        _apply_changes(repo, store, index, changes, old_tree, new_tree, workers)
+
+
+def reset_tree(
+    repo: Repository,
+    store: ObjectStore,
+    old_tree: Optional[str],
+    new_tree: Optional[str],
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Like switch_tree, but local changes to the paths that differ are
+    overwritten instead of refused.
+    """
+    changes = list(diff_trees(store, old_tree, new_tree))
+    if changes:
+        index = Index(repo)
+        with index.batch():
+            _apply_changes(repo, store, index, changes, old_tree, new_tree, workers)
+
+
+def _check_no_merge(repo: Repository) -> None:
+    # A commit on another branch would get MERGE_HEAD as a parent
+    if repo.merge_head_file.exists():
+        raise CheckoutError("A merge is in progress; commit it or abort it first")
+
+
+def checkout_branch(repo: Repository, branch_name: str, workers: Optional[int] = None):
+    """
+    Switch to a branch:
+    - Updates the working directory paths that differ between trees
+    - Updates HEAD
+    Refuses to run if that would overwrite local changes.
+    """
+    from .refs import checkout as update_head
+
+    ref_path = repo.heads_dir / branch_name
+    if not ref_path.exists():
+        raise RefError(f"Branch '{branch_name}' does not exist")
+    _check_no_merge(repo)
+
+    target_commit = ref_path.read_text().strip() or None
+    if target_commit:
+        store = ObjectStore(repo)
+        switch_tree(
+            repo,
+            store,
+            _commit_tree(store, repo.head_commit()),
+            _commit_tree(store, target_commit),
+            workers,
+        )
+    # else: empty branch, nothing to restore
+
+    update_head(repo, branch_name)
+
+
+def checkout_commit(repo: Repository, commit_hash: str, workers: Optional[int] = None):
+    """
+    Checkout a specific commit (detached HEAD).
+    Currently updates files only; does not change symbolic HEAD.
+    """
+    _check_no_merge(repo)
+    store = ObjectStore(repo)
+    switch_tree(
+        repo,
+        store,
+        _commit_tree(store, repo.head_commit()),
+        _commit_tree(store, commit_hash),
+        workers,
+    )
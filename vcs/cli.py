@@ -1,15 +1,23 @@
 import argparse
+import os
 from pathlib import Path
 import sys
 
 from .repo import Repository
 from .storage import ObjectStore
-from .index import Index
+from .index import Index, IndexError
 from .commit import create_commit
-from .refs import create_branch, list_branches, checkout
+from .refs import RefError, create_branch, list_branches, checkout
 from .checkout import checkout_branch
 from .status import get_status
 from .diff import diff_working_vs_index
+from .treediff import diff_commits, diff_index_vs_head, format_change, format_name_status
+from .repack import repack
+from .log import iter_log, format_commit
+from .objects import Commit
+from .merge import merge, merge_abort
+from .gc import GCError, gc
+from . import fsmonitor
 
 # --------------------------
 # Command implementations
@@ -25,10 +33,17 @@ def cmd_add(args):
     store = ObjectStore(repo)
     index = Index(repo)
 
-    for path_str in args.paths:
-        path = Path(path_str)
-        index.add(path, store)
-        print(f"Added {path} to staging area")
+    paths = [Path(p) for p in args.paths]
+    try:
+        staged = index.add_many(paths, store, workers=args.jobs)
+    except IndexError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    for rel_path in staged:
+        if rel_path in index.entries:
+            print(f"Added {rel_path} to staging area")
+        else:
+            print(f"Removed {rel_path} from staging area")
 
 
 def cmd_commit(args):
@@ -89,7 +104,33 @@ def cmd_status(args):
 
 def cmd_diff(args):
     repo = Repository.find(Path.cwd())
-    diffs = diff_working_vs_index(repo)
+    context = args.unified
+    if args.cached or args.revs:
+        try:
+            if args.cached:
+                changes = diff_index_vs_head(repo)
+            elif len(args.revs) == 1:
+                changes = diff_commits(repo, args.revs[0], "HEAD")
+            elif len(args.revs) == 2:
+                changes = diff_commits(repo, args.revs[0], args.revs[1])
+            else:
+                print("Error: diff takes at most two commits")
+                return
+        except RefError as e:
+            print(f"Error: {e}")
+            return
+
+        store = ObjectStore(repo)
+        if context is None:
+            context = int(repo.config.get("diff.context"))
+        for change in changes:
+            if args.name_status:
+                print(format_name_status(change))
+            else:
+                print(format_change(store, change, context), end="")
+        return
+
+    diffs = diff_working_vs_index(repo, context=context)
 
     if not diffs:
         return
@@ -98,6 +139,121 @@ def cmd_diff(args):
         print(d.diff)
 
 
+def cmd_log(args):
+    repo = Repository.find(Path.cwd())
+    store = ObjectStore(repo)
+
+    paths = []
+    for p in args.paths:
+        abs_path = Path(p).resolve()
+        if not abs_path.is_relative_to(repo.root):
+            print(f"Error: {p} is outside the repository")
+            sys.exit(1)
+        rel = abs_path.relative_to(repo.root).as_posix()
+        if rel != ".":
+            paths.append(rel)
+
+    for count, commit_hash in enumerate(iter_log(repo, paths=paths)):
+        if args.max_count is not None and count >= args.max_count:
+            break
+        commit = Commit.read(store, commit_hash)
+        print(format_commit(commit_hash, commit, oneline=args.oneline))
+
+
+def cmd_merge(args):
+    repo = Repository.find(Path.cwd())
+    if args.abort:
+        try:
+            merge_abort(repo)
+        except Exception as e:
+            print(f"Error: {e}")
+        return
+    if args.rev is None:
+        print("Error: merge needs a branch or commit to merge, or --abort")
+        return
+
+    try:
+        result = merge(repo, args.rev, message=args.message)
+    except Exception as e:
+        print(f"Error: {e}")
+        return
+
+    if result.status == "up-to-date":
+        print("Already up to date")
+    elif result.status == "fast-forward":
+        print(f"Fast-forward to {result.commit}")
+    elif result.status == "merged":
+        print(f"Merged: {result.commit}")
+    else:
+        for path in result.conflicts:
+            print(f"CONFLICT: {path}")
+        print("Automatic merge failed; fix conflicts, add the files and commit the result")
+
+
+def cmd_migrate(args):
+    repo = Repository.find(Path.cwd())
+    store = ObjectStore(repo)
+    count = store.migrate()
+    print(f"Migrated {count} object(s)")
+    if Index(repo).upgrade():
+        print("Upgraded the index")
+
+
+def cmd_pack(args):
+    repo = Repository.find(Path.cwd())
+    stats = repack(repo, full=args.all)
+    if stats.name is None:
+        print("Nothing to pack")
+    else:
+        print(f"Packed {stats.objects} object(s) ({stats.deltas} delta) into {stats.name}")
+
+
+def cmd_gc(args):
+    repo = Repository.find(Path.cwd())
+    try:
+        stats = gc(repo, prune_expire=args.prune_expire)
+    except GCError as e:
+        print(f"Error: {e}")
+        return
+    print(
+        f"{stats.reachable} of {stats.objects} object(s) reachable; "
+        f"pruned {stats.pruned} object(s), reclaimed {stats.bytes_reclaimed} bytes"
+    )
+
+
+def cmd_config(args):
+    repo = Repository.find(Path.cwd())
+    if args.value is None:
+        print(repo.config.get(args.key))
+        return
+
+    value = args.value
+    if value.lstrip("-").isdigit():
+        value = int(value)
+    repo.config.set(args.key, value)
+
+
+def cmd_fsmonitor(args):
+    repo = Repository.find(Path.cwd())
+    if args.action == "start":
+        try:
+            info = fsmonitor.start(repo, mode="poll" if args.poll else "auto")
+            print(f"fsmonitor running (pid {info['pid']}, {info['mode']})")
+        except fsmonitor.FSMonitorError as e:
+            print(f"Error: {e}")
+    elif args.action == "stop":
+        if fsmonitor.stop(repo):
+            print("fsmonitor stopped")
+        else:
+            print("fsmonitor is not running")
+    else:
+        info = fsmonitor.daemon_info(repo)
+        if info is None:
+            print("fsmonitor is not running")
+        else:
+            print(f"fsmonitor running (pid {info['pid']}, {info['mode']})")
+
+
 # --------------------------
 # Argument parser setup
 # --------------------------
@@ -112,7 +268,11 @@ def main():
 
     # add
     sp_add = subparsers.add_parser("add", help="Add file(s) to staging area")
-    sp_add.add_argument("paths", nargs="+", help="Paths to files to add")
+    sp_add.add_argument("paths", nargs="+", help="Paths to files or directories to add")
+    sp_add.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Number of threads hashing and storing files",
+    )
     sp_add.set_defaults(func=cmd_add)
 
     # commit
@@ -129,15 +289,71 @@ def main():
     sp_checkout = subparsers.add_parser("checkout", help="Switch branches")
     sp_checkout.add_argument("name", help="Branch name to checkout")
     sp_checkout.set_defaults(func=cmd_checkout)
-    
+
+    # merge
+    sp_merge = subparsers.add_parser("merge", help="Merge a branch into the current branch")
+    sp_merge.add_argument("rev", nargs="?", help="Branch or commit to merge")
+    sp_merge.add_argument("-m", "--message", help="Message of the merge commit")
+    sp_merge.add_argument(
+        "--abort", action="store_true",
+        help="Abandon a merge with conflicts and go back to HEAD",
+    )
+    sp_merge.set_defaults(func=cmd_merge)
+
     # status
     sp_status = subparsers.add_parser("status", help="Show working tree status")
     sp_status.set_defaults(func=cmd_status)
 
     # diff
     sp_diff = subparsers.add_parser("diff", help="Show unstaged changes")
+    sp_diff.add_argument(
+        "-U", "--unified", type=int, metavar="N",
+        help="Lines of context around changes (default: diff.context, 3)",
+    )
+    sp_diff.add_argument("--cached", action="store_true", help="Compare the index with HEAD")
+    sp_diff.add_argument("--name-status", action="store_true", help="Only list changed paths")
+    sp_diff.add_argument(
+        "revs", nargs="*", metavar="commit",
+        help="Compare two commits, or one commit with HEAD",
+    )
     sp_diff.set_defaults(func=cmd_diff)
 
+    # pack
+    sp_pack = subparsers.add_parser("pack", help="Move loose objects into a pack file")
+    sp_pack.add_argument("-a", "--all", action="store_true", help="Also repack objects already in packs")
+    sp_pack.set_defaults(func=cmd_pack)
+
+    # gc
+    sp_gc = subparsers.add_parser("gc", help="Delete unreachable loose objects")
+    sp_gc.add_argument(
+        "--prune-expire", type=int, metavar="SECONDS",
+        help="Keep unreachable objects younger than this (default: gc.prune_expire; 0 keeps none)",
+    )
+    sp_gc.set_defaults(func=cmd_gc)
+
+    # config
+    sp_config = subparsers.add_parser("config", help="Get or set a repository option")
+    sp_config.add_argument("key", help="Option name, e.g. core.compression")
+    sp_config.add_argument("value", nargs="?", help="New value")
+    sp_config.set_defaults(func=cmd_config)
+
+    # log
+    sp_log = subparsers.add_parser("log", help="Show commit history")
+    sp_log.add_argument("-n", "--max-count", type=int, help="Limit the number of commits shown")
+    sp_log.add_argument("--oneline", action="store_true", help="Show one line per commit")
+    sp_log.add_argument("paths", nargs="*", help="Only show commits touching these paths")
+    sp_log.set_defaults(func=cmd_log)
+
+    # fsmonitor
+    sp_fsmonitor = subparsers.add_parser("fsmonitor", help="Control the filesystem monitor daemon")
+    sp_fsmonitor.add_argument("action", choices=["start", "stop", "status"])
+    sp_fsmonitor.add_argument("--poll", action="store_true", help="Poll the tree instead of using inotify")
+    sp_fsmonitor.set_defaults(func=cmd_fsmonitor)
+
+    # migrate
+    sp_migrate = subparsers.add_parser("migrate", help="Upgrade objects and the index to the current formats")
+    sp_migrate.set_defaults(func=cmd_migrate)
+
     # Parse arguments and dispatch
     args = parser.parse_args()
     if hasattr(args, "func"):
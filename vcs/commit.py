@@ -1,44 +1,66 @@
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 from .repo import Repository, RepositoryError
 from .storage import ObjectStore
-from .objects import Tree, Commit
+from .objects import Tree, TreeEntry, Commit
 from .index import Index
+from .commitgraph import update_commit_graph
+from .refs import update_ref
 
 
 class CommitError(Exception):
     pass
 
 
-def _build_tree(entries: Dict[str, str], store: ObjectStore) -> str:
+def write_index_tree(index: Index, store: ObjectStore) -> str:
     """
-    Build nested Tree objects from index entries and return root tree hash.
-    entries: { "dir/file.txt": blob_hash }
+    Write the trees of the index and return the root tree hash.
+    Only directories missing from the index cache-tree (those containing
+    changed entries) are written; every other subtree hash is reused.
+    The cache-tree is updated with the new directory hashes.
     """
-    tree_map: Dict[str, dict] = {}
-
-    # Build nested dict structure
-    for path, blob_hash in entries.items():
-        parts = path.split("/")
-        current = tree_map
-        for part in parts[:-1]:
-            current = current.setdefault(part, {})
-        current[parts[-1]] = blob_hash
-
-    def write_tree(node: dict) -> str:
-        tree_entries = {}
-        for name, value in node.items():
-            if isinstance(value, dict):
-                subtree_hash = write_tree(value)
-                tree_entries[name] = subtree_hash
-            else:
-                tree_entries[name] = value
-
-        tree = Tree(tree_entries)
-        return tree.store(store)
-
-    return write_tree(tree_map)
+    cache = dict(index.cache_tree)
+    if "" in cache:
+        return cache[""]
+
+    # Immediate children of each directory that has to be rewritten
+    pending: Dict[str, Dict[str, TreeEntry]] = {}
+    seen_dirs = set()
+
+    for path, entry in index.entries.items():
+        directory, _, name = path.rpartition("/")
+        if directory not in cache:
+            pending.setdefault(directory, {})[name] = TreeEntry("blob", entry.hash)
+
+        # Register each directory with its parent, once per directory
+        while directory and directory not in seen_dirs:
+            seen_dirs.add(directory)
+            parent, _, name = directory.rpartition("/")
+            if parent not in cache:
+                pending.setdefault(parent, {})[name] = None
+            directory = parent
+
+    # Deepest directories first, so subtree hashes are known for parents.
+    # The trees are synced before the cache-tree can refer to them.
+    with store.batch():
+        for directory in sorted(pending, key=lambda d: d.count("/") + bool(d), reverse=True):
+            prefix = directory + "/" if directory else ""
+            entries = {
+                name: value or TreeEntry("tree", cache[prefix + name])
+                for name, value in pending[directory].items()
+            }
+            cache[directory] = Tree(entries).store(store)
+
+    index.update_cache_tree({d: cache[d] for d in pending})
+    return cache[""]
+
+
+def _read_merge_head(repo: Repository) -> Optional[str]:
+    try:
+        return repo.merge_head_file.read_text().strip() or None
+    except FileNotFoundError:
+        return None
 
 
 def create_commit(
@@ -48,32 +70,42 @@ def create_commit(
     """
     Create a commit from the current index and update HEAD.
     Returns the new commit hash.
+    While a merge is in progress (MERGE_HEAD exists), the commit being
+    merged becomes the second parent, concluding the merge.
+    The index stays locked throughout, and the branch is only moved if
+    it still points at the parent, so concurrent commits never discard
+    each other.
     """
     index = Index(repo)
     store = ObjectStore(repo)
 
-    if not index.entries:
-        raise CommitError("Nothing to commit")
-
-    # Build tree from index
-    root_tree_hash = _build_tree(index.entries, store)
-
-    # Get parent commit (if any)
-    parent = repo.head_commit()
-
-    # Create and store commit
-    commit = Commit.create(
-        tree_hash=root_tree_hash,
-        message=message,
-        parent=parent,
-    )
-    commit_hash = commit.store(store)
-
-    # Update current branch reference
-    ref_path = repo.head_ref_path()
-    ref_path.write_text(commit_hash)
-
-    # Clear staging area
-    index.clear()
+    with index.batch():
+        if not index.entries:
+            raise CommitError("Nothing to commit")
+
+        # Build tree from index, reusing unchanged subtrees
+        root_tree_hash = write_index_tree(index, store)
+
+        # Get parent commit (if any)
+        parent = repo.head_commit()
+        merge_head = _read_merge_head(repo)
+        if merge_head and not parent:
+            raise CommitError("Cannot conclude a merge on a branch without commits")
+        if not merge_head and parent and Commit.read(store, parent).tree == root_tree_hash:
+            raise CommitError("Nothing to commit")
+
+        # Create and store commit
+        commit = Commit.create(
+            tree_hash=root_tree_hash,
+            message=message,
+            parents=[p for p in (parent, merge_head) if p],
+        )
+        commit_hash = commit.store(store)
+
+        # Update current branch reference
+        update_ref(repo, repo.head_ref_path(), commit_hash, old=parent or "")
+        update_commit_graph(repo, store, commit_hash)
+        if merge_head:
+            repo.merge_head_file.unlink()
 
     return commit_hash
\ No newline at end of file
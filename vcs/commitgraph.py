@@ -0,0 +1,197 @@
+"""
+Commit-graph: a compact cache of commit metadata for history walks.
+
+.pyvcs/commit-graph
+    b"PVCG" | version u32
+    records, RECORD.size bytes each, appended as commits are created:
+        commit hash   20 bytes raw
+        tree hash     20 bytes raw
+        parent 1      u32 record position, NO_PARENT if none
+        parent 2      u32 record position, NO_PARENT if none
+        timestamp     i64
+        generation    u32, 1 for root commits, else 1 + max(parents)
+
+Parents always precede their children, so positions are a topological
+order. A trailing partial record (interrupted append) is ignored.
+Appends hold commit-graph.lock and reread the file first, so processes
+building the graph at once never truncate or misnumber each other's
+records; readers take no lock.
+"""
+import struct
+from typing import Dict, List, Optional
+
+from .repo import Repository
+from .storage import ObjectStore
+from .objects import Commit
+
+
+GRAPH_MAGIC = b"PVCG"
+GRAPH_VERSION = 1
+GRAPH_FILE = "commit-graph"
+
+_HEADER = struct.Struct(">4sI")
+RECORD = struct.Struct(">20s20sIIqI")
+NO_PARENT = 0xFFFFFFFF
+
+# Parents of a new commit are almost always among the latest records.
+_TAIL_SCAN = 64
+
+
+class CommitGraphError(Exception):
+    pass
+
+
+class CommitGraph:
+    def __init__(self, repo: Repository):
+        self.repo = repo
+        self.path = repo.vcs_dir / GRAPH_FILE
+        self._positions: Optional[Dict[bytes, int]] = None
+        self._load()
+
+    def _load(self) -> None:
+        self._data = bytearray()
+        self.count = 0
+        self._positions = None
+        if not self.path.exists():
+            return
+
+        data = self.path.read_bytes()
+        if len(data) < _HEADER.size:
+            return
+
+        magic, version = _HEADER.unpack_from(data, 0)
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise CommitGraphError("Unsupported commit-graph file")
+
+        self.count = (len(data) - _HEADER.size) // RECORD.size
+        self._data = bytearray(data[:_HEADER.size + self.count * RECORD.size])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, pos: int):
+        return RECORD.unpack_from(self._data, _HEADER.size + pos * RECORD.size)
+
+    def hash_at(self, pos: int) -> str:
+        return self._record(pos)[0].hex()
+
+    def tree(self, pos: int) -> str:
+        return self._record(pos)[1].hex()
+
+    def parents(self, pos: int) -> List[int]:
+        _, _, p1, p2, _, _ = self._record(pos)
+        return [p for p in (p1, p2) if p != NO_PARENT]
+
+    def timestamp(self, pos: int) -> int:
+        return self._record(pos)[4]
+
+    def generation(self, pos: int) -> int:
+        return self._record(pos)[5]
+
+    def lookup(self, commit_hash: str) -> Optional[int]:
+        """
+        Return the record position of a commit, or None.
+        """
+        raw = bytes.fromhex(commit_hash)
+
+        if self._positions is None:
+            # Cheap path for freshly created commits: check the tail first
+            for pos in range(self.count - 1, max(self.count - _TAIL_SCAN, 0) - 1, -1):
+                start = _HEADER.size + pos * RECORD.size
+                if self._data[start:start + 20] == raw:
+                    return pos
+
+            self._positions = {}
+            for pos in range(self.count):
+                start = _HEADER.size + pos * RECORD.size
+                self._positions.setdefault(bytes(self._data[start:start + 20]), pos)
+
+        return self._positions.get(raw)
+
+    def __contains__(self, commit_hash: str) -> bool:
+        return self.lookup(commit_hash) is not None
+
+    def _append(self, commit_hash: str, commit: Commit, parents: List[int]) -> int:
+        """
+        Append a record; the caller holds the commit-graph lock.
+        """
+        if len(parents) > 2:
+            raise CommitGraphError("Commits with more than two parents are not supported")
+
+        generation = 1 + max((self.generation(p) for p in parents), default=0)
+        padded = parents + [NO_PARENT] * (2 - len(parents))
+        record = RECORD.pack(
+            bytes.fromhex(commit_hash),
+            bytes.fromhex(commit.tree),
+            padded[0],
+            padded[1],
+            commit.timestamp,
+            generation,
+        )
+
+        if not self._data:
+            self._data = bytearray(_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION))
+
+        with self.path.open("ab") as f:
+            size = f.tell()
+            if size < _HEADER.size:
+                # New, or an interrupted append left a partial header
+                f.truncate(0)
+                f.write(self._data)
+            elif size > len(self._data):
+                # Drop a partial record left by an interrupted append
+                f.truncate(len(self._data))
+            f.write(record)
+
+        pos = self.count
+        self._data += record
+        self.count += 1
+        if self._positions is not None:
+            self._positions.setdefault(record[:20], pos)
+        return pos
+
+    def ensure(self, store: ObjectStore, commit_hash: str) -> int:
+        """
+        Make sure a commit and all its ancestors are in the graph,
+        loading only the commits that are missing. Returns its position.
+        """
+        pos = self.lookup(commit_hash)
+        if pos is not None:
+            return pos
+
+        with self.repo.lock_file(self.path):
+            # Pick up records other processes appended before the lock
+            self._load()
+
+            # Collect missing commits depth-first, then append parents first
+            pending = [commit_hash]
+            loaded: Dict[str, Commit] = {}
+            while pending:
+                current = pending[-1]
+                if self.lookup(current) is not None:
+                    pending.pop()  # appended while it was queued twice
+                    continue
+                if current not in loaded:
+                    loaded[current] = Commit.read(store, current)
+
+                parents = _commit_parents(loaded[current])
+                missing = [p for p in parents if self.lookup(p) is None]
+                if missing:
+                    pending.extend(missing)
+                    continue
+
+                pending.pop()
+                self._append(current, loaded[current], [self.lookup(p) for p in parents])
+
+        return self.lookup(commit_hash)
+
+
+def _commit_parents(commit: Commit) -> List[str]:
+    return list(commit.parents)
+
+
+def update_commit_graph(repo: Repository, store: ObjectStore, commit_hash: str) -> None:
+    """
+    Record a newly created commit in the commit-graph.
+    """
+    CommitGraph(repo).ensure(store, commit_hash)
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict
+
+from .utils import atomic_write_bytes
+
+
+class ConfigError(Exception):
+    pass
+
+
+DEFAULTS: Dict[str, Any] = {
+    "core.compression": "zlib",
+    "core.compression_level": 6,
+    # none, batch or full; see utils.DURABILITY_MODES
+    "core.durability": "batch",
+    # Seconds to wait for the index or a ref held by another process
+    "core.lock_timeout": 10,
+    # Bytes of decoded trees, commits and small blobs kept in memory per
+    # repository; 0 disables the cache
+    "core.object_cache_bytes": 64 * 1024 * 1024,
+    # Blobs larger than this many bytes are packed as they are stored,
+    # without a delta search, and never loaded whole to do so
+    "core.big_file_threshold": 512 * 1024,
+    # With a positive value, the index is split: changes go to a small
+    # index file on top of a shared index, which is rewritten once more
+    # than this many entries changed. 0 writes the whole index each time.
+    "index.split_threshold": 0,
+    # Unreachable loose objects younger than this many seconds are kept
+    # by gc, as commands still running may be about to reference them
+    "gc.prune_expire": 14 * 24 * 60 * 60,
+    "pack.window": 10,
+    "pack.depth": 50,
+    # 0 means one thread per CPU
+    "checkout.workers": 0,
+    # Unchanged lines shown around each change by diff
+    "diff.context": 3,
+    # Inexact rename detection is skipped when more files than this
+    # were added or deleted
+    "diff.rename_limit": 1000,
+}
+
+
+class Config:
+    """
+    Repository settings stored as a flat JSON object of dotted keys
+    in .pyvcs/config. Missing keys fall back to DEFAULTS.
+    """
+
+    def __init__(self, repo):
+        self.path = repo.config_file
+        self.values: Dict[str, Any] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            self.values = {}
+            return
+
+        content = self.path.read_text().strip()
+        self.values = json.loads(content) if content else {}
+
+    def _save(self) -> None:
+        data = json.dumps(self.values, sort_keys=True, indent=2)
+        atomic_write_bytes(self.path, data.encode("utf-8"))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.values:
+            return self.values[key]
+        if default is not None:
+            return default
+        return DEFAULTS.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        self.values[key] = value
+        self._save()
@@ -0,0 +1,144 @@
+"""
+Binary deltas made of copy/insert instructions.
+
+delta := varint(base_size) varint(target_size) op*
+op    := 0x80 varint(offset) varint(length)   copy base[offset:offset+length]
+       | n (1..127) <n literal bytes>          insert
+"""
+from typing import Dict, List, Optional
+
+
+class DeltaError(Exception):
+    pass
+
+
+BLOCK = 16
+MAX_INSERT = 0x7F
+COPY_OP = 0x80
+
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varint(data: bytes, pos: int):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise DeltaError("Truncated delta")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _match_length(base: bytes, b: int, target: bytes, t: int, limit: int) -> int:
+    """
+    Length of the common run of base[b:] and target[t:], at most limit.
+    Compares large slices first so long matches cost few Python steps.
+    """
+    length = 0
+    for step in (4096, 256, 16, 1):
+        while (
+            length + step <= limit
+            and base[b + length:b + length + step] == target[t + length:t + length + step]
+        ):
+            length += step
+    return length
+
+
+def index_base(base: bytes) -> Dict[bytes, int]:
+    """
+    Map each aligned BLOCK-sized chunk of base to its first offset.
+    """
+    index: Dict[bytes, int] = {}
+    for offset in range(0, len(base) - BLOCK + 1, BLOCK):
+        index.setdefault(base[offset:offset + BLOCK], offset)
+    return index
+
+
+def _flush_insert(pending: bytearray, out: bytearray) -> None:
+    for start in range(0, len(pending), MAX_INSERT):
+        chunk = pending[start:start + MAX_INSERT]
+        out.append(len(chunk))
+        out += chunk
+    pending.clear()
+
+
+def create_delta(base: bytes, target: bytes, index: Optional[Dict[bytes, int]] = None) -> bytes:
+    """
+    Encode target as copy/insert instructions against base.
+    index may be passed to reuse the block index of base across calls.
+    """
+    out = bytearray()
+    _encode_varint(len(base), out)
+    _encode_varint(len(target), out)
+
+    if index is None:
+        index = index_base(base)
+    pending = bytearray()
+    pos = 0
+    end = len(target)
+
+    while pos < end:
+        offset = index.get(target[pos:pos + BLOCK]) if pos + BLOCK <= end else None
+        if offset is None:
+            pending.append(target[pos])
+            pos += 1
+            continue
+
+        # Extend the match forwards
+        limit = min(len(base) - offset, end - pos)
+        length = BLOCK + _match_length(base, offset + BLOCK, target, pos + BLOCK, limit - BLOCK)
+
+        # ...and backwards into bytes queued for insertion
+        while pending and offset > 0 and base[offset - 1] == pending[-1]:
+            pending.pop()
+            offset -= 1
+            pos -= 1
+            length += 1
+
+        _flush_insert(pending, out)
+        out.append(COPY_OP)
+        _encode_varint(offset, out)
+        _encode_varint(length, out)
+        pos += length
+
+    _flush_insert(pending, out)
+    return bytes(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Rebuild the target from base and a delta made by create_delta.
+    """
+    base_size, pos = _decode_varint(delta, 0)
+    target_size, pos = _decode_varint(delta, pos)
+    if base_size != len(base):
+        raise DeltaError("Delta does not apply to this base")
+
+    parts: List[bytes] = []
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op == COPY_OP:
+            offset, pos = _decode_varint(delta, pos)
+            length, pos = _decode_varint(delta, pos)
+            parts.append(base[offset:offset + length])
+        elif 0 < op <= MAX_INSERT:
+            parts.append(delta[pos:pos + op])
+            pos += op
+        else:
+            raise DeltaError(f"Invalid delta opcode {op:#x}")
+
+    result = b"".join(parts)
+    if len(result) != target_size:
+        raise DeltaError("Delta produced wrong size")
+    return result
@@ -1,10 +1,13 @@
 from pathlib import Path
-import difflib
+import io
+from typing import BinaryIO, Optional
 
 from .repo import Repository
 from .storage import ObjectStore
 from .index import Index
-from .objects import Blob
+from .linediff import diff_files
+from .utils import lstat_or_none
+from . import fsmonitor
 
 
 class DiffEntry:
@@ -13,46 +16,52 @@ class DiffEntry:
         self.diff = diff
 
 
-def _read_working_file(path: Path) -> bytes:
+def _open_working_file(path: Path) -> BinaryIO:
     if not path.exists() or not path.is_file():
-        return b""
-    return path.read_bytes()
+        return io.BytesIO()
+    return path.open("rb")
 
 
-def diff_working_vs_index(repo: Repository) -> list[DiffEntry]:
+def diff_working_vs_index(repo: Repository, context: Optional[int] = None) -> list[DiffEntry]:
     """
     Compare working directory files against staged (index) versions.
-    Returns a list of DiffEntry.
+    Returns a list of DiffEntry. context is the number of unchanged lines
+    shown around changes (default: the diff.context setting).
     """
+    if context is None:
+        context = int(repo.config.get("diff.context"))
+
     store = ObjectStore(repo)
     index = Index(repo)
     diffs = []
+    verified = {}
 
-    for rel_path, blob_hash in index.entries.items():
-        abs_path = repo.root / rel_path
-
-        # Load staged blob
-        staged_data = store.load(blob_hash)
-        staged_blob = Blob.deserialize(staged_data)
+    entries = index.entries
+    index_paths = sorted(entries)
+    monitor = fsmonitor.query(repo, index_paths)
+    if monitor is not None and monitor.paths is not None:
+        # Only files reported changed by the filesystem monitor
+        examined = fsmonitor.expand_paths(repo.root, monitor.paths, index_paths)
+        entries = {p: entries[p] for p in sorted(examined) if p in entries}
 
-        # Load working file
-        working_data = _read_working_file(abs_path)
+    for rel_path, entry in entries.items():
+        abs_path = repo.root / rel_path
 
-        if working_data == staged_blob.data:
-            continue  # no change
+        # Unchanged stat data means unchanged content: skip reading
+        st = lstat_or_none(abs_path)
+        if index.stat_unchanged(rel_path, st):
+            continue
 
-        staged_lines = staged_blob.data.decode(errors="ignore").splitlines(keepends=True)
-        working_lines = working_data.decode(errors="ignore").splitlines(keepends=True)
+        if st is not None and store.hash_file(abs_path) == entry.hash:
+            verified[rel_path] = st  # touched but not changed
+            continue
 
-        diff_text = "".join(
-            difflib.unified_diff(
-                staged_lines,
-                working_lines,
-                fromfile=f"a/{rel_path}",
-                tofile=f"b/{rel_path}",
-            )
-        )
+        # Stream both versions; binary files are not read in full
+        with store.open_object(entry.hash) as staged, _open_working_file(abs_path) as working:
+            diff_text = diff_files(staged, working, rel_path, context)
 
         diffs.append(DiffEntry(rel_path, diff_text))
 
+    index.refresh(verified)
+
     return diffs
\ No newline at end of file
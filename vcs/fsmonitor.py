@@ -0,0 +1,585 @@
+"""
+Filesystem monitor: a background daemon that records which paths of the
+working tree change, so status can examine only those instead of
+walking the whole tree.
+
+.pyvcs/fsmonitor/
+    daemon.json   {"pid", "instance", "mode"}, written once watching starts
+    events        one JSON value per line, appended by the daemon:
+                  "dir/file"             a path changed (or a directory
+                                         was created, moved or removed)
+                  {"overflow": true}     events were lost
+                  {"cookie": name}       a sync cookie was seen
+    token         client state saved by status: "<instance>:<offset>"
+                  into events, the paths it reported as not clean, and
+                  a digest of the index paths at that time
+    cookie-*      sync cookies created by clients
+
+The daemon uses inotify (through ctypes) when available and otherwise
+polls the tree. A client that finds the daemon missing, a different
+daemon instance, an overflow, or a sync timeout gets None from query()
+and falls back to a full scan.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import select
+import signal
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .repo import Repository, PYVCS_DIR
+from .utils import atomic_write_bytes
+from .worktree import iter_files
+
+
+FSMONITOR_DIR = "fsmonitor"
+DAEMON_FILE = "daemon.json"
+EVENTS_FILE = "events"
+TOKEN_FILE = "token"
+COOKIE_PREFIX = "cookie-"
+
+POLL_INTERVAL = 1.0
+SYNC_TIMEOUT = 5.0
+START_TIMEOUT = 10.0
+# Past this size the daemon starts over with a fresh instance, which
+# costs every client one full scan.
+MAX_LOG_BYTES = 16 * 1024 * 1024
+
+
+class FSMonitorError(Exception):
+    pass
+
+
+def monitor_dir(repo: Repository) -> Path:
+    return repo.vcs_dir / FSMONITOR_DIR
+
+
+# --------------------------
+# Daemon
+# --------------------------
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """
+    Minimal inotify binding over libc.
+    """
+
+    def __init__(self):
+        name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or name is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read(self, timeout: float):
+        """
+        Yield (wd, mask, name) for pending events, waiting up to timeout.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+            pos += length
+            yield wd, mask, name
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _EventLog:
+    def __init__(self, path: Path):
+        self.path = path
+        path.write_bytes(b"")
+        # Append mode, so lines written by anyone else are never overwritten
+        self._file = path.open("a", encoding="utf-8")
+
+    def write(self, values: Iterable) -> None:
+        lines = [json.dumps(v) + "\n" for v in values]
+        if lines:
+            self._file.write("".join(lines))
+            self._file.flush()
+
+    def full(self) -> bool:
+        return self._file.tell() > MAX_LOG_BYTES
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _cookies(state_dir: Path) -> List[str]:
+    try:
+        return [n for n in os.listdir(state_dir) if n.startswith(COOKIE_PREFIX)]
+    except FileNotFoundError:
+        return []
+
+
+class _Daemon:
+    def __init__(self, root: Path, mode: str, interval: float):
+        self.root = root
+        self.state_dir = root / PYVCS_DIR / FSMONITOR_DIR
+        self.mode = mode
+        self.interval = interval
+        self.running = True
+
+    def _start_instance(self) -> _EventLog:
+        """
+        Start a new log; clients holding tokens of the previous instance
+        fall back to a full scan once.
+        """
+        log = _EventLog(self.state_dir / EVENTS_FILE)
+        info = {"pid": os.getpid(), "instance": uuid.uuid4().hex, "mode": self.mode}
+        atomic_write_bytes(self.state_dir / DAEMON_FILE, json.dumps(info).encode("utf-8"))
+        return log
+
+    def run(self) -> None:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        requested = self.mode
+        if requested in ("auto", "inotify"):
+            self.mode = "inotify"
+            try:
+                self._run_inotify()
+                return
+            except OSError:
+                if requested == "inotify":
+                    raise
+        self.mode = "poll"
+        self._run_polling()
+
+    # inotify ---------------------------------------------------------
+
+    def _watch_tree(self, inotify: _Inotify, watches: Dict[int, str], rel_dir: str) -> None:
+        directory = self.root / rel_dir if rel_dir else self.root
+        try:
+            watches[inotify.add_watch(directory)] = rel_dir
+        except FileNotFoundError:
+            return
+        for dirpath, dirnames, _ in os.walk(directory):
+            if dirpath == str(self.root):
+                dirnames[:] = [d for d in dirnames if d != PYVCS_DIR]
+            for name in dirnames:
+                path = Path(dirpath) / name
+                try:
+                    watches[inotify.add_watch(path)] = path.relative_to(self.root).as_posix()
+                except FileNotFoundError:
+                    pass
+
+    def _run_inotify(self) -> None:
+        inotify = _Inotify()
+        watches: Dict[int, str] = {}
+        try:
+            self._watch_tree(inotify, watches, "")
+            state_wd = inotify.add_watch(self.state_dir)
+            log = self._start_instance()
+
+            while self.running:
+                batch: List = []
+                for wd, mask, name in inotify.read(self.interval):
+                    if mask & IN_Q_OVERFLOW:
+                        batch.append({"overflow": True})
+                        continue
+                    if wd == state_wd:
+                        if name.startswith(COOKIE_PREFIX) and mask & IN_CREATE:
+                            batch.append({"cookie": name})
+                        continue
+                    if mask & IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+
+                    rel_dir = watches.get(wd)
+                    if rel_dir is None:
+                        continue
+                    if not name:
+                        # The directory itself moved or vanished
+                        batch.append(rel_dir if rel_dir else {"overflow": True})
+                        continue
+                    if not rel_dir and name == PYVCS_DIR:
+                        continue
+
+                    rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                    batch.append(rel_path)
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files created before the watch exists produce no
+                        # events; clients expand the directory path instead.
+                        self._watch_tree(inotify, watches, rel_path)
+
+                log.write(batch)
+                if log.full():
+                    log.close()
+                    log = self._start_instance()
+            log.close()
+        finally:
+            inotify.close()
+
+    # polling ---------------------------------------------------------
+
+    def _snapshot(self) -> Dict[str, tuple]:
+        snapshot = {}
+        for rel_path, entry in iter_files(self.root):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            snapshot[rel_path] = (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_mode)
+        return snapshot
+
+    def _run_polling(self) -> None:
+        previous = self._snapshot()
+        log = self._start_instance()
+        seen_cookies: Set[str] = set()
+
+        while self.running:
+            time.sleep(self.interval)
+            # Cookies are listed before scanning, so every change made
+            # before a cookie was created is logged before the cookie.
+            cookies = _cookies(self.state_dir)
+            current = self._snapshot()
+
+            batch: List = sorted(
+                path for path in previous.keys() | current.keys()
+                if previous.get(path) != current.get(path)
+            )
+            batch += [{"cookie": name} for name in cookies if name not in seen_cookies]
+            seen_cookies = set(cookies)
+            log.write(batch)
+            previous = current
+
+            if log.full():
+                log.close()
+                log = self._start_instance()
+        log.close()
+
+
+def run_daemon(root: Path, mode: str = "auto", interval: float = POLL_INTERVAL) -> None:
+    """
+    Watch the working tree at root until SIGTERM.
+    """
+    daemon = _Daemon(root, mode, interval)
+
+    def stop(signum, frame):
+        daemon.running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        daemon.run()
+    finally:
+        info = _daemon_info_path(root)
+        try:
+            if json.loads(info.read_text()).get("pid") == os.getpid():
+                info.unlink()
+        except (OSError, ValueError):
+            pass
+
+
+def _daemon_info_path(root: Path) -> Path:
+    return root / PYVCS_DIR / FSMONITOR_DIR / DAEMON_FILE
+
+
+# --------------------------
+# Control
+# --------------------------
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        # Reap the daemon if it was started by this process and exited
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def daemon_info(repo: Repository) -> Optional[dict]:
+    """
+    Return the running daemon's info, or None.
+    """
+    try:
+        info = json.loads((monitor_dir(repo) / DAEMON_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    return info if _pid_alive(info.get("pid", 0)) else None
+
+
+def start(repo: Repository, mode: str = "auto", interval: float = POLL_INTERVAL) -> dict:
+    """
+    Start the daemon in the background and wait until it is watching.
+    """
+    info = daemon_info(repo)
+    if info is not None:
+        return info
+
+    state_dir = monitor_dir(repo)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    (state_dir / DAEMON_FILE).unlink(missing_ok=True)
+
+    env = dict(os.environ)
+    package_root = str(Path(__file__).resolve().parents[1])
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "vcs.fsmonitor", str(repo.root),
+         "--mode", mode, "--interval", str(interval)],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        info = daemon_info(repo)
+        if info is not None and info["pid"] == process.pid:
+            return info
+        if process.poll() is not None:
+            raise FSMonitorError("fsmonitor daemon exited during startup")
+        time.sleep(0.02)
+    process.terminate()
+    raise FSMonitorError("fsmonitor daemon did not start")
+
+
+def stop(repo: Repository) -> bool:
+    """
+    Stop the daemon. Returns False if none was running.
+    """
+    info = daemon_info(repo)
+    if info is None:
+        return False
+
+    os.kill(info["pid"], signal.SIGTERM)
+    deadline = time.monotonic() + START_TIMEOUT
+    while _pid_alive(info["pid"]) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    (monitor_dir(repo) / DAEMON_FILE).unlink(missing_ok=True)
+    return True
+
+
+# --------------------------
+# Client
+# --------------------------
+
+@dataclass
+class FSMonitorQuery:
+    """
+    Result of query(): the paths that may differ from what the last
+    status saw (None if everything must be scanned), and the token to
+    save once they have been examined.
+    """
+    paths: Optional[Set[str]]
+    token: str
+
+
+def _index_digest(index_paths: Iterable[str]) -> str:
+    """
+    Digest of the sorted index paths. Adding or removing index entries
+    changes status without any filesystem event.
+    """
+    digest = hashlib.sha1()
+    for path in index_paths:
+        digest.update(path.encode("utf-8", "surrogateescape") + b"\0")
+    return digest.hexdigest()
+
+
+def _sync(repo: Repository, log_path: Path, offset: int):
+    """
+    Wait until the daemon has logged every change made before this call,
+    using a cookie file. Returns (log values after offset, end offset),
+    or None on timeout.
+    """
+    name = f"{COOKIE_PREFIX}{os.getpid()}-{uuid.uuid4().hex}"
+    cookie = monitor_dir(repo) / name
+    cookie.touch()
+    try:
+        deadline = time.monotonic() + SYNC_TIMEOUT
+        while time.monotonic() < deadline:
+            result = _read_log(log_path, offset)
+            if result is None:
+                return None
+            if {"cookie": name} in result[0]:
+                return result
+            time.sleep(0.005)
+        return None
+    finally:
+        cookie.unlink(missing_ok=True)
+
+
+def _read_log(path: Path, offset: int):
+    """
+    Return (values, end offset) of complete lines after offset.
+    """
+    try:
+        with path.open("rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    end = data.rfind(b"\n") + 1
+    values = [json.loads(line) for line in data[:end].splitlines()]
+    return values, offset + end
+
+
+def query(repo: Repository, index_paths: List[str]) -> Optional[FSMonitorQuery]:
+    """
+    Return the paths to examine since the last saved token, or None when
+    no daemon is running or it cannot be synced with.
+    index_paths are the sorted paths of the index.
+    """
+    info = daemon_info(repo)
+    if info is None:
+        return None
+
+    try:
+        state = json.loads((monitor_dir(repo) / TOKEN_FILE).read_text())
+    except (OSError, ValueError):
+        state = {}
+    instance, _, offset = state.get("token", "").partition(":")
+    valid = instance == info["instance"] and state.get("index") == _index_digest(index_paths)
+
+    log_path = monitor_dir(repo) / EVENTS_FILE
+    if not valid:
+        try:
+            offset = log_path.stat().st_size
+        except FileNotFoundError:
+            return None
+    synced = _sync(repo, log_path, int(offset))
+    if synced is None:
+        return None
+    values, end = synced
+
+    token = f"{info['instance']}:{end}"
+    if not valid:
+        return FSMonitorQuery(paths=None, token=token)
+
+    paths = set(state.get("paths", []))
+    for value in values:
+        if isinstance(value, str):
+            paths.add(value)
+        elif value.get("overflow"):
+            return FSMonitorQuery(paths=None, token=token)
+    return FSMonitorQuery(paths=paths, token=token)
+
+
+def save_token(
+    repo: Repository,
+    token: str,
+    paths: Iterable[str],
+    index_paths: List[str],
+) -> None:
+    """
+    Remember what status saw: paths reported as not clean are examined
+    again next time even without new events.
+    """
+    state = {"token": token, "paths": sorted(paths), "index": _index_digest(index_paths)}
+    atomic_write_bytes(monitor_dir(repo) / TOKEN_FILE, json.dumps(state).encode("utf-8"))
+
+
+def expand_paths(
+    root: Path,
+    paths: Iterable[str],
+    index_paths: List[str],
+    prune=None,
+) -> Dict[str, Optional[os.stat_result]]:
+    """
+    Turn reported paths into the files to examine: files under reported
+    directories, and index entries under reported paths that are gone.
+    Returns path -> lstat result, or None for missing files.
+    """
+    examined: Dict[str, Optional[os.stat_result]] = {}
+    for path in sorted(paths):
+        abs_path = root / path
+        try:
+            st = os.lstat(abs_path)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+
+        if st is not None and os.path.isdir(abs_path) and not os.path.islink(abs_path):
+            if prune is None or not prune(path):
+                for rel_path, entry in iter_files(abs_path, prune, path + "/"):
+                    examined[rel_path] = entry.stat(follow_symlinks=False)
+        elif st is not None and os.path.isfile(abs_path):
+            examined[path] = st
+        else:
+            examined.setdefault(path, None)
+
+        # Tracked files below the path (a removed or renamed directory)
+        prefix = path + "/"
+        i = bisect_left(index_paths, prefix)
+        while i < len(index_paths) and index_paths[i].startswith(prefix):
+            tracked = index_paths[i]
+            if tracked not in examined:
+                try:
+                    examined[tracked] = os.lstat(root / tracked)
+                except (FileNotFoundError, NotADirectoryError):
+                    examined[tracked] = None
+            i += 1
+
+    return examined
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m vcs.fsmonitor")
+    parser.add_argument("root")
+    parser.add_argument("--mode", choices=["auto", "inotify", "poll"], default="auto")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args(argv)
+    run_daemon(Path(args.root).resolve(), args.mode, args.interval)
+
+
+if __name__ == "__main__":
+    main()
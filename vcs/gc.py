@@ -0,0 +1,275 @@
+"""
+Garbage collection: removing loose objects nothing refers to.
+
+Objects reachable from a branch, HEAD, MERGE_HEAD or the index are
+marked, then unmarked loose objects older than gc.prune_expire seconds
+are deleted. The grace period protects objects written by commands
+still running, which are not referenced yet; storing an object again
+resets its mtime. Temp files left by interrupted writes are deleted
+after the same grace period.
+
+The mark set holds one bit per object: objects are numbered by their
+position in each pack index and, for loose objects, in a sorted array
+of raw hashes built by listing the object directories. Memory grows by
+about 20 bytes per loose object and one bit per packed object, and the
+walk keeps no set of visited hashes: an object is followed only when
+its bit is first set. Commits are walked on the commit-graph, without
+opening commit objects; trees are read once each, blobs never.
+"""
+import os
+import time
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .repo import Repository
+from .storage import ObjectStore, TEMP_PREFIX
+from .objects import Tree, entry_kind
+from .index import Index
+from .commitgraph import CommitGraph
+from .refs import list_branches
+from .pack import HASH_SIZE
+
+
+class GCError(Exception):
+    pass
+
+
+@dataclass
+class GCStats:
+    objects: int
+    reachable: int
+    pruned: int
+    bytes_reclaimed: int
+
+
+class _LooseHashes:
+    """
+    Sorted raw hashes of the loose objects. Lookups start from a table
+    of where each two-byte prefix ends, so they take a few comparisons
+    even with millions of objects.
+    """
+
+    def __init__(self, hashes: bytearray):
+        self._hashes = hashes
+        self.count = len(hashes) // HASH_SIZE
+        self._fanout = array("I", bytes(4 * 65536))
+        for pos in range(0, len(hashes), HASH_SIZE):
+            self._fanout[hashes[pos] << 8 | hashes[pos + 1]] += 1
+        for i in range(1, 65536):
+            self._fanout[i] += self._fanout[i - 1]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def hash_at(self, pos: int) -> bytes:
+        start = pos * HASH_SIZE
+        return bytes(self._hashes[start:start + HASH_SIZE])
+
+    def find(self, raw_hash: bytes) -> Optional[int]:
+        prefix = raw_hash[0] << 8 | raw_hash[1]
+        lo = self._fanout[prefix - 1] if prefix else 0
+        hi = self._fanout[prefix]
+
+        hashes = self._hashes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = hashes[mid * HASH_SIZE:(mid + 1) * HASH_SIZE]
+            if current < raw_hash:
+                lo = mid + 1
+            elif current > raw_hash:
+                hi = mid
+            else:
+                return mid
+        return None
+
+
+def _list_loose(objects_dir: str) -> _LooseHashes:
+    """
+    Like pack.iter_loose_objects, without building a Path per object.
+    """
+    hashes = bytearray()
+    for fan in sorted(os.listdir(objects_dir)):
+        fan_dir = os.path.join(objects_dir, fan)
+        if len(fan) != 2 or not os.path.isdir(fan_dir):
+            continue
+        for name in sorted(os.listdir(fan_dir)):
+            # Skips strays; temp files are written in objects_dir itself
+            if len(name) != 2 * HASH_SIZE - 2:
+                continue
+            try:
+                hashes += bytes.fromhex(fan + name)
+            except ValueError:
+                continue
+    return _LooseHashes(hashes)
+
+
+class _MarkSet:
+    """
+    One bit per object of the loose array and of each pack index.
+    """
+
+    def __init__(self, loose: _LooseHashes, store: ObjectStore):
+        self.store = store
+        self.indexes = [loose] + [pack.index for pack in store.packs]
+        self.bits = [bytearray((len(index) + 7) // 8) for index in self.indexes]
+
+    def mark(self, obj_hash: str) -> bool:
+        """
+        Mark an object; return whether it was not marked already.
+        Objects stored both loose and packed are marked where found first.
+        """
+        raw = bytes.fromhex(obj_hash)
+        for index, bits in zip(self.indexes, self.bits):
+            pos = index.find(raw)
+            if pos is None:
+                continue
+            byte, bit = divmod(pos, 8)
+            if bits[byte] & (1 << bit):
+                return False
+            bits[byte] |= 1 << bit
+            return True
+        if self.store.exists(obj_hash):
+            return True  # written since the objects were listed
+        raise GCError(f"Reachable object {obj_hash} is missing; not pruning anything")
+
+    def is_marked(self, which: int, pos: int) -> bool:
+        byte, bit = divmod(pos, 8)
+        return bool(self.bits[which][byte] & (1 << bit))
+
+    def count(self) -> int:
+        return sum(int.from_bytes(bits, "big").bit_count() for bits in self.bits)
+
+
+def _root_commits(repo: Repository) -> List[str]:
+    refs = [repo.heads_dir / branch for branch in list_branches(repo)]
+    refs.append(repo.merge_head_file)
+    commits = []
+    for ref in refs:
+        try:
+            value = ref.read_text().strip()
+        except FileNotFoundError:
+            continue
+        if value:
+            commits.append(value)
+    head = repo.head_commit()
+    if head:
+        commits.append(head)
+    return commits
+
+
+def _mark_trees(store: ObjectStore, marks: _MarkSet, trees: List[str]) -> None:
+    """
+    Mark the given trees, newly marked ones and everything below them.
+    The trees list is used as the stack of trees left to read.
+    """
+    while trees:
+        tree = Tree.deserialize(store.load(trees.pop(), cache=False))
+        for entry in tree.entries.values():
+            if marks.mark(entry.hash) and entry_kind(entry, store) == "tree":
+                trees.append(entry.hash)
+
+
+def _mark_reachable(repo: Repository, store: ObjectStore, marks: _MarkSet) -> None:
+    graph = CommitGraph(repo)
+    pending = [graph.ensure(store, commit) for commit in _root_commits(repo)]
+    while pending:
+        pos = pending.pop()
+        if not marks.mark(graph.hash_at(pos)):
+            continue
+        tree = graph.tree(pos)
+        if marks.mark(tree):
+            _mark_trees(store, marks, [tree])
+        pending.extend(graph.parents(pos))
+
+    index = Index(repo)
+    for _, entry in index.entries.items():
+        marks.mark(entry.hash)
+    trees = [tree for tree in index.cache_tree.values() if marks.mark(tree)]
+    _mark_trees(store, marks, trees)
+
+
+def _prune(
+    objects_dir: str,
+    loose: _LooseHashes,
+    marks: _MarkSet,
+    cutoff: float,
+) -> Tuple[int, int]:
+    pruned = 0
+    reclaimed = 0
+    fan_dirs = set()
+    for pos in range(len(loose)):
+        if marks.is_marked(0, pos):
+            continue
+        obj_hash = loose.hash_at(pos).hex()
+        fan_dir = os.path.join(objects_dir, obj_hash[:2])
+        path = os.path.join(fan_dir, obj_hash[2:])
+        try:
+            st = os.stat(path)
+            if st.st_mtime >= cutoff:
+                continue
+            os.unlink(path)
+        except FileNotFoundError:
+            continue  # removed meanwhile, e.g. by a repack
+        pruned += 1
+        reclaimed += st.st_size
+        fan_dirs.add(fan_dir)
+
+    for fan_dir in fan_dirs:
+        try:
+            os.rmdir(fan_dir)
+        except OSError:
+            pass  # still holds objects
+    return pruned, reclaimed
+
+
+def _prune_temp_files(objects_dir: str, cutoff: float) -> int:
+    """
+    Delete temp files of object writes that were interrupted, if older
+    than cutoff; return the bytes freed.
+    """
+    reclaimed = 0
+    for name in os.listdir(objects_dir):
+        if not name.startswith(TEMP_PREFIX):
+            continue
+        path = os.path.join(objects_dir, name)
+        try:
+            st = os.stat(path)
+            if st.st_mtime >= cutoff:
+                continue
+            os.unlink(path)
+        except FileNotFoundError:
+            continue  # renamed into place meanwhile
+        reclaimed += st.st_size
+    return reclaimed
+
+
+def gc(repo: Repository, prune_expire: Optional[int] = None) -> GCStats:
+    """
+    Delete loose objects unreachable from the branches, HEAD, MERGE_HEAD
+    and the index and last modified more than prune_expire seconds ago
+    (gc.prune_expire by default; 0 prunes every unreachable object).
+    Packed objects are marked but never deleted. Temp files as old
+    are deleted too; their size counts in bytes_reclaimed.
+    """
+    if prune_expire is None:
+        prune_expire = int(repo.config.get("gc.prune_expire"))
+    # Taken before listing objects, so newer ones are never pruned
+    cutoff = time.time() - prune_expire
+
+    store = ObjectStore(repo)
+    try:
+        objects_dir = str(store.objects_dir)
+        loose = _list_loose(objects_dir)
+        marks = _MarkSet(loose, store)
+        _mark_reachable(repo, store, marks)
+        pruned, reclaimed = _prune(objects_dir, loose, marks, cutoff)
+        reclaimed += _prune_temp_files(objects_dir, cutoff)
+        objects = sum(len(index) for index in marks.indexes)
+        stats = GCStats(objects, marks.count(), pruned, reclaimed)
+    finally:
+        store.close()
+
+    if pruned:
+        repo.object_cache.clear()
+    return stats
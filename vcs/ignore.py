@@ -0,0 +1,317 @@
+"""
+.pyvcsignore support, following gitignore rules:
+
+- blank lines and lines starting with "#" are skipped
+- "!" negates a pattern, re-including what an earlier pattern ignored
+- a trailing "/" matches directories only
+- a pattern containing "/" elsewhere is anchored to the directory of
+  its ignore file; otherwise it matches a name at any depth
+- "*", "?" and "[...]" do not match "/"; "**/", "/**/" and "/**" match
+  any number of directories
+- ignore files in subdirectories take precedence over their parents,
+  and later lines over earlier ones
+
+Patterns are compiled once per ignore file (see _RuleSet), so matching
+a path costs a few dictionary lookups and regex matches however many
+patterns there are.
+"""
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+IGNORE_FILE = ".pyvcsignore"
+
+
+class IgnoreError(Exception):
+    pass
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translate a glob (without anchoring or trailing slash) to a regex.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == n and i > 0 and pattern[i - 1] == "/":
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            while i < n and pattern[i] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            start = i + 2 if pattern.startswith("[!", i) else i + 1
+            # A "]" right after the opening bracket is a member
+            end = pattern.find("]", start + 1)
+            regex = None
+            if end >= 0:
+                body = pattern[start:end]
+                for special in "\\[]":
+                    body = body.replace(special, "\\" + special)
+                if start == i + 2:
+                    body = "^" + body
+                regex = "(?!/)[" + body + "]"
+                try:
+                    re.compile(regex)
+                except re.error:
+                    regex = None  # e.g. a reversed range: not a class
+            if regex is None:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            out.append(regex)
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+GLOB_CHARS = "*?[\\"
+
+# (position in file, negated) of a pattern
+Rule = Tuple[int, bool]
+
+
+def _parse_line(line: str) -> Optional[Tuple[bool, bool, bool, str]]:
+    """
+    Parse one ignore line into (negated, dir_only, anchored, glob),
+    or None for blank lines and comments.
+    """
+    line = line.rstrip("\n")
+    # Trailing spaces are ignored unless escaped
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    anchored = "/" in line
+    return negated, dir_only, anchored, line.lstrip("/")
+
+
+def _is_literal(glob: str) -> bool:
+    return not any(c in glob for c in GLOB_CHARS)
+
+
+class _Alternation:
+    """
+    Patterns combined into a single regex. Alternatives are listed last
+    pattern first, each in its own capturing group, so the first
+    alternative to match is the last matching pattern and m.lastindex
+    tells which one it was.
+    """
+
+    def __init__(self, patterns: List[Tuple[Rule, str]]):
+        self.rules = [rule for rule, _ in reversed(patterns)]
+        self.regex = None
+        if patterns:
+            alternatives = "|".join(f"({_translate(glob)})" for _, glob in reversed(patterns))
+            self.regex = re.compile(f"(?:{alternatives})\\Z", re.S)
+
+    def match(self, text: str, pos: int = 0) -> Optional[Rule]:
+        """
+        Return the last pattern matching text[pos:].
+        """
+        if self.regex is None:
+            return None
+        m = self.regex.match(text, pos)
+        return None if m is None else self.rules[m.lastindex - 1]
+
+
+class _ByComponent:
+    """
+    Path patterns keyed by their first path component when it is
+    literal, so matching at a position only tries the patterns that
+    can start with the component found there.
+    """
+
+    def __init__(self, patterns: List[Tuple[Rule, str]]):
+        keyed: Dict[str, List[Tuple[Rule, str]]] = {}
+        other: List[Tuple[Rule, str]] = []
+        for rule, glob in patterns:
+            first = glob.partition("/")[0]
+            if _is_literal(first):
+                keyed.setdefault(first, []).append((rule, glob))
+            else:
+                other.append((rule, glob))
+
+        self.keyed = {first: _Alternation(group) for first, group in keyed.items()}
+        self.other = _Alternation(other) if other else None
+
+    def __bool__(self) -> bool:
+        return bool(self.keyed) or self.other is not None
+
+    def match(self, rel_path: str, pos: int, component: str, found: List) -> None:
+        alternation = self.keyed.get(component)
+        if alternation is not None:
+            found.append(alternation.match(rel_path, pos))
+        if self.other is not None:
+            found.append(self.other.match(rel_path, pos))
+
+
+class _RuleSet:
+    """
+    Patterns that apply to one kind of path (files, or directories),
+    split by shape so that common patterns avoid regexes entirely:
+
+    - literal names ("node_modules") and name suffixes ("*.pyc") are
+      dictionary lookups; other name patterns share one regex
+    - anchored patterns are keyed by their first path component, and
+      "**/"-prefixed ones are tried at each directory boundary instead
+      of backtracking over the whole path
+    """
+
+    def __init__(self, patterns: List[Tuple[Rule, bool, str]]):
+        self.exact: Dict[str, Rule] = {}
+        self.suffixes: Dict[int, Dict[str, Rule]] = {}
+        names: List[Tuple[Rule, str]] = []
+        floating: List[Tuple[Rule, str]] = []
+        paths: List[Tuple[Rule, str]] = []
+
+        # In file order, so later patterns overwrite earlier ones
+        for rule, anchored, glob in patterns:
+            if not anchored:
+                if _is_literal(glob):
+                    self.exact[glob] = rule
+                elif glob[0] == "*" and glob[1:] and _is_literal(glob[1:]):
+                    self.suffixes.setdefault(len(glob) - 1, {})[glob[1:]] = rule
+                else:
+                    names.append((rule, glob))
+            elif glob.startswith("**/"):
+                floating.append((rule, glob[3:]))
+            else:
+                paths.append((rule, glob))
+
+        self.names = _Alternation(names)
+        self.floating = _ByComponent(floating)
+        self.paths = _ByComponent(paths)
+
+    def match(self, rel_path: str) -> Optional[Rule]:
+        components = rel_path.split("/")
+        name = components[-1]
+
+        found = [self.exact.get(name), self.names.match(name)]
+        for length, table in self.suffixes.items():
+            if len(name) >= length:
+                found.append(table.get(name[-length:]))
+
+        if self.paths:
+            self.paths.match(rel_path, 0, components[0], found)
+        if self.floating:
+            pos = 0
+            for component in components:
+                self.floating.match(rel_path, pos, component, found)
+                pos += len(component) + 1
+
+        matches = [rule for rule in found if rule is not None]
+        return max(matches) if matches else None
+
+
+class IgnoreRules:
+    """
+    Compiled patterns of a single ignore file.
+    Paths are relative to the directory holding the file.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        parsed = [p for p in (_parse_line(line) for line in lines) if p is not None]
+        self.count = len(parsed)
+
+        patterns = [
+            ((position, negated), dir_only, anchored, glob)
+            for position, (negated, dir_only, anchored, glob) in enumerate(parsed)
+        ]
+        self._files = _RuleSet([(r, a, g) for r, dir_only, a, g in patterns if not dir_only])
+        self._dirs = _RuleSet([(r, a, g) for r, _, a, g in patterns])
+
+    @staticmethod
+    def from_file(path: Path) -> "IgnoreRules":
+        try:
+            text = path.read_text(encoding="utf-8", errors="surrogateescape")
+        except OSError as e:
+            raise IgnoreError(f"Cannot read {path}: {e}")
+        return IgnoreRules(text.splitlines())
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Return True if ignored, False if re-included by a negation, or
+        None if no pattern matches. The last matching pattern wins.
+        """
+        rule = (self._dirs if is_dir else self._files).match(rel_path)
+        return None if rule is None else not rule[1]
+
+
+class IgnoreMatcher:
+    """
+    Ignore rules of a whole working tree, loading the ignore file of each
+    directory the first time a path inside it is checked.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._rules: Dict[str, Optional[IgnoreRules]] = {}
+
+    def _rules_in(self, directory: str) -> Optional[IgnoreRules]:
+        if directory not in self._rules:
+            path = self.root / directory / IGNORE_FILE
+            self._rules[directory] = IgnoreRules.from_file(path) if path.is_file() else None
+        return self._rules[directory]
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Return True if rel_path itself is ignored. Its parent directories
+        are assumed not to be ignored; see is_ignored.
+        """
+        # Deepest ignore file first
+        directory = rel_path
+        while directory:
+            directory = directory.rpartition("/")[0]
+            rules = self._rules_in(directory)
+            if rules is None:
+                continue
+            local = rel_path[len(directory) + 1:] if directory else rel_path
+            decision = rules.match(local, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def prune(self, rel_dir: str) -> bool:
+        """
+        Directory pruner for worktree.iter_files.
+        """
+        return self.match(rel_dir, True)
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Return True if rel_path or any of its parent directories is ignored.
+        """
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.match("/".join(parts[:depth]), True):
+                return True
+        return self.match(rel_path, is_dir)
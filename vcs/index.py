@@ -1,90 +1,578 @@
 import json
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .repo import Repository
 from .storage import ObjectStore
-from .objects import Blob
+from .objects import Commit
+from .trees import flatten_tree
+from .lock import LockFile
+from .utils import atomic_write_bytes
+from .indexfile import (
+    INDEX_VERSION, MAGIC, IndexEntries, IndexEntry, SharedIndexLink,
+    checksum, encode_index, encode_split_index, is_index_file, read_index,
+)
+from .worktree import iter_files
+from .ignore import IgnoreMatcher
+
+
+# Shared indexes of a split index are .pyvcs/sharedindex.<checksum>
+SHARED_INDEX_PREFIX = "sharedindex."
+# Unused shared indexes are kept this many seconds, for readers that
+# have read the index file referring to one but not opened it yet
+SHARED_INDEX_EXPIRE = 300
 
 
 class IndexError(Exception):
     pass
 
 
+def _map_file(f) -> mmap.mmap:
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
 class Index:
     def __init__(self, repo: Repository):
         self.repo = repo
         self.index_path = repo.index_file
-        self.entries: Dict[str, str] = {}
+        self.entries = IndexEntries()
+        # Cache-tree: tree hash of every directory ("" is the root) whose
+        # entries are unchanged since its tree was last written.
+        self.cache_tree: Dict[str, str] = {}
+        # mtime of the index file itself, used to detect racily clean entries
+        self.timestamp_ns = 0
+        # Format of the index file as read: 1 for JSON, None if there is none
+        self.version: Optional[int] = None
+        # Checksum and cache-tree of the shared index that entries are
+        # read from, when the index is split
+        self._shared_base: Optional[str] = None
+        self._shared_tree: Dict[str, str] = {}
+        self._batch_depth = 0
+        self._dirty = False
+        # Lock held by the outermost batch
+        self._lock: Optional[LockFile] = None
+        # Identity of the index file as loaded, to notice other writers
+        self._loaded: Optional[Tuple[int, int, int]] = None
         self._load()
 
+    def _identity(self) -> Optional[Tuple[int, int, int]]:
+        """
+        (inode, mtime, size) of the index file. Every write replaces the
+        file, so this changes whenever another process writes it.
+        """
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
     def _load(self) -> None:
         """
-        Load index from disk.
+        Load index from disk. A binary index is mapped, not read.
         """
-        if not self.index_path.exists():
-            self.entries = {}
+        self.entries = IndexEntries()
+        self.cache_tree = {}
+        self.version = None
+        self._shared_base = None
+        # Taken before reading, so a concurrent write is noticed later
+        self._loaded = self._identity()
+        if self._loaded is None:
+            self._seed_from_head({})
             return
 
-        content = self.index_path.read_text().strip()
+        self.timestamp_ns = self._loaded[1]
+
+        with self.index_path.open("rb") as f:
+            head = f.read(len(MAGIC))
+            if is_index_file(head):
+                self.entries, self.cache_tree, link = read_index(_map_file(f))
+                self.version = INDEX_VERSION
+                if link is not None:
+                    self._load_shared(link)
+                return
+            content = (head + f.read()).decode("utf-8").strip()
+
         if not content:
-            self.entries = {}
+            self._seed_from_head({})
             return
 
-        self.entries = json.loads(content)
+        # JSON index written before version 2; saving upgrades it
+        self.version = 1
+        data = json.loads(content)
+        if isinstance(data.get("entries"), dict):
+            raw_entries = data["entries"]
+        else:
+            raw_entries = data  # legacy flat format
+            data = {}
+
+        entries = {
+            path: IndexEntry.from_json(value)
+            for path, value in raw_entries.items()
+        }
+
+        if data.get("snapshot"):
+            self.entries.update(entries)
+            self.cache_tree = dict(data.get("cache_tree", {}))
+        else:
+            # Older indexes only held what was staged since the last
+            # commit, which cleared them.
+            self._seed_from_head(entries)
+
+    def _load_shared(self, link: SharedIndexLink) -> None:
+        """
+        Read the shared index of a split index and apply the changes
+        loaded from the index file on top of it.
+        """
+        shared_path = self.repo.vcs_dir / (SHARED_INDEX_PREFIX + link.base)
+        try:
+            with shared_path.open("rb") as f:
+                entries, shared_tree, _ = read_index(_map_file(f))
+        except FileNotFoundError:
+            raise IndexError(f"Shared index {shared_path.name} is missing") from None
+
+        self._shared_base = link.base
+        self._shared_tree = shared_tree
+        cache_tree = dict(shared_tree)
+        cache_tree.update(self.cache_tree)
+        for directory in link.removed_dirs:
+            cache_tree.pop(directory, None)
+
+        entries.update(self.entries.items())
+        for rel_path in link.removed:
+            entries.pop(rel_path, None)
+        self.entries = entries
+        self.cache_tree = cache_tree
+
+    def _seed_from_head(self, staged: Dict[str, IndexEntry]) -> None:
+        """
+        Fill the index from the HEAD tree, then apply staged entries on top.
+        """
+        commit_hash = self.repo.head_commit()
+        if commit_hash:
+            store = ObjectStore(self.repo)
+            tree_hash = Commit.read(store, commit_hash).tree
+            blobs = flatten_tree(store, tree_hash, trees=self.cache_tree)
+            self.entries.update((path, IndexEntry(hash=h)) for path, h in blobs.items())
+
+        for rel_path, entry in staged.items():
+            self._set(rel_path, entry)
 
     def _save(self) -> None:
         """
-        Persist index to disk.
+        Persist index to disk. A split index only writes the changes
+        since its shared index, until there are more than
+        index.split_threshold of them and a new shared index is written.
         """
-        self.index_path.write_text(
-            json.dumps(self.entries, sort_keys=True, indent=2)
-        )
+        threshold = int(self.repo.config.get("index.split_threshold"))
+        previous_base = self._shared_base
 
-    def add(self, path: Path, store: ObjectStore) -> None:
+        lock, self._lock = self._lock, None
+        if lock is None:
+            lock = self.repo.lock_file(self.index_path).acquire()
+        try:
+            self._smudge_racy(lock.touch())
+            if not threshold:
+                data = encode_index(self.entries, self.cache_tree)
+                # Read back from memory, releasing the mapping of the old file
+                self.entries = read_index(data, verify=False)[0]
+                self._shared_base = None
+            else:
+                if self._shared_base is None or len(self.entries.changes) > threshold:
+                    self._write_shared()
+                data = encode_split_index(
+                    self.entries.changes, self.cache_tree, self._shared_tree, self._shared_base
+                )
+            lock.write(data)
+        except BaseException:
+            lock.rollback()
+            raise
+        lock.commit()
+
+        self._loaded = self._identity()
+        self.timestamp_ns = self._loaded[1]
+        self.version = INDEX_VERSION
+        self._dirty = False
+        if previous_base is not None and self._shared_base != previous_base:
+            # Readers of the index just replaced may still need it
+            self._touch_shared(previous_base)
+            self._expire_shared()
+
+    def _smudge_racy(self, written_ns: int) -> None:
         """
-        Add a file to the staging area.
+        Smudge entries that would be racily clean in the index file about
+        to be written, whose mtime is no earlier than written_ns: their
+        size is set to -1, so their content is checked until their stat
+        data is refreshed. Only entries changed since the index was read
+        can be racy, as those were smudged when their index was written.
         """
-        path = path.resolve()
+        racy = [
+            (rel_path, entry) for rel_path, entry in self.entries.changes.items()
+            if entry is not None and entry.size >= 0 and entry.mtime_ns >= written_ns
+        ]
+        for rel_path, entry in racy:
+            self.entries[rel_path] = entry._replace(size=-1)
 
-        if not path.exists():
-            raise IndexError(f"File not found: {path}")
+    def _write_shared(self) -> None:
+        """
+        Write all entries to a new shared index and read them back from it.
+        """
+        data = encode_index(self.entries, self.cache_tree)
+        base = checksum(data)
+        shared_path = self.repo.vcs_dir / (SHARED_INDEX_PREFIX + base)
+        if not self._touch_shared(base):
+            atomic_write_bytes(shared_path, data, self.repo.durable)
+        self.entries = read_index(data, verify=False)[0]
+        self._shared_base = base
+        self._shared_tree = dict(self.cache_tree)
 
-        if not path.is_file():
+    def _touch_shared(self, base: str) -> bool:
+        """
+        Restart the expiry period of a shared index that is reused or
+        replaced. Returns False if it does not exist.
+        """
+        try:
+            os.utime(self.repo.vcs_dir / (SHARED_INDEX_PREFIX + base))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _expire_shared(self) -> None:
+        """
+        Remove shared indexes other than the current one, once they were
+        last used or replaced long enough ago that no reader can still be
+        about to open them.
+        """
+        cutoff = time.time() - SHARED_INDEX_EXPIRE
+        for path in self.repo.vcs_dir.glob(SHARED_INDEX_PREFIX + "*"):
+            if path.name == SHARED_INDEX_PREFIX + str(self._shared_base):
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _invalidate(self, rel_path: str) -> None:
+        """
+        Drop the cached trees of every directory containing rel_path.
+        """
+        directory = rel_path
+        while directory:
+            directory = directory.rpartition("/")[0]
+            self.cache_tree.pop(directory, None)
+
+    def _set(self, rel_path: str, entry: IndexEntry) -> None:
+        old = self.entries.get(rel_path)
+        if old is None or old.hash != entry.hash:
+            self._invalidate(rel_path)
+        self.entries[rel_path] = entry
+
+    def _remove(self, rel_path: str) -> None:
+        if self.entries.pop(rel_path, None) is not None:
+            self._invalidate(rel_path)
+
+    def _changed(self) -> None:
+        """
+        Persist a modification now, or at the end of the current batch.
+        """
+        if self._batch_depth:
+            self._dirty = True
+        else:
+            self._save()
+
+    @contextmanager
+    def batch(self) -> Iterator["Index"]:
+        """
+        Group several modifications into a single index write, holding
+        the index lock meanwhile. Entering the outermost batch reloads the
+        index if another process wrote it since it was read, so that
+        changes apply to the latest version and none are lost.
+        The index is written once when the outermost batch exits; if the
+        block raises, in-memory changes are discarded instead.
+        """
+        if self._batch_depth == 0 and self._lock is None:
+            self._lock = self.repo.lock_file(self.index_path).acquire()
+            if self._identity() != self._loaded:
+                self._load()
+
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._release()
+                self._dirty = False
+                self._load()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            if self._dirty:
+                self._save()
+            self._release()
+
+    @contextmanager
+    def _cache_update(self) -> Iterator[bool]:
+        """
+        Batch for updates derived from the index as it was loaded (stat
+        data, cache-tree). They are only an optimization, so rather than
+        wait for the lock or apply them to a newer index, yield False and
+        let the caller skip them.
+        """
+        if self._batch_depth == 0:
+            lock = LockFile(self.index_path, durable=self.repo.durable)
+            if not lock.try_acquire():
+                yield False
+                return
+            if self._identity() != self._loaded:
+                lock.rollback()
+                yield False
+                return
+            self._lock = lock
+
+        with self.batch():
+            yield True
+
+    def _release(self) -> None:
+        lock, self._lock = self._lock, None
+        if lock is not None:
+            lock.rollback()
+
+    def add(self, path: Path, store: ObjectStore) -> None:
+        """
+        Add a file to the staging area, or stage the removal of a tracked
+        file that no longer exists.
+        """
+        if path.is_dir():
             raise IndexError("Only files can be added")
+        rel_path, entry = self._hash_file(path, store)
+        with self.batch():
+            self._stage(rel_path, entry)
+            self._changed()
+
+    def add_many(
+        self,
+        paths: Iterable[Path],
+        store: ObjectStore,
+        workers: int = 1,
+    ) -> List[str]:
+        """
+        Add files and directories (recursively) to the staging area,
+        writing the index once. Tracked files that no longer exist, named
+        or under a named directory, are removed from it. Returns the
+        staged paths.
+        With workers > 1, files are read, hashed and stored by a thread
+        pool; results are applied in input order, so the outcome does not
+        depend on scheduling.
+        """
+        files = list(_expand_paths(paths, self.repo.root, self.entries))
+
+        # Blobs are synced together before the index refers to them
+        with store.batch():
+            if workers > 1 and len(files) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda p: self._hash_file(p, store), files))
+            else:
+                results = [self._hash_file(p, store) for p in files]
+
+        with self.batch():
+            for rel_path, entry in results:
+                self._stage(rel_path, entry)
+            if results:
+                self._changed()
+        return [rel_path for rel_path, _ in results]
+
+    def _hash_file(
+        self, path: Path, store: ObjectStore
+    ) -> Tuple[str, Optional[IndexEntry]]:
+        """
+        Store the blob for a file and return its index entry, or None if
+        there is no file at the path any more.
+        Does not touch self.entries, so it may run in worker threads.
+        """
+        path = path.resolve()
 
         if not path.is_relative_to(self.repo.root):
             raise IndexError("File must be inside the repository")
 
         rel_path = path.relative_to(self.repo.root).as_posix()
 
-        data = path.read_bytes()
-        blob = Blob(data)
-        blob_hash = blob.store(store)
+        if not path.exists() or path.is_dir():
+            return rel_path, None
 
-        self.entries[rel_path] = blob_hash
-        self._save()
+        if not path.is_file():
+            raise IndexError("Only files can be added")
+
+        st = os.lstat(path)
+        with path.open("rb") as f:
+            blob_hash = store.store_stream(f)
+
+        return rel_path, IndexEntry.from_stat(blob_hash, st)
+
+    def _stage(self, rel_path: str, entry: Optional[IndexEntry]) -> None:
+        if entry is not None:
+            self._set(rel_path, entry)
+        elif rel_path in self.entries:
+            self._remove(rel_path)
+        else:
+            raise IndexError(f"File not found: {rel_path}")
 
     def remove(self, path: Path) -> None:
         """
         Remove a file from the staging area.
         """
         rel_path = path.as_posix()
-        if rel_path not in self.entries:
-            raise IndexError("File not staged")
+        with self.batch():
+            if rel_path not in self.entries:
+                raise IndexError("File not staged")
 
-        del self.entries[rel_path]
-        self._save()
+            self._remove(rel_path)
+            self._changed()
 
     def clear(self) -> None:
         """
         Clear the staging area.
         """
-        self.entries = {}
-        self._save()
+        with self.batch():
+            self.entries = IndexEntries()
+            self.cache_tree = {}
+            self._shared_base = None
+            self._changed()
+
+    def upgrade(self) -> bool:
+        """
+        Rewrite an index in an older format in the current one. Returns
+        whether it was rewritten.
+        """
+        with self.batch():
+            if self.version in (None, INDEX_VERSION):
+                return False
+            self._changed()
+        return True
+
+    def update_entries(self, updates: Dict[str, Optional[IndexEntry]]) -> None:
+        """
+        Set or (with None) remove several entries with one index write.
+        """
+        if not updates:
+            return
+
+        with self.batch():
+            for rel_path, entry in updates.items():
+                if entry is None:
+                    self._remove(rel_path)
+                else:
+                    self._set(rel_path, entry)
+            self._changed()
+
+    def update_cache_tree(self, trees: Dict[str, str]) -> None:
+        """
+        Record freshly written directory trees (path -> tree hash).
+        """
+        if not trees:
+            return
+
+        with self._cache_update() as current:
+            if current:
+                self.cache_tree.update(trees)
+                self._changed()
 
     def list_entries(self) -> Dict[str, str]:
         """
-        Return staged files.
+        Return staged files as path -> blob hash.
+        """
+        return {path: entry.hash for path, entry in self.entries.items()}
+
+    def is_racy(self, entry: IndexEntry) -> bool:
+        """
+        An entry is racily clean when the file was modified in the same
+        timestamp tick the index was written: a later change of equal size
+        would leave the stat data untouched, so its content must be checked.
+        """
+        return entry.mtime_ns >= self.timestamp_ns
+
+    def stat_unchanged(self, rel_path: str, st: Optional[os.stat_result]) -> bool:
+        """
+        Return True if the working file is known to match the staged blob
+        from stat data alone, without reading it.
+        """
+        entry = self.entries.get(rel_path)
+        if entry is None or st is None or entry.size < 0:
+            return False
+        return entry.matches_stat(st) and not self.is_racy(entry)
+
+    def refresh(self, stats: Dict[str, os.stat_result]) -> None:
         """
-        return dict(self.entries)
\ No newline at end of file
+        Update the cached stat data of entries whose content was verified
+        to match the staged blob, so the next check can skip reading them.
+        """
+        if not stats:
+            return
+
+        with self._cache_update() as current:
+            if current:
+                for rel_path, st in stats.items():
+                    entry = self.entries[rel_path]
+                    self.entries[rel_path] = IndexEntry.from_stat(entry.hash, st)
+                self._changed()
+
+
+def _expand_paths(
+    paths: Iterable[Path],
+    root: Path,
+    tracked: IndexEntries,
+) -> Iterator[Path]:
+    """
+    Yield files, descending into directories in sorted order, then the
+    tracked paths under each directory that are no longer files, so
+    their removal is staged. A removed directory stands for the tracked
+    files it held. Repository metadata directories and ignored files and
+    directories found while descending are skipped; files named
+    explicitly are kept.
+    """
+    ignore = IgnoreMatcher(root)
+    for path in paths:
+        if path.is_file():
+            yield path
+            continue
+
+        abs_dir = path.resolve()
+        if not abs_dir.is_relative_to(root):
+            raise IndexError("File must be inside the repository")
+        rel_dir = abs_dir.relative_to(root).as_posix()
+        if rel_dir == ".":
+            rel_dir = ""
+
+        found = set()
+        if path.is_dir():
+            if rel_dir and ignore.is_ignored(rel_dir, is_dir=True):
+                continue
+            prefix = rel_dir + "/" if rel_dir else ""
+            for rel_path, _ in iter_files(abs_dir, ignore.prune, prefix):
+                if not ignore.match(rel_path, False):
+                    found.add(rel_path)
+                    yield root / rel_path
+
+        removed = [
+            rel_path for rel_path in _tracked_under(tracked, rel_dir)
+            if rel_path not in found and not (root / rel_path).is_file()
+        ]
+        if not removed and not path.exists():
+            raise IndexError(f"File not found: {path}")
+        for rel_path in removed:
+            yield root / rel_path
+
+
+def _tracked_under(tracked: IndexEntries, rel_dir: str) -> Iterator[str]:
+    """
+    Tracked paths equal to rel_dir or below it; every path for "".
+    """
+    prefix = rel_dir + "/"
+    for rel_path in tracked:
+        if not rel_dir or rel_path == rel_dir or rel_path.startswith(prefix):
+            yield rel_path
@@ -0,0 +1,434 @@
+"""
+On-disk format of the index, version 2.
+
+The index file is memory-mapped and read in place: nothing is decoded
+when it is loaded, lookups binary-search the path-sorted records, and
+saving copies runs of unchanged records as they are. Changes made since
+loading are kept in a dict on top of the mapped file until the next save.
+
+Layout (all integers big-endian):
+    header: magic "PIDX", version (4 bytes), entry count (4 bytes),
+        size of the path table (4 bytes)
+    entry records in path order, fixed width: raw 20-byte blob hash,
+        size, mtime_ns, ctime_ns (8 bytes each, signed), inode
+        (8 bytes), mode (4 bytes)
+    end offset of each path in the path table (4 bytes each)
+    path table: the UTF-8 paths, concatenated in record order
+    cache-tree: directory count (4 bytes), then for each directory its
+        path length (2 bytes), UTF-8 path and raw 20-byte tree hash
+    extensions: 4-byte tag, payload size (4 bytes), payload
+    SHA-1 of everything before it
+
+A split index is a small index file of the entries and cache-tree
+directories changed since a shared index, which holds all the others,
+was written. Its "LINK" extension names the shared index by checksum
+and lists the paths and directories removed since:
+    raw 20-byte checksum of the shared index
+    removed path count (4 bytes), then each path's length (2 bytes)
+        and UTF-8 path
+    removed cache-tree directories, the same way
+"""
+import hashlib
+import os
+import struct
+from collections.abc import ItemsView, MutableMapping
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+MAGIC = b"PIDX"
+INDEX_VERSION = 2
+HASH_SIZE = 20
+
+_HEADER = struct.Struct(">4sIII")
+_RECORD = struct.Struct(">20sqqqQI")
+_UINT = struct.Struct(">I")
+_DIR = struct.Struct(">H")
+_EXTENSION = struct.Struct(">4sI")
+LINK = b"LINK"
+
+
+class IndexFormatError(Exception):
+    pass
+
+
+class IndexEntry(NamedTuple):
+    """
+    A staged file: blob hash plus the stat data it had when staged.
+    size == -1 means no stat data is cached and the file must be hashed.
+    Loading a large index creates one per entry walked, hence a tuple.
+    """
+    hash: str
+    size: int = -1
+    mtime_ns: int = 0
+    ctime_ns: int = 0
+    ino: int = 0
+    mode: int = 0
+
+    @staticmethod
+    def from_stat(obj_hash: str, st: os.stat_result) -> "IndexEntry":
+        return IndexEntry(
+            hash=obj_hash,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            ctime_ns=st.st_ctime_ns,
+            ino=st.st_ino,
+            mode=st.st_mode,
+        )
+
+    def matches_stat(self, st: os.stat_result) -> bool:
+        return (
+            self.size == st.st_size
+            and self.mtime_ns == st.st_mtime_ns
+            and self.ctime_ns == st.st_ctime_ns
+            and self.ino == st.st_ino
+            and self.mode == st.st_mode
+        )
+
+    @staticmethod
+    def from_json(value: Union[str, dict]) -> "IndexEntry":
+        """
+        Entry of a JSON index, as written before version 2.
+        """
+        if isinstance(value, str):
+            # Legacy index: path -> blob hash, no stat data.
+            return IndexEntry(hash=value)
+        return IndexEntry(**value)
+
+
+class SharedIndexLink(NamedTuple):
+    """
+    What a split index adds to its shared index: base is the shared
+    index checksum, removed and removed_dirs what was deleted from its
+    entries and cache-tree.
+    """
+    base: str
+    removed: List[str]
+    removed_dirs: List[str]
+
+
+def _encode_path(path: str) -> bytes:
+    return path.encode("utf-8", "surrogateescape")
+
+
+def _encode_paths(paths: List[str]) -> List[bytes]:
+    parts = [_UINT.pack(len(paths))]
+    for path in paths:
+        raw_path = _encode_path(path)
+        parts.append(_DIR.pack(len(raw_path)) + raw_path)
+    return parts
+
+
+def _decode_paths(data: bytes, position: int) -> Tuple[List[str], int]:
+    (count,) = _UINT.unpack_from(data, position)
+    position += _UINT.size
+    paths = []
+    for _ in range(count):
+        (length,) = _DIR.unpack_from(data, position)
+        position += _DIR.size + length
+        paths.append(data[position - length:position].decode("utf-8", "surrogateescape"))
+    return paths, position
+
+
+def _pack_entry(entry: IndexEntry) -> bytes:
+    return _RECORD.pack(
+        bytes.fromhex(entry.hash), entry.size, entry.mtime_ns, entry.ctime_ns, entry.ino, entry.mode
+    )
+
+
+def is_index_file(head: bytes) -> bool:
+    """
+    Whether a file starting with head is in the binary format; older
+    indexes are JSON.
+    """
+    return head[:len(MAGIC)] == MAGIC
+
+
+class IndexEntries(MutableMapping):
+    """
+    path -> IndexEntry mapping over an encoded index (the base), plus
+    the entries set or deleted (None) since it was read. Iteration is in
+    path byte order.
+    """
+
+    __slots__ = ("data", "_count", "_ends", "_paths", "_changes", "_len")
+
+    def __init__(self, data: bytes = b"", count: int = 0):
+        self.data = data
+        self._count = count
+        self._ends = _HEADER.size + _RECORD.size * count
+        self._paths = self._ends + _UINT.size * count
+        self._changes: Dict[str, Optional[IndexEntry]] = {}
+        self._len = count
+
+    # ----- base records -----
+
+    def _path_end(self, i: int) -> int:
+        """
+        End of the path of base record i in the path table; 0 for i = -1.
+        """
+        if i < 0:
+            return 0
+        return _UINT.unpack_from(self.data, self._ends + _UINT.size * i)[0]
+
+    def _find(self, key: bytes) -> Tuple[int, bool]:
+        """
+        Position of a path among the base records and whether it is there.
+        """
+        data = self.data
+        paths = self._paths
+        unpack = _UINT.unpack_from
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = self._ends + _UINT.size * mid
+            start = unpack(data, position - _UINT.size)[0] if mid else 0
+            found = data[paths + start:paths + unpack(data, position)[0]]
+            if found == key:
+                return mid, True
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo, False
+
+    def _base_entry(self, i: int) -> IndexEntry:
+        raw_hash, *stat = _RECORD.unpack_from(self.data, _HEADER.size + _RECORD.size * i)
+        return IndexEntry(raw_hash.hex(), *stat)
+
+    def _base_items(self, lo: int, hi: int) -> Iterator[Tuple[str, IndexEntry]]:
+        if lo >= hi:
+            return
+        data = self.data
+        start = self._path_end(lo - 1)
+        ends = struct.unpack_from(f">{hi - lo}I", data, self._ends + _UINT.size * lo)
+        names = data[self._paths + start:self._paths + ends[-1]]
+        records = _RECORD.iter_unpack(
+            memoryview(data)[_HEADER.size + _RECORD.size * lo:_HEADER.size + _RECORD.size * hi]
+        )
+        make = tuple.__new__
+        base = start
+        for end, (raw_hash, size, mtime_ns, ctime_ns, ino, mode) in zip(ends, records):
+            yield (
+                names[start - base:end - base].decode("utf-8", "surrogateescape"),
+                make(IndexEntry, (raw_hash.hex(), size, mtime_ns, ctime_ns, ino, mode)),
+            )
+            start = end
+
+    def _runs(self) -> Iterator[Tuple[int, int, Optional[str], Optional[IndexEntry]]]:
+        """
+        Walk the merged entries in path order as (lo, hi, path, entry):
+        base records lo..hi are unchanged, then path is set to entry (or
+        deleted if entry is None; path is None at the end).
+        """
+        changes = sorted(
+            (_encode_path(path), path, entry) for path, entry in self._changes.items()
+        )
+        position = 0
+        for raw_path, path, entry in changes:
+            i, found = self._find(raw_path)
+            yield position, i, path, entry
+            position = i + found
+        yield position, self._count, None, None
+
+    # ----- mapping -----
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, path) -> bool:
+        if path in self._changes:
+            return self._changes[path] is not None
+        return self._find(_encode_path(path))[1]
+
+    def __getitem__(self, path: str) -> IndexEntry:
+        if path in self._changes:
+            entry = self._changes[path]
+            if entry is None:
+                raise KeyError(path)
+            return entry
+        i, found = self._find(_encode_path(path))
+        if not found:
+            raise KeyError(path)
+        return self._base_entry(i)
+
+    def __setitem__(self, path: str, entry: IndexEntry) -> None:
+        if path not in self:
+            self._len += 1
+        self._changes[path] = entry
+
+    def __delitem__(self, path: str) -> None:
+        if path not in self:
+            raise KeyError(path)
+        self._len -= 1
+        self._changes[path] = None
+
+    def __iter__(self) -> Iterator[str]:
+        for path, _ in self.items():
+            yield path
+
+    def items(self) -> ItemsView:
+        return _IndexItems(self)
+
+    @property
+    def changes(self) -> Dict[str, Optional[IndexEntry]]:
+        """
+        Entries set, or deleted (None), since the base was read.
+        """
+        return self._changes
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def __repr__(self) -> str:
+        return f"IndexEntries({dict(self.items())!r})"
+
+
+class _IndexItems(ItemsView):
+    def __iter__(self):
+        entries = self._mapping
+        for lo, hi, path, entry in entries._runs():
+            yield from entries._base_items(lo, hi)
+            if entry is not None:
+                yield path, entry
+
+
+def encode_index(
+    entries: IndexEntries,
+    cache_tree: Dict[str, str],
+    link: Optional[SharedIndexLink] = None,
+) -> bytes:
+    """
+    Encode entries and the cache-tree, plus the link to the shared index
+    for a split index. Runs of unchanged base records are copied as
+    they are.
+    """
+    data = entries.data
+    records: List[bytes] = []
+    ends: List[bytes] = []
+    paths: List[bytes] = []
+    count = 0
+    offset = 0  # size of the path table so far
+
+    for lo, hi, path, entry in entries._runs():
+        if lo < hi:
+            start, end = entries._path_end(lo - 1), entries._path_end(hi - 1)
+            records.append(data[_HEADER.size + _RECORD.size * lo:_HEADER.size + _RECORD.size * hi])
+            paths.append(data[entries._paths + start:entries._paths + end])
+            raw_ends = data[entries._ends + _UINT.size * lo:entries._ends + _UINT.size * hi]
+            shift = offset - start
+            if shift:
+                # Entries were inserted or deleted before this run
+                old_ends = struct.unpack(f">{hi - lo}I", raw_ends)
+                raw_ends = struct.pack(f">{hi - lo}I", *[value + shift for value in old_ends])
+            ends.append(raw_ends)
+            count += hi - lo
+            offset += end - start
+        if entry is not None:
+            raw_path = _encode_path(path)
+            records.append(_pack_entry(entry))
+            paths.append(raw_path)
+            offset += len(raw_path)
+            ends.append(_UINT.pack(offset))
+            count += 1
+
+    if offset > 0xFFFFFFFF:
+        raise IndexFormatError("Index paths exceed 4 GiB")
+
+    dirs = [_UINT.pack(len(cache_tree))]
+    for directory, tree_hash in sorted(cache_tree.items()):
+        raw_dir = _encode_path(directory)
+        dirs.append(_DIR.pack(len(raw_dir)) + raw_dir + bytes.fromhex(tree_hash))
+
+    extensions = []
+    if link is not None:
+        payload = b"".join(
+            [bytes.fromhex(link.base)] + _encode_paths(link.removed) + _encode_paths(link.removed_dirs)
+        )
+        extensions = [_EXTENSION.pack(LINK, len(payload)), payload]
+
+    body = b"".join(
+        [_HEADER.pack(MAGIC, INDEX_VERSION, count, offset)]
+        + records + ends + paths + dirs + extensions
+    )
+    return body + hashlib.sha1(body).digest()
+
+
+def encode_split_index(
+    changes: Dict[str, Optional[IndexEntry]],
+    cache_tree: Dict[str, str],
+    shared_tree: Dict[str, str],
+    base: str,
+) -> bytes:
+    """
+    Encode a split index: the entry changes and the cache-tree
+    differences since the shared index base, whose cache-tree was
+    shared_tree.
+    """
+    delta = IndexEntries()
+    removed = []
+    for path, entry in changes.items():
+        if entry is None:
+            removed.append(path)
+        else:
+            delta[path] = entry
+    dirs = {d: h for d, h in cache_tree.items() if shared_tree.get(d) != h}
+    removed_dirs = [d for d in shared_tree if d not in cache_tree]
+    return encode_index(delta, dirs, SharedIndexLink(base, sorted(removed), sorted(removed_dirs)))
+
+
+def checksum(data: bytes) -> str:
+    """
+    Checksum of an encoded index, which names it when it is shared.
+    """
+    return data[len(data) - HASH_SIZE:].hex()
+
+
+def read_index(
+    data: bytes, verify: bool = True
+) -> Tuple[IndexEntries, Dict[str, str], Optional[SharedIndexLink]]:
+    """
+    Parse an encoded index (which may be an mmap) into its entries, read
+    in place, its cache-tree and, for a split index, the link to its
+    shared index.
+    """
+    if len(data) < _HEADER.size + _UINT.size + HASH_SIZE:
+        raise IndexFormatError("Index file is truncated")
+    magic, version, count, paths_size = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise IndexFormatError("Not an index file")
+    if version != INDEX_VERSION:
+        raise IndexFormatError(f"Unsupported index version {version}")
+
+    body_size = len(data) - HASH_SIZE
+    if verify:
+        with memoryview(data) as view:
+            digest = hashlib.sha1(view[:body_size]).digest()
+        if digest != data[body_size:]:
+            raise IndexFormatError("Index file is corrupt (checksum mismatch)")
+
+    entries = IndexEntries(data, count)
+    position = entries._paths + paths_size
+    if position + _UINT.size > body_size:
+        raise IndexFormatError("Index file is truncated")
+
+    cache_tree: Dict[str, str] = {}
+    (dir_count,) = _UINT.unpack_from(data, position)
+    position += _UINT.size
+    for _ in range(dir_count):
+        (length,) = _DIR.unpack_from(data, position)
+        start = position + _DIR.size
+        position = start + length + HASH_SIZE
+        directory = data[start:start + length].decode("utf-8", "surrogateescape")
+        cache_tree[directory] = data[start + length:position].hex()
+
+    link = None
+    while position < body_size:
+        tag, size = _EXTENSION.unpack_from(data, position)
+        position += _EXTENSION.size
+        if tag != LINK:
+            raise IndexFormatError(f"Unsupported index extension {tag!r}")
+        base = data[position:position + HASH_SIZE].hex()
+        removed, end = _decode_paths(data, position + HASH_SIZE)
+        removed_dirs, end = _decode_paths(data, end)
+        link = SharedIndexLink(base, removed, removed_dirs)
+        position += size
+    return entries, cache_tree, link
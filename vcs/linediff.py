@@ -0,0 +1,405 @@
+"""
+Line diff engine.
+
+Lines are interned to integer IDs so comparisons are int compares. The
+common prefix and suffix are trimmed, then the remaining range is
+aligned with patience anchors: lines that occur exactly once on each
+side, kept in order by a longest increasing subsequence. Gaps between
+anchors are handled the same way recursively; a gap without unique
+lines falls back to Myers' O(ND) algorithm, with a cap on D so that
+pathological inputs degrade to a plain replacement instead of taking
+quadratic time.
+"""
+from bisect import bisect_left
+from collections import Counter
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+# Same heuristic as git: a NUL byte near the start means binary
+BINARY_PEEK = 8000
+MYERS_MAX_D = 1000
+
+# (tag, i1, i2, j1, j2), as in difflib.SequenceMatcher.get_opcodes
+Opcode = Tuple[str, int, int, int, int]
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_PEEK]
+
+
+def binary_notice(path: str, new_path: Optional[str] = None) -> str:
+    return f"Binary files a/{path} and b/{new_path or path} differ\n"
+
+
+def _intern(a: Sequence, b: Sequence) -> Tuple[List[int], List[int]]:
+    ids: dict = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def _unique_anchors(a: List[int], b: List[int], alo, ahi, blo, bhi) -> List[Tuple[int, int]]:
+    """
+    Lines occurring once on each side, as (i, j) pairs forming the longest
+    sequence increasing on both sides.
+    """
+    a_slice = a[alo:ahi]
+    b_slice = b[blo:bhi]
+    a_counts = Counter(a_slice)
+    b_counts = Counter(b_slice)
+    # For lines occurring once, the last position is the only one
+    a_index = dict(zip(a_slice, range(alo, ahi)))
+    b_index = dict(zip(b_slice, range(blo, bhi)))
+
+    pairs = sorted(
+        (a_index[x], b_index[x])
+        for x, count in a_counts.items()
+        if count == 1 and b_counts.get(x) == 1
+    )
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of j (patience sorting)
+    tails: List[int] = []
+    tail_idx: List[int] = []
+    back: List[int] = []
+    for n, (_, j) in enumerate(pairs):
+        k = bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_idx.append(n)
+        else:
+            tails[k] = j
+            tail_idx[k] = n
+        back.append(tail_idx[k - 1] if k else -1)
+
+    out = []
+    n = tail_idx[-1]
+    while n >= 0:
+        out.append(pairs[n])
+        n = back[n]
+    out.reverse()
+    return out
+
+
+def _myers(a: List[int], b: List[int], alo, ahi, blo, bhi) -> Optional[List[Tuple[int, int, int]]]:
+    """
+    Matching blocks (i, j, size) of a shortest edit script, or None if
+    it needs more than MYERS_MAX_D edits.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = min(n + m, MYERS_MAX_D)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+
+    for d in range(max_d + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]  # down: insertion
+            else:
+                x = v[offset + k - 1] + 1  # right: deletion
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_blocks(trace, d, n, m, alo, blo)
+    return None
+
+
+def _myers_blocks(trace, d_end, n, m, alo, blo) -> List[Tuple[int, int, int]]:
+    """
+    Walk the saved V arrays back from (n, m) to recover the snakes.
+    trace[d] holds V for k in -d-1 .. d+1 as it was before step d.
+    """
+    blocks = []
+    x, y = n, m
+    for d in range(d_end, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+
+        # Diagonal run back to the point right after the edit
+        size = min(x - prev_x, y - prev_y) if d else x
+        if size > 0:
+            blocks.append((alo + x - size, blo + y - size, size))
+        x, y = prev_x, prev_y
+    return blocks
+
+
+def matching_blocks(a: List[int], b: List[int]) -> List[Tuple[int, int, int]]:
+    """
+    Return sorted, non-adjacent matching blocks (i, j, size) of two
+    sequences of line IDs.
+    """
+    blocks: List[Tuple[int, int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        # Common prefix and suffix
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start:
+            blocks.append((start, blo - (alo - start), alo - start))
+        end = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if ahi < end:
+            blocks.append((ahi, bhi, end - ahi))
+
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            # Runs of adjacent anchors become one block; only gaps with
+            # lines on both sides need more work.
+            i0, j0 = alo, blo
+            run_i = run_j = run = 0
+            for i, j in anchors:
+                if run and i == i0 and j == j0:
+                    run += 1
+                else:
+                    if run:
+                        blocks.append((run_i, run_j, run))
+                    if i0 < i and j0 < j:
+                        stack.append((i0, i, j0, j))
+                    run_i, run_j, run = i, j, 1
+                i0, j0 = i + 1, j + 1
+            blocks.append((run_i, run_j, run))
+            if i0 < ahi and j0 < bhi:
+                stack.append((i0, ahi, j0, bhi))
+            continue
+
+        if set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+            continue  # nothing in common: a plain replacement
+
+        found = _myers(a, b, alo, ahi, blo, bhi)
+        if found:
+            blocks.extend(found)
+
+    blocks.sort()
+    merged: List[Tuple[int, int, int]] = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            pi, pj, psize = merged[-1]
+            merged[-1] = (pi, pj, psize + size)
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def opcodes(a: Sequence, b: Sequence) -> List[Opcode]:
+    """
+    Edit operations turning a into b, in difflib's opcode format.
+    """
+    a_ids, b_ids = _intern(a, b)
+    codes: List[Opcode] = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a_ids, b_ids) + [(len(a), len(b), 0)]:
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        if size:
+            codes.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return codes
+
+
+def grouped_opcodes(codes: List[Opcode], context: int) -> Iterator[List[Opcode]]:
+    """
+    Split opcodes into hunks with up to context lines around changes
+    (the grouping of difflib.SequenceMatcher.get_grouped_opcodes).
+    """
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    codes = list(codes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _emit(out: List[str], prefix: str, line: str) -> None:
+    out.append(prefix + line)
+    if not line.endswith("\n"):
+        out.append("\n\\ No newline at end of file\n")
+
+
+def unified_diff(
+    old: bytes,
+    new: bytes,
+    path: str,
+    context: int = 3,
+    new_path: Optional[str] = None,
+) -> str:
+    """
+    Unified diff of two versions of a file, or a one-line notice for
+    binary content. Returns "" when they are equal.
+    new_path names the new version when it differs (a rename).
+    """
+    new_path = new_path or path
+    if old == new:
+        return ""
+    if is_binary(old) or is_binary(new):
+        return binary_notice(path, new_path)
+
+    a = old.decode("utf-8", errors="replace").splitlines(keepends=True)
+    b = new.decode("utf-8", errors="replace").splitlines(keepends=True)
+
+    out = [f"--- a/{path}\n", f"+++ b/{new_path}\n"]
+    for group in grouped_opcodes(opcodes(a, b), context):
+        first, last = group[0], group[-1]
+        out.append(
+            f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@\n"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    _emit(out, " ", line)
+                continue
+            for line in a[i1:i2]:
+                _emit(out, "-", line)
+            for line in b[j1:j2]:
+                _emit(out, "+", line)
+    return "".join(out)
+
+
+def diff_files(
+    old: BinaryIO,
+    new: BinaryIO,
+    path: str,
+    context: int = 3,
+    new_path: Optional[str] = None,
+) -> str:
+    """
+    unified_diff of two open files known to differ. Binary content is
+    detected from the first bytes, so large binary files are never read
+    in full.
+    """
+    old_head = old.read(BINARY_PEEK)
+    new_head = new.read(BINARY_PEEK)
+    if is_binary(old_head) or is_binary(new_head):
+        return binary_notice(path, new_path)
+    return unified_diff(old_head + old.read(), new_head + new.read(), path, context, new_path)
+
+
+def _sync_regions(base: List[int], ours: List[int], theirs: List[int]) -> List[Tuple[int, int, int, int]]:
+    """
+    Regions of base matched on both sides, as (base start, base end,
+    start in ours, start in theirs), ending with an empty region at the
+    end of each sequence.
+    """
+    our_blocks = matching_blocks(base, ours)
+    their_blocks = matching_blocks(base, theirs)
+    regions = []
+    i = j = 0
+    while i < len(our_blocks) and j < len(their_blocks):
+        our_base, our_start, our_size = our_blocks[i]
+        their_base, their_start, their_size = their_blocks[j]
+        start = max(our_base, their_base)
+        end = min(our_base + our_size, their_base + their_size)
+        if start < end:
+            regions.append((start, end, our_start + start - our_base, their_start + start - their_base))
+        if our_base + our_size < their_base + their_size:
+            i += 1
+        else:
+            j += 1
+    regions.append((len(base), len(base), len(ours), len(theirs)))
+    return regions
+
+
+def _extend_lines(out: List[bytes], lines: Sequence[bytes]) -> None:
+    out.extend(lines)
+    if lines and not lines[-1].endswith(b"\n"):
+        out.append(b"\n")  # keep the next marker on its own line
+
+
+def merge_lines(
+    base: bytes,
+    ours: bytes,
+    theirs: bytes,
+    labels: Tuple[str, str] = ("ours", "theirs"),
+) -> Tuple[bytes, bool]:
+    """
+    Three-way merge of file contents. Lines are aligned with the base
+    on each side; a region changed on one side only takes that side,
+    and a region changed differently on both sides becomes a diff3-style
+    conflict showing ours, the base and theirs.
+    Returns the merged content and whether it has no conflicts.
+    """
+    b = base.splitlines(keepends=True)
+    o = ours.splitlines(keepends=True)
+    t = theirs.splitlines(keepends=True)
+    ids: dict = {}
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    o_ids = [ids.setdefault(line, len(ids)) for line in o]
+    t_ids = [ids.setdefault(line, len(ids)) for line in t]
+
+    out: List[bytes] = []
+    clean = True
+    ib = io = it = 0
+    for base_start, base_end, our_start, their_start in _sync_regions(b_ids, o_ids, t_ids):
+        # Unsynchronized stretch before the region
+        base_part = b_ids[ib:base_start]
+        our_part = o_ids[io:our_start]
+        their_part = t_ids[it:their_start]
+        if our_part == their_part:
+            out.extend(o[io:our_start])
+        elif base_part == our_part:
+            out.extend(t[it:their_start])
+        elif base_part == their_part:
+            out.extend(o[io:our_start])
+        else:
+            clean = False
+            out.append(f"<<<<<<< {labels[0]}\n".encode("utf-8"))
+            _extend_lines(out, o[io:our_start])
+            out.append(b"||||||| base\n")
+            _extend_lines(out, b[ib:base_start])
+            out.append(b"=======\n")
+            _extend_lines(out, t[it:their_start])
+            out.append(f">>>>>>> {labels[1]}\n".encode("utf-8"))
+
+        size = base_end - base_start
+        out.extend(b[base_start:base_end])
+        ib, io, it = base_end, our_start + size, their_start + size
+    return b"".join(out), clean
@@ -0,0 +1,117 @@
+"""
+Lock files for the index and refs.
+
+As in git, the lock of <path> is <path>.lock, created exclusively, and
+it doubles as the temp file for the new content: committing the lock
+renames it over <path>, so readers never need a lock and never see a
+partial write. Objects are content-addressed and need no locking.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from .utils import fsync_dir
+
+LOCK_SUFFIX = ".lock"
+# Waits between attempts grow up to this many seconds
+MAX_RETRY_DELAY = 0.1
+
+
+class LockError(Exception):
+    pass
+
+
+class LockFile:
+    """
+    Exclusive lock on a file, usable as a context manager: the lock is
+    acquired on entry and, unless committed, released on exit.
+    """
+
+    def __init__(self, path: Path, timeout: float = 0.0, durable: bool = False):
+        self.path = path
+        self.lock_path = path.with_name(path.name + LOCK_SUFFIX)
+        self.timeout = timeout
+        self.durable = durable
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """
+        Take the lock if it is free; return whether it was taken.
+        """
+        try:
+            self._fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        return True
+
+    def acquire(self) -> "LockFile":
+        """
+        Take the lock, retrying for up to timeout seconds.
+        """
+        deadline = time.monotonic() + self.timeout
+        delay = 0.001
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                raise LockError(
+                    f"Unable to lock {self.path}: {self.lock_path} exists. "
+                    "If no other pyvcs process is running, remove it."
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+        return self
+
+    def touch(self) -> int:
+        """
+        Set the lock file's mtime to the current file system time and
+        return it. The locked file gets no earlier mtime when committed.
+        """
+        os.utime(self.lock_path)
+        return os.stat(self.lock_path).st_mtime_ns
+
+    def write(self, data: bytes) -> None:
+        """
+        Write the new content of the locked file.
+        """
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+
+    def commit(self) -> None:
+        """
+        Replace the locked file with what was written, releasing the lock.
+        """
+        fd, self._fd = self._fd, None
+        try:
+            if self.durable:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        try:
+            os.replace(self.lock_path, self.path)
+        except BaseException:
+            self.lock_path.unlink(missing_ok=True)
+            raise
+        if self.durable:
+            fsync_dir(self.path.parent)
+
+    def rollback(self) -> None:
+        """
+        Release the lock, leaving the locked file unchanged.
+        """
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        os.close(fd)
+        self.lock_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "LockFile":
+        return self.acquire()
+
+    def __exit__(self, *exc) -> None:
+        self.rollback()
@@ -0,0 +1,72 @@
+import heapq
+import time
+from typing import Iterator, List, Optional
+
+from .repo import Repository
+from .storage import ObjectStore
+from .objects import Commit
+from .trees import lookup_path
+from .commitgraph import CommitGraph
+
+
+def _touches(store: ObjectStore, graph: CommitGraph, pos: int, paths: List[str]) -> bool:
+    """
+    Return True if a commit changed any of paths relative to its first parent.
+    """
+    parents = graph.parents(pos)
+    tree = graph.tree(pos)
+    parent_tree = graph.tree(parents[0]) if parents else None
+    if tree == parent_tree:
+        return False
+
+    return any(
+        lookup_path(store, tree, path) != lookup_path(store, parent_tree, path)
+        for path in paths
+    )
+
+
+def iter_log(
+    repo: Repository,
+    start: Optional[str] = None,
+    paths: Optional[List[str]] = None,
+) -> Iterator[str]:
+    """
+    Yield commit hashes reachable from start (HEAD by default), newest
+    first. With paths, only commits that changed one of them are yielded.
+    The walk reads parents and dates from the commit-graph; commit objects
+    are not opened.
+    """
+    start = start or repo.head_commit()
+    if not start:
+        return
+
+    store = ObjectStore(repo)
+    graph = CommitGraph(repo)
+    start_pos = graph.ensure(store, start)
+
+    seen = bytearray(len(graph))
+    seen[start_pos] = 1
+    queue = [(-graph.timestamp(start_pos), -start_pos)]
+
+    while queue:
+        _, neg_pos = heapq.heappop(queue)
+        pos = -neg_pos
+
+        for parent in graph.parents(pos):
+            if not seen[parent]:
+                seen[parent] = 1
+                heapq.heappush(queue, (-graph.timestamp(parent), -parent))
+
+        if paths and not _touches(store, graph, pos, paths):
+            continue
+        yield graph.hash_at(pos)
+
+
+def format_commit(commit_hash: str, commit: Commit, oneline: bool = False) -> str:
+    if oneline:
+        summary = commit.message.splitlines()[0] if commit.message else ""
+        return f"{commit_hash[:7]} {summary}"
+
+    date = time.strftime("%a %b %d %H:%M:%S %Y", time.localtime(commit.timestamp))
+    body = "\n".join(f"    {line}" for line in commit.message.splitlines())
+    return f"commit {commit_hash}\nDate:   {date}\n\n{body}\n"
@@ -0,0 +1,304 @@
+"""
+Merging a branch into the current one.
+
+The merge base is found on the commit-graph: commits are visited from
+both tips in decreasing generation number, so every descendant of a
+commit is seen before it and the walk stops at the nearest common
+ancestor, without opening commit objects or reading older history.
+
+Trees are merged three-way, top down. A subtree changed on one side
+only (or identically on both) is taken whole by hash, without being
+read; only the names that differ between the two sides are examined,
+and only files changed on both sides are merged line by line. The work
+grows with the size of the changes, not of the repository.
+"""
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .repo import Repository
+from .storage import ObjectStore
+from .objects import Blob, Commit, Tree, TreeEntry, entry_kind
+from .index import Index, IndexEntry
+from .commit import create_commit, write_index_tree
+from .commitgraph import CommitGraph
+from .checkout import reset_tree, switch_tree
+from .refs import resolve_commit, update_ref
+from .trees import changed_entries, lookup_path
+from .linediff import is_binary, merge_lines
+from .utils import atomic_write_bytes
+
+
+class MergeError(Exception):
+    pass
+
+
+@dataclass
+class MergeResult:
+    """
+    status: "up-to-date", "fast-forward", "merged" or "conflicts".
+    commit is the new HEAD, or None while conflicts are unresolved.
+    """
+    status: str
+    commit: Optional[str]
+    conflicts: List[str] = field(default_factory=list)
+
+
+# Sides a commit visited by the merge-base walk was reached from
+_OURS = 1
+_THEIRS = 2
+
+
+def merge_base(repo: Repository, ours: str, theirs: str) -> Optional[str]:
+    """
+    Return the nearest common ancestor of two commits, or None if their
+    histories are unrelated. With several equally near ones (criss-cross
+    merges), the one with the highest generation is returned.
+    """
+    store = ObjectStore(repo)
+    graph = CommitGraph(repo)
+    ours_pos = graph.ensure(store, ours)
+    theirs_pos = graph.ensure(store, theirs)
+
+    flags = bytearray(len(graph))
+    flags[ours_pos] |= _OURS
+    flags[theirs_pos] |= _THEIRS
+    queue = [(-graph.generation(ours_pos), ours_pos), (-graph.generation(theirs_pos), theirs_pos)]
+    heapq.heapify(queue)
+
+    # Descendants have higher generations, so a commit is popped after
+    # every commit of the walk it can be reached from: the first one
+    # reached from both sides is a nearest common ancestor.
+    while queue:
+        _, pos = heapq.heappop(queue)
+        flag = flags[pos]
+        if flag == _OURS | _THEIRS:
+            return graph.hash_at(pos)
+        for parent in graph.parents(pos):
+            if flags[parent] & flag != flag:
+                flags[parent] |= flag
+                heapq.heappush(queue, (-graph.generation(parent), parent))
+    return None
+
+
+def _entries(store: ObjectStore, tree_hash: Optional[str]):
+    if tree_hash is None:
+        return {}
+    return Tree.read(store, tree_hash).entries
+
+
+def _hash(entry: Optional[TreeEntry]) -> Optional[str]:
+    return entry.hash if entry is not None else None
+
+
+def _merge_blobs(
+    store: ObjectStore,
+    base: Optional[str],
+    ours: str,
+    theirs: str,
+    labels: Tuple[str, str],
+) -> Tuple[str, bool]:
+    """
+    Merge the contents of a file changed on both sides. Binary files
+    cannot be merged: ours is kept and the merge is not clean.
+    """
+    base_data = Blob.deserialize(store.load(base)).data if base else b""
+    our_data = Blob.deserialize(store.load(ours)).data
+    their_data = Blob.deserialize(store.load(theirs)).data
+    if is_binary(base_data) or is_binary(our_data) or is_binary(their_data):
+        return ours, False
+    merged, clean = merge_lines(base_data, our_data, their_data, labels)
+    return store.store(merged, "blob"), clean
+
+
+def _merge_entry(
+    store: ObjectStore,
+    path: str,
+    base: Optional[TreeEntry],
+    ours: Optional[TreeEntry],
+    theirs: Optional[TreeEntry],
+    labels: Tuple[str, str],
+    conflicts: List[str],
+) -> Optional[TreeEntry]:
+    """
+    Merge one name of a directory whose two sides differ.
+    """
+    if _hash(base) == _hash(theirs):
+        return ours
+    if _hash(base) == _hash(ours):
+        return theirs
+
+    base_kind = entry_kind(base, store) if base else None
+    our_kind = entry_kind(ours, store) if ours else None
+    their_kind = entry_kind(theirs, store) if theirs else None
+
+    if our_kind == their_kind == "tree":
+        tree_hash = _merge_tree(
+            store,
+            path + "/",
+            base.hash if base_kind == "tree" else None,
+            ours.hash,
+            theirs.hash,
+            labels,
+            conflicts,
+        )
+        return TreeEntry("tree", tree_hash) if tree_hash else None
+
+    if our_kind == their_kind == "blob":
+        blob_hash, clean = _merge_blobs(
+            store, base.hash if base_kind == "blob" else None, ours.hash, theirs.hash, labels
+        )
+        if not clean:
+            conflicts.append(path)
+        return TreeEntry("blob", blob_hash)
+
+    # Changed on one side and deleted on the other, or a file on one
+    # side and a directory on the other: keep what is there, ours first
+    conflicts.append(path)
+    return ours or theirs
+
+
+def _merge_tree(
+    store: ObjectStore,
+    prefix: str,
+    base: Optional[str],
+    ours: Optional[str],
+    theirs: Optional[str],
+    labels: Tuple[str, str],
+    conflicts: List[str],
+) -> Optional[str]:
+    if ours == theirs or base == theirs:
+        return ours
+    if base == ours:
+        return theirs
+
+    base_entries = _entries(store, base)
+    our_entries = _entries(store, ours)
+    merged: Dict[str, TreeEntry] = dict(our_entries.items())
+    for name, our_entry, their_entry in changed_entries(our_entries, _entries(store, theirs)):
+        entry = _merge_entry(
+            store, prefix + name, base_entries.get(name), our_entry, their_entry, labels, conflicts
+        )
+        if entry is None:
+            merged.pop(name, None)
+        else:
+            merged[name] = entry
+
+    if not merged:
+        return None
+    return Tree(merged).store(store)
+
+
+def merge_trees(
+    store: ObjectStore,
+    base: Optional[str],
+    ours: Optional[str],
+    theirs: Optional[str],
+    labels: Tuple[str, str] = ("ours", "theirs"),
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Three-way merge of two trees against their base. Returns the merged
+    tree (None if empty) and the conflicted paths, in path order. The
+    merged tree holds conflicted files with conflict markers.
+    """
+    conflicts: List[str] = []
+    with store.batch():
+        tree_hash = _merge_tree(store, "", base, ours, theirs, labels, conflicts)
+    return tree_hash, conflicts
+
+
+def _commit_tree(store: ObjectStore, commit_hash: Optional[str]) -> Optional[str]:
+    if not commit_hash:
+        return None
+    return Commit.read(store, commit_hash).tree
+
+
+def merge(
+    repo: Repository,
+    rev: str,
+    message: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> MergeResult:
+    """
+    Merge a branch or commit into the current branch: fast-forward when
+    HEAD is an ancestor of it, otherwise merge the trees and commit the
+    result with both commits as parents.
+
+    On conflicts, the working tree gets the merged files with conflict
+    markers, the index keeps the current versions of conflicted files,
+    and MERGE_HEAD records the merged commit: once the conflicts are
+    resolved and added, create_commit concludes the merge.
+    """
+    if repo.merge_head_file.exists():
+        raise MergeError("A merge is in progress; resolve it and commit first")
+
+    store = ObjectStore(repo)
+    ours = repo.head_commit()
+    theirs = resolve_commit(repo, rev)
+    our_tree = _commit_tree(store, ours)
+
+    index = Index(repo)
+    index_tree = write_index_tree(index, store) if index.entries else None
+    if index_tree != our_tree:
+        raise MergeError("You have staged changes; commit them before merging")
+
+    base = merge_base(repo, ours, theirs) if ours else None
+    if base == theirs:
+        return MergeResult("up-to-date", ours)
+
+    their_tree = _commit_tree(store, theirs)
+    if base == ours:
+        switch_tree(repo, store, our_tree, their_tree, workers)
+        update_ref(repo, repo.head_ref_path(), theirs, old=ours or "")
+        return MergeResult("fast-forward", theirs)
+
+    label = rev if rev != theirs else theirs[:7]
+    merged_tree, conflicts = merge_trees(
+        store, _commit_tree(store, base), our_tree, their_tree, ("HEAD", label)
+    )
+    switch_tree(repo, store, our_tree, merged_tree, workers)
+    atomic_write_bytes(repo.merge_head_file, theirs.encode("utf-8"), repo.durable)
+
+    try:
+        if conflicts:
+            # Conflicted files stay unstaged until resolved and added
+            updates: Dict[str, Optional[IndexEntry]] = {}
+            for path in conflicts:
+                our_blob = lookup_path(store, our_tree, path)
+                if lookup_path(store, merged_tree, path) != our_blob:
+                    updates[path] = IndexEntry(hash=our_blob) if our_blob else None
+            Index(repo).update_entries(updates)
+            return MergeResult("conflicts", None, conflicts)
+
+        if message is None:
+            kind = "branch" if (repo.heads_dir / rev).is_file() else "commit"
+            message = f"Merge {kind} '{rev}'"
+        return MergeResult("merged", create_commit(repo, message))
+    except BaseException:
+        # Otherwise the next commit, on any branch, would conclude it
+        repo.merge_head_file.unlink(missing_ok=True)
+        raise
+
+
+def merge_abort(repo: Repository, workers: Optional[int] = None) -> None:
+    """
+    Abandon a merge with conflicts: the paths the merge changed are
+    reset to HEAD in the working tree and the index, discarding any
+    resolution, and MERGE_HEAD is removed. Local changes to other paths
+    are kept.
+    """
+    try:
+        theirs = repo.merge_head_file.read_text().strip()
+    except FileNotFoundError:
+        raise MergeError("There is no merge to abort")
+
+    # The merged tree is not recorded; merging again gives it back
+    store = ObjectStore(repo)
+    ours = repo.head_commit()
+    our_tree = _commit_tree(store, ours)
+    base = merge_base(repo, ours, theirs) if ours else None
+    merged_tree, _ = merge_trees(
+        store, _commit_tree(store, base), our_tree, _commit_tree(store, theirs)
+    )
+    reset_tree(repo, store, merged_tree, our_tree, workers)
+    repo.merge_head_file.unlink()
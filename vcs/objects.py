@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import json
+import struct
 import time
+from collections.abc import ItemsView, Mapping, ValuesView
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
 
 from .storage import ObjectStore
 
@@ -14,16 +16,30 @@ class ObjectError(Exception):
 
 # ---------- Base helpers ----------
 
-def _encode(obj: dict) -> bytes:
+def _decode(data: bytes) -> dict:
+    return json.loads(data.decode("utf-8"))
+
+
+def _is_json(data: bytes) -> bool:
     """
-    Deterministic JSON encoding.
-    Sorted keys ensure stable hashes.
+    Objects written before the binary formats are JSON documents.
     """
-    return json.dumps(obj, sort_keys=True).encode("utf-8")
+    return data[:1] == b"{"
 
 
-def _decode(data: bytes) -> dict:
-    return json.loads(data.decode("utf-8"))
+# Binary formats start with a version byte, which can never be "{"
+FORMAT_VERSION = 1
+HASH_SIZE = 20
+
+
+def _read_cached(store: ObjectStore, kind: str, obj_hash: str, decode: Callable):
+    cache = store.repo.object_cache
+    obj = cache.get((kind, obj_hash))
+    if obj is None:
+        data = store.load(obj_hash, cache=False)
+        obj = decode(data)
+        cache.put((kind, obj_hash), obj, len(data))
+    return obj
 
 
 # ---------- Blob ----------
@@ -40,64 +56,295 @@ class Blob:
         return Blob(data=data)
 
     def store(self, store: ObjectStore) -> str:
-        return store.store(self.serialize())
+        return store.store(self.serialize(), "blob")
 
 
 # ---------- Tree ----------
 
+class TreeEntry(NamedTuple):
+    """
+    A single tree entry: object kind ("blob" or "tree") and hash.
+    kind is None for entries read from trees written before kinds were
+    recorded; use entry_kind() to resolve those.
+    A named tuple rather than a dataclass, as large trees create many.
+    """
+    kind: Optional[str]
+    hash: str
+
+    @staticmethod
+    def from_json(value: Union[str, dict]) -> "TreeEntry":
+        if isinstance(value, str):
+            return TreeEntry(kind=None, hash=value)
+        return TreeEntry(kind=value["kind"], hash=value["hash"])
+
+
+def entry_kind(entry: TreeEntry, store: ObjectStore) -> str:
+    """
+    Return the kind of a tree entry, falling back to the object header
+    for entries of legacy trees.
+    """
+    return entry.kind or store.type_of(entry.hash)
+
+
+# Tree format, version 1 (all integers big-endian):
+#   version (1 byte), entry count (4 bytes)
+#   offset of each entry from the start (4 bytes each)
+#   entries sorted by name bytes: kind (1 byte), name length (2 bytes),
+#   UTF-8 name, raw 20-byte hash
+_TREE_HEADER = struct.Struct(">BI")
+_OFFSET = struct.Struct(">I")
+_ENTRY = struct.Struct(">BH")
+_KIND_CODES = {None: 0, "blob": 1, "tree": 2}
+_KINDS = {code: kind for kind, code in _KIND_CODES.items()}
+
+
+def _encode_name(name: str) -> bytes:
+    return name.encode("utf-8", "surrogateescape")
+
+
+def _encode_tree(entries: Mapping) -> bytes:
+    items = sorted((_encode_name(name), entry) for name, entry in entries.items())
+    position = _TREE_HEADER.size + _OFFSET.size * len(items)
+    offsets = []
+    records = []
+    for raw_name, entry in items:
+        if len(raw_name) > 0xFFFF:
+            raise ObjectError(f"Tree entry name too long: {raw_name[:40]!r}...")
+        record = (
+            _ENTRY.pack(_KIND_CODES[entry.kind], len(raw_name))
+            + raw_name
+            + bytes.fromhex(entry.hash)
+        )
+        offsets.append(position)
+        position += len(record)
+        records.append(record)
+
+    header = _TREE_HEADER.pack(FORMAT_VERSION, len(items))
+    return header + struct.pack(f">{len(offsets)}I", *offsets) + b"".join(records)
+
+
+class TreeEntries(Mapping):
+    """
+    Read-only name -> TreeEntry mapping over an encoded tree. Nothing is
+    decoded up front: iteration walks the records in place, and lookups
+    by name binary-search the offset table.
+    """
+
+    __slots__ = ("data", "_count", "_start")
+
+    def __init__(self, data: bytes):
+        version, count = _TREE_HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ObjectError(f"Unsupported tree format version {version}")
+        self.data = data
+        self._count = count
+        self._start = _TREE_HEADER.size + _OFFSET.size * count
+
+    def _iter_records(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield (kind code, name start, name end) of each record; the hash
+        follows the name.
+        """
+        data = self.data
+        unpack = _ENTRY.unpack_from
+        position = self._start
+        for _ in range(self._count):
+            code, length = unpack(data, position)
+            start = position + _ENTRY.size
+            position = start + length + HASH_SIZE
+            yield code, start, start + length
+
+    def records(self) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Yield (name bytes, encoded record) pairs in name order. Equal
+        records mean equal entries, so two trees can be compared without
+        decoding their entries; see decode_record.
+        """
+        data = self.data
+        unpack = _ENTRY.unpack_from
+        position = self._start
+        for _ in range(self._count):
+            length = unpack(data, position)[1]
+            start = position + _ENTRY.size
+            end = start + length + HASH_SIZE
+            yield data[start:start + length], data[position:end]
+            position = end
+
+    @staticmethod
+    def decode_record(record: bytes) -> Tuple[str, TreeEntry]:
+        code, length = _ENTRY.unpack_from(record)
+        name = record[_ENTRY.size:_ENTRY.size + length]
+        return (
+            name.decode("utf-8", "surrogateescape"),
+            TreeEntry(_KINDS[code], record[_ENTRY.size + length:].hex()),
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        data = self.data
+        for _, start, end in self._iter_records():
+            yield data[start:end].decode("utf-8", "surrogateescape")
+
+    def __getitem__(self, name: str) -> TreeEntry:
+        data = self.data
+        key = _encode_name(name)
+        unpack = _ENTRY.unpack_from
+        offsets = memoryview(data)[_TREE_HEADER.size:self._start].cast("B")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = int.from_bytes(offsets[mid * 4:mid * 4 + 4], "big")
+            code, length = unpack(data, position)
+            start = position + _ENTRY.size
+            end = start + length
+            found = data[start:end]
+            if found == key:
+                return TreeEntry(_KINDS[code], data[end:end + HASH_SIZE].hex())
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        raise KeyError(name)
+
+    def items(self) -> ItemsView:
+        return _TreeItems(self)
+
+    def values(self) -> ValuesView:
+        return _TreeValues(self)
+
+    def __repr__(self) -> str:
+        return f"TreeEntries({dict(self.items())!r})"
+
+
+class _TreeItems(ItemsView):
+    def __iter__(self):
+        # The hot loop of tree walks, hence inlined
+        entries = self._mapping
+        data = entries.data
+        unpack = _ENTRY.unpack_from
+        make = tuple.__new__
+        position = entries._start
+        for _ in range(entries._count):
+            code, length = unpack(data, position)
+            start = position + _ENTRY.size
+            end = start + length
+            position = end + HASH_SIZE
+            yield (
+                data[start:end].decode("utf-8", "surrogateescape"),
+                make(TreeEntry, (_KINDS[code], data[end:position].hex())),
+            )
+
+
+class _TreeValues(ValuesView):
+    def __iter__(self):
+        data = self._mapping.data
+        for code, _, end in self._mapping._iter_records():
+            yield TreeEntry(_KINDS[code], data[end:end + HASH_SIZE].hex())
+
+
 @dataclass(frozen=True)
 class Tree:
     """
-    Maps name -> object hash (blob or subtree)
+    Maps name -> TreeEntry (blob or subtree).
+    Trees read from the store hold a TreeEntries view of their encoding,
+    or a dict for trees written in the old JSON format.
     """
-    entries: Dict[str, str]
+    entries: Mapping[str, TreeEntry]
 
     def serialize(self) -> bytes:
-        payload = {
-            "type": "tree",
-            "entries": self.entries,
-        }
-        return _encode(payload)
+        if isinstance(self.entries, TreeEntries):
+            return self.entries.data
+        return _encode_tree(self.entries)
 
     @staticmethod
     def deserialize(data: bytes) -> "Tree":
+        if not _is_json(data):
+            return Tree(entries=TreeEntries(data))
+
         payload = _decode(data)
         if payload.get("type") != "tree":
             raise ObjectError("Invalid tree object")
-        return Tree(entries=payload["entries"])
+        return Tree(
+            entries={
+                name: TreeEntry.from_json(value)
+                for name, value in payload["entries"].items()
+            }
+        )
 
     def store(self, store: ObjectStore) -> str:
-        return store.store(self.serialize())
+        return store.store(self.serialize(), "tree")
+
+    @staticmethod
+    def read(store: ObjectStore, tree_hash: str) -> "Tree":
+        """
+        Load and decode a tree through the repository object cache.
+        The returned tree is shared and must not be modified.
+        """
+        return _read_cached(store, "tree", tree_hash, Tree.deserialize)
 
 
 # ---------- Commit ----------
 
+# Commit format, version 1 (all integers big-endian):
+#   version (1 byte), raw tree hash, timestamp (8 bytes, signed),
+#   parent count (1 byte), raw parent hashes, UTF-8 message
+_COMMIT_HEADER = struct.Struct(">B20sqB")
+
+
 @dataclass(frozen=True)
 class Commit:
+    """
+    parents is empty for a root commit and has two entries for a merge,
+    the first being the branch merged into.
+    """
     tree: str
-    parent: Optional[str]
+    parents: Tuple[str, ...]
     message: str
     timestamp: int
 
+    @property
+    def parent(self) -> Optional[str]:
+        """
+        First parent, or None for a root commit.
+        """
+        return self.parents[0] if self.parents else None
+
     def serialize(self) -> bytes:
-        payload = {
-            "type": "commit",
-            "tree": self.tree,
-            "parent": self.parent,
-            "message": self.message,
-            "timestamp": self.timestamp,
-        }
-        return _encode(payload)
+        if len(self.parents) > 0xFF:
+            raise ObjectError("Too many commit parents")
+        return (
+            _COMMIT_HEADER.pack(
+                FORMAT_VERSION, bytes.fromhex(self.tree), self.timestamp, len(self.parents)
+            )
+            + b"".join(bytes.fromhex(p) for p in self.parents)
+            + self.message.encode("utf-8", "surrogateescape")
+        )
 
     @staticmethod
     def deserialize(data: bytes) -> "Commit":
+        if not _is_json(data):
+            version, tree, timestamp, count = _COMMIT_HEADER.unpack_from(data)
+            if version != FORMAT_VERSION:
+                raise ObjectError(f"Unsupported commit format version {version}")
+            start = _COMMIT_HEADER.size
+            end = start + HASH_SIZE * count
+            parents = tuple(data[i:i + HASH_SIZE].hex() for i in range(start, end, HASH_SIZE))
+            return Commit(
+                tree=tree.hex(),
+                parents=parents,
+                message=data[end:].decode("utf-8", "surrogateescape"),
+                timestamp=timestamp,
+            )
+
         payload = _decode(data)
         if payload.get("type") != "commit":
             raise ObjectError("Invalid commit object")
 
         return Commit(
             tree=payload["tree"],
-            parent=payload["parent"],
+            parents=(payload["parent"],) if payload["parent"] else (),
             message=payload["message"],
             timestamp=payload["timestamp"],
         )
@@ -106,14 +353,21 @@ class Commit:
     def create(
         tree_hash: str,
         message: str,
-        parent: Optional[str] = None,
+        parents: Sequence[str] = (),
     ) -> "Commit":
         return Commit(
             tree=tree_hash,
-            parent=parent,
+            parents=tuple(parents),
             message=message,
             timestamp=int(time.time()),
         )
 
     def store(self, store: ObjectStore) -> str:
-        return store.store(self.serialize())
\ No newline at end of file
+        return store.store(self.serialize(), "commit")
+
+    @staticmethod
+    def read(store: ObjectStore, commit_hash: str) -> "Commit":
+        """
+        Load and decode a commit through the repository object cache.
+        """
+        return _read_cached(store, "commit", commit_hash, Commit.deserialize)
\ No newline at end of file
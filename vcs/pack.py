@@ -0,0 +1,327 @@
+"""
+Pack files: many objects in one data file plus a sorted offset index.
+
+pack-<id>.pack
+    b"PVPK" | version u32 | count u32
+    entries, each stored like a loose object file (header + possibly
+    compressed payload), or as a delta: header with codec "delta",
+    then the 20-byte raw base hash and the zlib-compressed delta
+    SHA-1 of everything above; the pack is named after it
+
+pack-<id>.idx
+    b"PVIX" | version u32
+    fanout: 256 x u32, fanout[b] = number of hashes whose first byte <= b
+    hashes: count x 20-byte raw SHA-1, sorted
+    offsets: count x u64, entry offset in the pack
+    lengths: count x u64, entry length in the pack
+    20-byte checksum of the pack file
+
+The index is memory-mapped; lookups narrow the range with the fanout
+table and binary-search the hash table in place.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .utils import atomic_writer
+
+
+PACK_MAGIC = b"PVPK"
+INDEX_MAGIC = b"PVIX"
+PACK_VERSION = 1
+
+_PACK_HEADER = struct.Struct(">4sII")
+_INDEX_HEADER = struct.Struct(">4sI")
+_FANOUT = struct.Struct(">256I")
+_U64 = struct.Struct(">Q")
+
+HASH_SIZE = 20
+
+
+class PackError(Exception):
+    pass
+
+
+class PackIndex:
+    """
+    Read-only view of a .idx file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = _INDEX_HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC or version != PACK_VERSION:
+            raise PackError(f"Invalid pack index: {path}")
+
+        self._fanout = _FANOUT.unpack_from(self._map, _INDEX_HEADER.size)
+        self.count = self._fanout[255]
+        self._hashes_at = _INDEX_HEADER.size + _FANOUT.size
+        self._offsets_at = self._hashes_at + self.count * HASH_SIZE
+        self._lengths_at = self._offsets_at + self.count * 8
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def hash_at(self, pos: int) -> bytes:
+        start = self._hashes_at + pos * HASH_SIZE
+        return self._map[start:start + HASH_SIZE]
+
+    def find(self, raw_hash: bytes) -> Optional[int]:
+        """
+        Return the position of raw_hash in the index, or None.
+        """
+        first = raw_hash[0]
+        lo = self._fanout[first - 1] if first else 0
+        hi = self._fanout[first]
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self.hash_at(mid)
+            if current < raw_hash:
+                lo = mid + 1
+            elif current > raw_hash:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def with_prefix(self, hex_prefix: str) -> List[str]:
+        """
+        Return the hashes starting with hex_prefix (at least 2 characters).
+        """
+        first = int(hex_prefix[:2], 16)
+        lo = self._fanout[first - 1] if first else 0
+        hi = self._fanout[first]
+
+        # Lowest hash with the prefix, then scan while it still matches
+        low = bytes.fromhex(hex_prefix[:len(hex_prefix) // 2 * 2])
+        if len(hex_prefix) % 2:
+            low += bytes([int(hex_prefix[-1], 16) << 4])
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.hash_at(mid) < low:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        out = []
+        for pos in range(lo, self._fanout[first]):
+            current = self.hash_at(pos).hex()
+            if not current.startswith(hex_prefix):
+                break
+            out.append(current)
+        return out
+
+    def entry(self, pos: int) -> Tuple[int, int]:
+        """
+        Return (offset, length) of the entry at pos.
+        """
+        offset = _U64.unpack_from(self._map, self._offsets_at + pos * 8)[0]
+        length = _U64.unpack_from(self._map, self._lengths_at + pos * 8)[0]
+        return offset, length
+
+    def __iter__(self) -> Iterator[str]:
+        for pos in range(self.count):
+            yield self.hash_at(pos).hex()
+
+
+class _SliceReader:
+    """
+    Minimal file-like reader over a region of a memory map.
+    """
+
+    def __init__(self, buf, start: int, end: int):
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._pos = start
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            stop = self._end
+        else:
+            stop = min(self._pos + size, self._end)
+        data = self._buf[self._pos:stop]
+        self._pos = stop
+        return data
+
+    def seek(self, offset: int) -> None:
+        self._pos = self._start + offset
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Pack:
+    """
+    A pack data file together with its index.
+    """
+
+    def __init__(self, idx_path: Path):
+        self.index = PackIndex(idx_path)
+        self.path = idx_path.with_suffix(".pack")
+        with self.path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        self.index.close()
+        self._map.close()
+
+    def __contains__(self, obj_hash: str) -> bool:
+        return self.index.find(bytes.fromhex(obj_hash)) is not None
+
+    def open_entry(self, obj_hash: str) -> Optional[_SliceReader]:
+        """
+        Return a reader over the stored entry of obj_hash, or None.
+        """
+        pos = self.index.find(bytes.fromhex(obj_hash))
+        if pos is None:
+            return None
+        offset, length = self.index.entry(pos)
+        return _SliceReader(self._map, offset, offset + length)
+
+    def raw_entry(self, obj_hash: str) -> Optional[bytes]:
+        reader = self.open_entry(obj_hash)
+        return None if reader is None else reader.read()
+
+
+def load_packs(pack_dir: Path) -> List[Pack]:
+    """
+    Open every pack in pack_dir, newest first.
+    """
+    if not pack_dir.exists():
+        return []
+
+    idx_paths = sorted(
+        pack_dir.glob("pack-*.idx"),
+        key=lambda p: p.stat().st_mtime_ns,
+        reverse=True,
+    )
+    return [Pack(p) for p in idx_paths if p.with_suffix(".pack").exists()]
+
+
+def _copy_entry(src: BinaryIO, dst: BinaryIO) -> int:
+    length = 0
+    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+        dst.write(chunk)
+        length += len(chunk)
+    return length
+
+
+def write_pack(
+    pack_dir: Path,
+    entries: Iterable[Tuple[str, Union[bytes, BinaryIO]]],
+    durable: bool = False,
+) -> Optional[str]:
+    """
+    Write entries (hash, stored entry bytes) into a new pack and its index.
+    An entry may also be given as a readable file, which is copied in
+    chunks and closed. Entries are streamed to disk in the order given;
+    only the index is sorted. The pack is named after its checksum. With
+    durable=True both files are synced to disk before the index is
+    renamed into place.
+    Returns the pack name, or None when there is nothing to pack.
+    """
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=pack_dir, prefix=".pack-", suffix=".tmp")
+
+    located = {}
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0))
+            offset = _PACK_HEADER.size
+
+            for obj_hash, raw in entries:
+                raw_hash = bytes.fromhex(obj_hash)
+                if raw_hash in located:
+                    if not isinstance(raw, bytes):
+                        raw.close()
+                    continue
+                if isinstance(raw, bytes):
+                    f.write(raw)
+                    length = len(raw)
+                else:
+                    with raw:
+                        length = _copy_entry(raw, f)
+                located[raw_hash] = (offset, length)
+                offset += length
+
+            # Patch the object count, then checksum the whole file
+            f.seek(0)
+            f.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(located)))
+            f.flush()
+            checksum = _file_sha1(tmp_name)
+            f.seek(0, os.SEEK_END)
+            f.write(checksum)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+
+        if not located:
+            os.unlink(tmp_name)
+            return None
+
+        name = f"pack-{checksum.hex()}"
+        os.replace(tmp_name, pack_dir / f"{name}.pack")
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+    raw_hashes = sorted(located)
+    fanout = [0] * 256
+    for raw_hash in raw_hashes:
+        fanout[raw_hash[0]] += 1
+    for b in range(1, 256):
+        fanout[b] += fanout[b - 1]
+
+    # The index makes the pack visible, so it is written last.
+    with atomic_writer(pack_dir / f"{name}.idx", durable) as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, PACK_VERSION))
+        f.write(_FANOUT.pack(*fanout))
+        f.write(b"".join(raw_hashes))
+        f.write(struct.pack(f">{len(raw_hashes)}Q", *(located[h][0] for h in raw_hashes)))
+        f.write(struct.pack(f">{len(raw_hashes)}Q", *(located[h][1] for h in raw_hashes)))
+        f.write(checksum)
+
+    return name
+
+
+def _file_sha1(path) -> bytes:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def iter_loose_objects(objects_dir: Path) -> Iterator[Tuple[str, Path]]:
+    """
+    Yield (hash, path) for every loose object, in hash order.
+    """
+    if not objects_dir.exists():
+        return
+
+    for fan_dir in sorted(objects_dir.glob("??")):
+        if not fan_dir.is_dir():
+            continue
+        for name in sorted(os.listdir(fan_dir)):
+            if name.startswith("."):
+                continue  # in-flight temp file
+            yield fan_dir.name + name, fan_dir / name
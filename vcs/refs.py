@@ -1,7 +1,9 @@
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from .repo import Repository, RepositoryError
+from .storage import ObjectStore
+from .lock import LOCK_SUFFIX
 
 
 class RefError(Exception):
@@ -13,19 +15,52 @@ def list_branches(repo: Repository) -> List[str]:
     Return all branch names in the repository.
     """
     heads_dir = repo.heads_dir
-    return [p.name for p in heads_dir.iterdir() if p.is_file()]
+    return [
+        p.name for p in heads_dir.iterdir()
+        if p.is_file() and not p.name.startswith(".") and not p.name.endswith(LOCK_SUFFIX)
+    ]
+
+
+def _read_ref(ref_path: Path) -> Optional[str]:
+    try:
+        return ref_path.read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def update_ref(repo: Repository, ref_path: Path, value: str, old: Optional[str] = None) -> None:
+    """
+    Set a ref file (a branch or HEAD) under its lock. With old given,
+    this is a compare-and-swap: it fails unless the ref still holds old
+    ("" for a branch without commits), so a concurrent update is never
+    overwritten.
+    """
+    with repo.lock_file(ref_path) as lock:
+        if old is not None:
+            current = _read_ref(ref_path) or ""
+            if current != old:
+                raise RefError(
+                    f"{ref_path.name} was updated by another process "
+                    f"(expected '{old or '(none)'}', found '{current or '(none)'}')"
+                )
+        lock.write(value.encode("utf-8"))
+        lock.commit()
 
 
 def create_branch(repo: Repository, branch_name: str) -> None:
     """
     Create a new branch pointing to the current HEAD commit.
     """
-    ref_path = repo.heads_dir / branch_name
-    if ref_path.exists():
-        raise RefError(f"Branch '{branch_name}' already exists")
+    if branch_name.startswith(".") or branch_name.endswith(LOCK_SUFFIX):
+        raise RefError(f"Invalid branch name '{branch_name}'")
 
+    ref_path = repo.heads_dir / branch_name
     current_commit = repo.head_commit() or ""
-    ref_path.write_text(current_commit)
+    with repo.lock_file(ref_path) as lock:
+        if ref_path.exists():
+            raise RefError(f"Branch '{branch_name}' already exists")
+        lock.write(current_commit.encode("utf-8"))
+        lock.commit()
 
 
 def delete_branch(repo: Repository, branch_name: str) -> None:
@@ -36,10 +71,37 @@ def delete_branch(repo: Repository, branch_name: str) -> None:
         raise RefError("Cannot delete current branch")
 
     ref_path = repo.heads_dir / branch_name
-    if not ref_path.exists():
-        raise RefError(f"Branch '{branch_name}' does not exist")
+    with repo.lock_file(ref_path):
+        if not ref_path.exists():
+            raise RefError(f"Branch '{branch_name}' does not exist")
+        ref_path.unlink()
+
+
+def resolve_commit(repo: Repository, rev: str) -> str:
+    """
+    Resolve HEAD, a branch name, or a full or abbreviated commit hash
+    to a commit hash.
+    """
+    if rev == "HEAD":
+        commit_hash = repo.head_commit()
+        if not commit_hash:
+            raise RefError("HEAD does not point to a commit yet")
+        return commit_hash
+
+    ref_path = repo.heads_dir / rev
+    if ref_path.is_file():
+        commit_hash = ref_path.read_text().strip()
+        if not commit_hash:
+            raise RefError(f"Branch '{rev}' has no commits")
+        return commit_hash
 
-    ref_path.unlink()
+    store = ObjectStore(repo)
+    matches = [h for h in store.resolve_prefix(rev) if store.type_of(h) == "commit"]
+    if not matches:
+        raise RefError(f"Unknown revision '{rev}'")
+    if len(matches) > 1:
+        raise RefError(f"Ambiguous revision '{rev}'")
+    return matches[0]
 
 
 def checkout(repo: Repository, branch_name: str) -> None:
@@ -52,4 +114,4 @@ def checkout(repo: Repository, branch_name: str) -> None:
         raise RefError(f"Branch '{branch_name}' does not exist")
 
     # Update HEAD to point to the branch
-    repo.head_file.write_text(f"refs/heads/{branch_name}")
\ No newline at end of file
+    update_ref(repo, repo.head_file, f"refs/heads/{branch_name}")
\ No newline at end of file
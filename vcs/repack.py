@@ -0,0 +1,55 @@
+from typing import Dict, Set
+
+from .repo import Repository
+from .storage import ObjectStore, PackStats
+from .objects import Commit, Tree, entry_kind
+from .refs import list_branches
+
+
+def object_names(repo: Repository, store: ObjectStore) -> Dict[str, str]:
+    """
+    Map every blob reachable from a branch to the first path it was
+    committed under. Used to group versions of a file for delta packing.
+    """
+    names: Dict[str, str] = {}
+    seen_trees: Set[str] = set()
+    seen_commits: Set[str] = set()
+
+    def walk_tree(tree_hash: str, base: str) -> None:
+        if tree_hash in seen_trees:
+            return
+        seen_trees.add(tree_hash)
+
+        tree = Tree.read(store, tree_hash)
+        for name, entry in tree.entries.items():
+            path = f"{base}{name}"
+            if entry_kind(entry, store) == "tree":
+                walk_tree(entry.hash, f"{path}/")
+            else:
+                names.setdefault(entry.hash, path)
+
+    for branch in sorted(list_branches(repo)):
+        pending = [(repo.heads_dir / branch).read_text().strip()]
+        while pending:
+            commit_hash = pending.pop()
+            if not commit_hash or commit_hash in seen_commits:
+                continue
+            seen_commits.add(commit_hash)
+            commit = Commit.read(store, commit_hash)
+            walk_tree(commit.tree, "")
+            # First parents last, so they are walked first
+            pending.extend(reversed(commit.parents))
+
+    return names
+
+
+def repack(repo: Repository, full: bool = False) -> PackStats:
+    """
+    Pack loose objects (all objects with full=True), delta-compressing
+    successive versions of the same path.
+    """
+    store = ObjectStore(repo)
+    try:
+        return store.repack(full=full, names=object_names(repo, store))
+    finally:
+        store.close()
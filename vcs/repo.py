@@ -1,5 +1,10 @@
+import json
 from pathlib import Path
 
+from .config import Config, DEFAULTS
+from .lock import LockFile
+from .cache import ObjectCache
+
 
 PYVCS_DIR = ".pyvcs"
 OBJECTS_DIR = "objects"
@@ -7,6 +12,9 @@ REFS_DIR = "refs"
 HEADS_DIR = "heads"
 HEAD_FILE = "HEAD"
 INDEX_FILE = "index"
+CONFIG_FILE = "config"
+# Commit being merged while a merge with conflicts is in progress
+MERGE_HEAD_FILE = "MERGE_HEAD"
 
 
 class RepositoryError(Exception):
@@ -22,6 +30,42 @@ class Repository:
         self.heads_dir = self.refs_dir / HEADS_DIR
         self.head_file = self.vcs_dir / HEAD_FILE
         self.index_file = self.vcs_dir / INDEX_FILE
+        self.config_file = self.vcs_dir / CONFIG_FILE
+        self.merge_head_file = self.vcs_dir / MERGE_HEAD_FILE
+        self._config = None
+        self._object_cache = None
+
+    @property
+    def config(self) -> Config:
+        """
+        Repository configuration, loaded on first access.
+        """
+        if self._config is None:
+            self._config = Config(self)
+        return self._config
+
+    @property
+    def object_cache(self) -> ObjectCache:
+        """
+        Objects read through any ObjectStore of this repository, created
+        on first access and sized by core.object_cache_bytes.
+        """
+        if self._object_cache is None:
+            self._object_cache = ObjectCache(int(self.config.get("core.object_cache_bytes")))
+        return self._object_cache
+
+    @property
+    def durable(self) -> bool:
+        """
+        Whether index and ref updates are synced to disk.
+        """
+        return self.config.get("core.durability") != "none"
+
+    def lock_file(self, path: Path) -> LockFile:
+        """
+        Lock for the index or a ref, waiting up to core.lock_timeout.
+        """
+        return LockFile(path, float(self.config.get("core.lock_timeout")), self.durable)
 
     @staticmethod
     def find(start: Path | None = None) -> "Repository":
@@ -74,6 +118,10 @@ class Repository:
         index_file = vcs_dir / INDEX_FILE
         index_file.write_text("")
 
+        # Write default configuration
+        config_file = vcs_dir / CONFIG_FILE
+        config_file.write_text(json.dumps(DEFAULTS, sort_keys=True, indent=2))
+
         return Repository(path)
 
     def current_branch(self) -> str:
@@ -1,79 +1,133 @@
-from pathlib import Path
+import heapq
+import itertools
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .repo import Repository
 from .storage import ObjectStore
-from .index import Index
-from .objects import Blob, Commit, Tree
-from .diff import diff_working_vs_index
+from .index import Index, IndexEntry
+from .ignore import IGNORE_FILE, IgnoreMatcher
+from . import fsmonitor
+from .objects import Commit
+from .trees import flatten_tree
+from .worktree import iter_files
+from .utils import lstat_or_none
 
 
 class Status:
     def __init__(self):
-        self.staged: list[Path] = []
-        self.modified: list[Path] = []
-        self.untracked: list[Path] = []
+        self.staged: list[str] = []
+        self.modified: list[str] = []
+        self.untracked: list[str] = []
 
 
-def _load_commit_tree(repo: Repository) -> dict[Path, str]:
-    """
-    Load HEAD commit tree into a flat mapping:
-    Path -> blob hash
-    """
+def _head_tree(repo: Repository, store: ObjectStore) -> Optional[str]:
     commit_hash = repo.head_commit()
     if not commit_hash:
-        return {}
+        return None
+    return Commit.read(store, commit_hash).tree
 
-    store = ObjectStore(repo)
-    commit_data = store.load(commit_hash)
-    commit = Commit.deserialize(commit_data)
-
-    def walk_tree(tree_hash: str, base: Path, out: dict):
-        tree_data = store.load(tree_hash)
-        tree = Tree.deserialize(tree_data)
-        for name, obj_hash in tree.entries.items():
-            path = base / name
-            obj_data = store.load(obj_hash)
-            try:
-                subtree = Tree.deserialize(obj_data)
-                walk_tree(obj_hash, path, out)
-            except Exception:
-                out[path] = obj_hash
-
-    result = {}
-    walk_tree(commit.tree, Path("."), result)
-    return result
+
+def _merge_join(*listings: Iterable[Tuple[str, object]]) -> Iterator[Tuple[str, List[object]]]:
+    """
+    Join listings sorted by path: yield (path, [value from each listing
+    or None]) in path order.
+    """
+    def tag(n, listing):
+        for path, value in listing:
+            yield path, n, value
+
+    tagged = [tag(n, listing) for n, listing in enumerate(listings)]
+    merged = heapq.merge(*tagged, key=lambda item: (item[0], item[1]))
+    for path, group in itertools.groupby(merged, key=lambda item: item[0]):
+        values: List[object] = [None] * len(listings)
+        for _, n, value in group:
+            values[n] = value
+        yield path, values
+
+
+def _is_modified(
+    repo: Repository,
+    store: ObjectStore,
+    index: Index,
+    rel_path: str,
+    entry: IndexEntry,
+    st: os.stat_result,
+    verified: Dict[str, os.stat_result],
+) -> bool:
+    """
+    Return True if the working file differs from its staged blob,
+    trusting the stat cache and hashing only files that may have changed.
+    """
+    if index.stat_unchanged(rel_path, st):
+        return False
+    if store.hash_file(repo.root / rel_path) != entry.hash:
+        return True
+    verified[rel_path] = st  # touched but not changed
+    return False
 
 
 def get_status(repo: Repository) -> Status:
+    """
+    Compare HEAD, the index and the working tree in a single pass.
+    The working tree is walked once, in path order, and merge-joined
+    with the sorted index and HEAD listings. Ignored directories are not
+    entered and ignored files are not reported as untracked.
+    """
     store = ObjectStore(repo)
     index = Index(repo)
     status = Status()
 
-    head_files = _load_commit_tree(repo)
-    index_files = index.entries
-
-    # ---- Staged changes (index vs HEAD)
-    for path, blob_hash in index_files.items():
-        if path not in head_files:
-            status.staged.append(path)
-        elif head_files[path] != blob_hash:
+    # When the cache-tree root is the HEAD tree, nothing is staged and
+    # HEAD does not need to be read.
+    head_tree = _head_tree(repo, store)
+    compare_head = head_tree is None or index.cache_tree.get("") != head_tree
+    head_files = flatten_tree(store, head_tree) if compare_head else {}
+
+    ignore = IgnoreMatcher(repo.root)
+    staged = sorted(index.entries.items())
+    head = sorted(head_files.items())
+    index_paths = [path for path, _ in staged]
+
+    # With a filesystem monitor running, only paths it reported (plus
+    # those not clean last time) are examined; anything else is clean.
+    monitor = fsmonitor.query(repo, index_paths)
+    examined = None
+    if monitor is not None and monitor.paths is not None and not any(
+        path.rpartition("/")[2] == IGNORE_FILE for path in monitor.paths
+    ):
+        examined = fsmonitor.expand_paths(repo.root, monitor.paths, index_paths, ignore.prune)
+        working = sorted((path, st) for path, st in examined.items() if st is not None)
+    else:
+        working = (
+            (rel_path, entry.stat(follow_symlinks=False))
+            for rel_path, entry in iter_files(repo.root, prune=ignore.prune)
+        )
+
+    verified: Dict[str, os.stat_result] = {}
+    for path, (st, entry, head_hash) in _merge_join(working, staged, head):
+        if compare_head and (entry.hash if entry else None) != head_hash:
             status.staged.append(path)
 
-    # ---- Modified but not staged (working vs index)
-    diffs = diff_working_vs_index(repo)
-    for d in diffs:
-        status.modified.append(d.path)
-
-    # ---- Untracked files
-    tracked = set(index_files.keys())
-    for path in repo.root.rglob("*"):
-        if not path.is_file():
-            continue
-        if ".pyvcs" in path.parts:
+        if entry is None:
+            if st is None:
+                continue
+            # Reported paths may lie inside ignored directories
+            if not (ignore.is_ignored(path) if examined is not None else ignore.match(path, False)):
+                status.untracked.append(path)
             continue
 
-        rel = path.relative_to(repo.root)
-        if rel not in tracked:
-            status.untracked.append(rel)
-
-    return status
\ No newline at end of file
+        if st is None:
+            if examined is not None and path not in examined:
+                continue  # no events: unchanged
+            # Tracked files inside ignored directories are not walked
+            st = lstat_or_none(repo.root / path)
+        if st is None or _is_modified(repo, store, index, path, entry, st, verified):
+            status.modified.append(path)
+
+    index.refresh(verified)
+    if monitor is not None:
+        fsmonitor.save_token(
+            repo, monitor.token, status.modified + status.untracked, index_paths
+        )
+    return status
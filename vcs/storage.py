@@ -1,62 +1,853 @@
 import hashlib
+import io
+import os
+import json
+import stat
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from .repo import Repository
+from .utils import DURABILITY_MODES, atomic_write_bytes, fsync_dir
+from .pack import Pack, iter_loose_objects, load_packs, write_pack
+from .delta import apply_delta, create_delta, index_base
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+OBJECT_TYPES = ("blob", "tree", "commit")
+CODECS = ("none", "zlib", "zstd")
+# Codecs valid in stored entries; deltas only ever appear inside packs.
+ENTRY_CODECS = CODECS + ("delta",)
+
+# Longest possible header is well below this; used to read headers only.
+HEADER_PEEK = 128
+READ_CHUNK = 64 * 1024
+# Upper bound on decompressed bytes produced per step while streaming
+OUTPUT_CHUNK = 1024 * 1024
+# Streamed content up to this size is buffered and stored in one piece
+STREAM_THRESHOLD = 4 * 1024 * 1024
+PACK_DIR = "pack"
+# Objects are written to <objects dir>/.object.<random>.tmp, then renamed
+TEMP_PREFIX = ".object."
+# Threads syncing batched objects; concurrent fsyncs let the filesystem
+# commit many files in one journal transaction
+SYNC_WORKERS = 16
+DELTA_BASE_CACHE_BYTES = 32 * 1024 * 1024
+# Blobs up to this size are kept in the repository object cache
+CACHED_BLOB_SIZE = 16 * 1024
 
 
 class StorageError(Exception):
     pass
 
 
+def _encode_header(obj_type: str, size: int, codec: str = "none") -> bytes:
+    """
+    Build the header stored in front of every object:
+    b"<type> <size>\\0" for raw payloads, b"<type> <size> <codec>\\0" for
+    compressed ones. size is always the uncompressed payload size.
+    """
+    if codec == "none":
+        return f"{obj_type} {size}".encode("ascii") + b"\0"
+    return f"{obj_type} {size} {codec}".encode("ascii") + b"\0"
+
+
+def _parse_header(raw: bytes) -> Optional[Tuple[str, int, str, int]]:
+    """
+    Parse an object header.
+    Returns (type, size, codec, header_length) or None for legacy
+    headerless objects.
+    """
+    end = raw.find(b"\0", 0, HEADER_PEEK)
+    if end == -1:
+        return None
+
+    fields = raw[:end].split(b" ")
+    if len(fields) not in (2, 3):
+        return None
+
+    obj_type = fields[0].decode("ascii", errors="replace")
+    if obj_type not in OBJECT_TYPES or not fields[1].isdigit():
+        return None
+
+    codec = fields[2].decode("ascii", errors="replace") if len(fields) == 3 else "none"
+    if codec not in ENTRY_CODECS:
+        return None
+
+    return obj_type, int(fields[1]), codec, end + 1
+
+
+def _sniff_legacy_type(data: bytes) -> str:
+    """
+    Guess the type of an object written before headers existed.
+    Trees and commits were JSON documents carrying a "type" field.
+    """
+    if data[:1] != b"{":
+        return "blob"
+    try:
+        payload = json.loads(data.decode("utf-8"))
+    except ValueError:
+        return "blob"
+    if isinstance(payload, dict) and payload.get("type") in ("tree", "commit"):
+        return payload["type"]
+    return "blob"
+
+
+def _compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise StorageError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return data
+
+
+class _Passthrough:
+    """
+    Compressor and decompressor interface for uncompressed payloads.
+    """
+
+    def compress(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def decompress(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _compressor(codec: str, level: int):
+    if codec == "zlib":
+        return zlib.compressobj(level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise StorageError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return _Passthrough()
+
+
+def _decompressor(codec: str):
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "zstd":
+        if zstandard is None:
+            raise StorageError("Reading zstd objects requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return _Passthrough()
+
+
+def _read_chunks(f, codec: str, head: bytes) -> Iterator[bytes]:
+    """
+    Yield the decompressed payload of an open object file chunk by chunk,
+    closing the file when done. head holds payload bytes that were read
+    together with the header.
+    """
+    with f:
+        decompressor = _decompressor(codec)
+        bounded = hasattr(decompressor, "unconsumed_tail")
+        chunk = head
+        while chunk:
+            if bounded:
+                # Cap output per step so highly compressible data
+                # cannot expand into one huge buffer
+                out = decompressor.decompress(chunk, OUTPUT_CHUNK)
+                while out:
+                    yield out
+                    out = decompressor.decompress(decompressor.unconsumed_tail, OUTPUT_CHUNK)
+            else:
+                out = decompressor.decompress(chunk)
+                if out:
+                    yield out
+            chunk = f.read(READ_CHUNK)
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def _unlink_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except PermissionError:
+        pass  # written by another user: it cannot be freshened
+
+
+def _checked_chunks(obj_hash: str, size: int, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        yield chunk
+
+    if size >= 0 and total != size:
+        raise StorageError(f"Object {obj_hash} is corrupt")
+
+
+class _ChunkReader(io.RawIOBase):
+    """
+    Read-only file object over an iterator of chunks.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, b"")
+            if not self._pending:
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._chunks.close()  # closes the underlying object file
+        super().close()
+
+
+def _stream_size(fileobj: BinaryIO) -> Optional[int]:
+    """
+    Bytes left in a regular file from its current position, or None if
+    that cannot be known up front.
+    """
+    try:
+        st = os.fstat(fileobj.fileno())
+        position = fileobj.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return max(st.st_size - position, 0)
+
+
+@dataclass
+class PackStats:
+    name: Optional[str]
+    objects: int
+    deltas: int
+
+
 class ObjectStore:
     def __init__(self, repo: Repository):
         self.repo = repo
         self.objects_dir = repo.objects_dir
+        self.pack_dir = self.objects_dir / PACK_DIR
+        self._packs: Optional[List[Pack]] = None
+        self._delta_bases: "OrderedDict[str, bytes]" = OrderedDict()
+        self._delta_base_bytes = 0
+        self._lock = threading.Lock()
+        self.compression = repo.config.get("core.compression")
+        self.compression_level = int(repo.config.get("core.compression_level"))
+        self.durability = repo.config.get("core.durability")
+        # Objects written in a batch, as temp files awaiting flush()
+        self._pending: Dict[str, str] = {}
+        self._batch_depth = 0
+        # Packs whose mtime _freshen already set
+        self._freshened: Set[Path] = set()
 
-    def _hash_object(self, data: bytes) -> str:
+        if self.compression not in CODECS:
+            raise StorageError(f"Unknown compression codec: {self.compression}")
+        if self.durability not in DURABILITY_MODES:
+            raise StorageError(f"Unknown durability mode: {self.durability}")
+
+    def hash_object(self, data: bytes) -> str:
         """
         Compute SHA-1 hash of the object data.
+        The header is not part of the hash, so object ids are stable across
+        storage format upgrades.
         """
         h = hashlib.sha1()
         h.update(data)
         return h.hexdigest()
 
+    def hash_file(self, path: Path) -> str:
+        """
+        Compute the hash a file would be stored under, reading it in
+        chunks.
+        """
+        h = hashlib.sha1()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
     def _object_path(self, obj_hash: str) -> Path:
         """
         Return the filesystem path for a given object hash.
         """
         return self.objects_dir / obj_hash[:2] / obj_hash[2:]
 
-    def store(self, data: bytes) -> str:
+    @property
+    def packs(self) -> List[Pack]:
+        packs = self._packs
+        if packs is None:
+            with self._lock:
+                if self._packs is None:
+                    self._packs = load_packs(self.pack_dir)
+                packs = self._packs
+        return packs
+
+    def _reload_packs(self) -> None:
+        for pack in self._packs or []:
+            pack.close()
+        self._packs = None
+
+    def close(self) -> None:
+        """
+        Release memory maps held for pack files.
+        """
+        self._reload_packs()
+
+    def _open_packed(self, obj_hash: str):
+        for pack in self.packs:
+            reader = pack.open_entry(obj_hash)
+            if reader is not None:
+                return reader
+        return None
+
+    def _open(self, obj_hash: str):
+        """
+        Open the stored entry of an object; packs are checked first.
+        """
+        pending = self._pending.get(obj_hash)
+        if pending is not None:
+            return open(pending, "rb")
+
+        reader = self._open_packed(obj_hash)
+        if reader is not None:
+            return reader
+
+        try:
+            return self._object_path(obj_hash).open("rb")
+        except FileNotFoundError:
+            pass
+
+        # A concurrent repack may have moved the object into a new pack.
+        self._reload_packs()
+        reader = self._open_packed(obj_hash)
+        if reader is not None:
+            return reader
+        raise StorageError(f"Object {obj_hash} not found")
+
+    def _iter_object(self, obj_hash: str) -> Tuple[str, int, Iterator[bytes]]:
+        """
+        Open an object and return (type, size, chunks), where chunks yields
+        the decompressed payload piece by piece. size is -1 for legacy
+        objects.
+        """
+        f = self._open(obj_hash)
+        head = f.read(HEADER_PEEK)
+        header = _parse_header(head)
+
+        if header is None:
+            obj_type = "blob"
+            if head[:1] == b"{":
+                obj_type = _sniff_legacy_type(head + f.read())
+                f.seek(len(head))
+            return obj_type, -1, _read_chunks(f, "none", head)
+
+        obj_type, size, codec, offset = header
+        if codec == "delta":
+            with f:
+                payload = head[offset:] + f.read()
+            return obj_type, size, iter([self._resolve_delta(payload)])
+        return obj_type, size, _read_chunks(f, codec, head[offset:])
+
+    def _resolve_delta(self, payload: bytes) -> bytes:
+        """
+        Rebuild an object from a delta entry payload: raw base hash
+        followed by the compressed delta. Recently used bases are cached,
+        which makes walking a delta chain in order cheap.
+        """
+        base_hash = payload[:20].hex()
+        with self._lock:
+            base = self._delta_bases.get(base_hash)
+            if base is not None:
+                self._delta_bases.move_to_end(base_hash)
+        if base is None:
+            base = self.load(base_hash)
+
+        data = apply_delta(base, zlib.decompress(payload[20:]))
+        self._remember_delta_base(base_hash, base)
+        return data
+
+    def _remember_delta_base(self, obj_hash: str, data: bytes) -> None:
+        if len(data) > DELTA_BASE_CACHE_BYTES // 4:
+            return
+        with self._lock:
+            if obj_hash in self._delta_bases:
+                return
+            self._delta_bases[obj_hash] = data
+            self._delta_base_bytes += len(data)
+            while self._delta_base_bytes > DELTA_BASE_CACHE_BYTES:
+                _, evicted = self._delta_bases.popitem(last=False)
+                self._delta_base_bytes -= len(evicted)
+
+    def store(self, data: bytes, obj_type: str = "blob") -> str:
         """
         Store raw object data and return its hash.
         Objects are immutable and content-addressed.
+        Safe to call concurrently: each writer renames its own temp file
+        into place, and identical content yields an identical file.
         """
-        obj_hash = self._hash_object(data)
-        obj_path = self._object_path(obj_hash)
+        if obj_type not in OBJECT_TYPES:
+            raise StorageError(f"Unknown object type: {obj_type}")
+
+        obj_hash = self.hash_object(data)
 
-        if obj_path.exists():
+        if self._freshen(obj_hash):
             return obj_hash  # already stored
 
-        obj_path.parent.mkdir(parents=True, exist_ok=True)
-        obj_path.write_bytes(data)
+        payload = _compress(data, self.compression, self.compression_level)
+        header = _encode_header(obj_type, len(data), self.compression)
+
+        fd, tmp_name = self._temp_file()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + payload)
+                self._sync_written(f)
+            self._publish(tmp_name, obj_hash)
+        except BaseException:
+            _unlink_quietly(tmp_name)
+            raise
 
         return obj_hash
 
-    def load(self, obj_hash: str) -> bytes:
+    def _temp_file(self) -> Tuple[int, str]:
+        return tempfile.mkstemp(dir=self.objects_dir, prefix=TEMP_PREFIX, suffix=".tmp")
+
+    def _sync_written(self, f) -> None:
         """
-        Load raw object data by hash.
+        Sync a new object file now, unless its sync is left to the end
+        of the current batch (or to nobody).
+        """
+        if self.durability == "full" or (self.durability == "batch" and not self._batch_depth):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _publish(self, tmp_name: str, obj_hash: str) -> None:
+        """
+        Move a completely written temp file into place as obj_hash.
+        In a batch with batch durability the rename waits for flush(), so
+        no object becomes visible before its content is on disk.
         """
+        if self._freshen(obj_hash):
+            os.unlink(tmp_name)
+            return
+        if self._batch_depth and self.durability == "batch":
+            with self._lock:
+                if obj_hash in self._pending:
+                    os.unlink(tmp_name)  # stored by another thread meanwhile
+                else:
+                    self._pending[obj_hash] = tmp_name
+            return
+
         obj_path = self._object_path(obj_hash)
+        new_dir = not obj_path.parent.is_dir()
+        obj_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, obj_path)
+        if self.durability != "none":
+            fsync_dir(obj_path.parent)
+            if new_dir:
+                fsync_dir(self.objects_dir)
+
+    @contextmanager
+    def batch(self) -> Iterator["ObjectStore"]:
+        """
+        Group object writes of a bulk operation. With batch durability
+        they are synced together when the outermost batch exits, instead
+        of one at a time; until then they are readable through this
+        store only. Callers must leave the batch before writing anything
+        that refers to the new objects, such as the index or a ref.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Sync and publish objects written in a batch: all temp files are
+        synced, then renamed into place, then each directory is synced
+        once.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        def sync(name: str) -> None:
+            fd = os.open(name, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        with ThreadPoolExecutor(max_workers=min(SYNC_WORKERS, len(pending))) as pool:
+            list(pool.map(sync, pending.values()))
+
+        dirs = set()
+        for obj_hash, tmp_name in pending.items():
+            obj_path = self._object_path(obj_hash)
+            if obj_path.parent not in dirs:
+                obj_path.parent.mkdir(parents=True, exist_ok=True)
+                dirs.add(obj_path.parent)
+            os.replace(tmp_name, obj_path)
+        for directory in dirs:
+            fsync_dir(directory)
+        fsync_dir(self.objects_dir)
+
+    def store_stream(self, fileobj: BinaryIO, obj_type: str = "blob", size: Optional[int] = None) -> str:
+        """
+        Store the rest of a binary file object and return its hash, in
+        constant memory: content is hashed and compressed while it is
+        copied to a temp file, which is then renamed into place.
+        size is the number of bytes to expect; for regular files it is
+        taken from fstat, otherwise the stream is spooled to a temp file
+        first because the object header needs it.
+        """
+        if obj_type not in OBJECT_TYPES:
+            raise StorageError(f"Unknown object type: {obj_type}")
+
+        if size is None:
+            size = _stream_size(fileobj)
+        if size is None:
+            with tempfile.TemporaryFile(dir=self.objects_dir) as spool:
+                size = 0
+                for chunk in iter(lambda: fileobj.read(READ_CHUNK), b""):
+                    spool.write(chunk)
+                    size += len(chunk)
+                spool.seek(0)
+                return self.store_stream(spool, obj_type, size)
+
+        if size <= STREAM_THRESHOLD:
+            data = fileobj.read(size + 1)
+            if len(data) != size:
+                raise StorageError("Content changed while being stored")
+            return self.store(data, obj_type)
+
+        h = hashlib.sha1()
+        compressor = _compressor(self.compression, self.compression_level)
+        fd, tmp_name = self._temp_file()
+        try:
+            copied = 0
+            with os.fdopen(fd, "wb") as out:
+                out.write(_encode_header(obj_type, size, self.compression))
+                for chunk in iter(lambda: fileobj.read(READ_CHUNK), b""):
+                    copied += len(chunk)
+                    h.update(chunk)
+                    out.write(compressor.compress(chunk))
+                out.write(compressor.flush())
+                if copied == size:
+                    self._sync_written(out)
+            if copied != size:
+                raise StorageError("Content changed while being stored")
+
+            obj_hash = h.hexdigest()
+            self._publish(tmp_name, obj_hash)
+            return obj_hash
+        except BaseException:
+            _unlink_quietly(tmp_name)
+            raise
+
+    def open_object(self, obj_hash: str) -> BinaryIO:
+        """
+        Open an object for reading as a file object, decompressing it as
+        it is read. Use as a context manager to release the object file.
+        """
+        return io.BufferedReader(_ChunkReader(self.iter_chunks(obj_hash)), READ_CHUNK)
+
+    def iter_chunks(self, obj_hash: str) -> Iterator[bytes]:
+        """
+        Yield the data of an object in bounded chunks, so large blobs can
+        be copied without holding them in memory. Delta entries are
+        resolved in memory and yielded at once.
+        """
+        _, size, chunks = self._iter_object(obj_hash)
+        return _checked_chunks(obj_hash, size, chunks)
+
+    def load(self, obj_hash: str, cache: bool = True) -> bytes:
+        """
+        Load raw object data by hash.
+        """
+        return self.load_typed(obj_hash, cache)[1]
+
+    def load_typed(self, obj_hash: str, cache: bool = True) -> Tuple[str, bytes]:
+        """
+        Load an object and return (type, data).
+        Compressed payloads are decompressed as they are read. With
+        cache, small blobs are looked up in and added to the repository
+        object cache; callers that cache the decoded object pass False.
+        """
+        object_cache = self.repo.object_cache if cache else None
+        if object_cache is not None:
+            data = object_cache.get(("blob", obj_hash))
+            if data is not None:
+                return "blob", data
+
+        obj_type, size, chunks = self._iter_object(obj_hash)
+        data = b"".join(chunks)
+
+        if size >= 0 and len(data) != size:
+            raise StorageError(f"Object {obj_hash} is corrupt")
+        if object_cache is not None and obj_type == "blob" and len(data) <= CACHED_BLOB_SIZE:
+            object_cache.put(("blob", obj_hash), data, len(data))
+        return obj_type, data
+
+    def type_of(self, obj_hash: str) -> str:
+        """
+        Return the type of an object, reading only its header.
+        """
+        return self._read_header(obj_hash)[0]
+
+    def size_of(self, obj_hash: str) -> int:
+        """
+        Return the payload size of an object, reading only its header.
+        """
+        return self._read_header(obj_hash)[1]
 
-        if not obj_path.exists():
-            raise StorageError(f"Object {obj_hash} not found")
+    def resolve_prefix(self, prefix: str) -> List[str]:
+        """
+        Return the hashes of all objects starting with a hex prefix of
+        at least 4 characters, loose and packed.
+        """
+        prefix = prefix.lower()
+        if len(prefix) < 4 or any(c not in "0123456789abcdef" for c in prefix):
+            return []
+
+        found = set()
+        fan_dir = self.objects_dir / prefix[:2]
+        if fan_dir.is_dir():
+            found.update(
+                prefix[:2] + name for name in os.listdir(fan_dir)
+                if name.startswith(prefix[2:]) and not name.startswith(".")
+            )
+        for pack in self.packs:
+            found.update(pack.index.with_prefix(prefix))
+        return sorted(found)
+
+    def _read_header(self, obj_hash: str) -> Tuple[str, int]:
+        """
+        Return (type, size) of an object from its header.
+        """
+        with self._open(obj_hash) as f:
+            head = f.read(HEADER_PEEK)
+            header = _parse_header(head)
+            if header is not None:
+                return header[0], header[1]
+
+            # Legacy object: the whole payload is needed to tell trees from blobs.
+            data = head + f.read()
+            return _sniff_legacy_type(data), len(data)
+
+    def _stored_entry(self, obj_hash: str) -> bytes:
+        """
+        Return the bytes of an object as stored, without decoding them.
+        """
+        with self._open(obj_hash) as f:
+            return f.read()
 
-        return obj_path.read_bytes()
+    def _freshen(self, obj_hash: str) -> bool:
+        """
+        Return True if an object is already stored, after setting the
+        mtime of its file or pack to now. gc keeps unreachable objects
+        younger than gc.prune_expire, so an object about to be referenced
+        again is not pruned meanwhile.
+        """
+        if obj_hash in self._pending:
+            return True
+        for pack in self.packs:
+            if obj_hash in pack:
+                if pack.path not in self._freshened:
+                    self._freshened.add(pack.path)
+                    _touch(pack.path)
+                return True
+        try:
+            _touch(self._object_path(obj_hash))
+        except FileNotFoundError:
+            return False
+        return True
 
     def exists(self, obj_hash: str) -> bool:
         """
-        Check if an object exists.
+        Check if an object exists, packed or loose.
+        """
+        if obj_hash in self._pending:
+            return True
+        if any(obj_hash in pack for pack in self.packs):
+            return True
+        return self._object_path(obj_hash).exists()
+
+    def repack(
+        self,
+        full: bool = False,
+        names: Optional[Dict[str, str]] = None,
+        window: Optional[int] = None,
+        depth: Optional[int] = None,
+    ) -> PackStats:
+        """
+        Move loose objects (and with full=True, all packed objects too)
+        into a new pack.
+
+        Blobs are sorted by path name and size, so successive versions of
+        a file end up next to each other, and each one is delta-encoded
+        against the best of the previous `window` blobs when that saves at
+        least half its size. Chains are limited to `depth` deltas.
+        Blobs larger than core.big_file_threshold are not delta-encoded
+        but copied into the pack in chunks, so memory stays bounded by
+        the window of small blobs.
+        names maps blob hashes to the path they were committed under.
+        """
+        names = names or {}
+        window = int(self.repo.config.get("pack.window") if window is None else window)
+        depth = int(self.repo.config.get("pack.depth") if depth is None else depth)
+        big_file_threshold = int(self.repo.config.get("core.big_file_threshold"))
+
+        loose = dict(iter_loose_objects(self.objects_dir))
+        old_packs = list(self.packs) if full else []
+        hashes = set(loose)
+        for pack in old_packs:
+            hashes.update(pack.index)
+
+        if not hashes:
+            return PackStats(None, 0, 0)
+
+        def sort_key(item):
+            obj_hash, obj_type, size = item
+            name = names.get(obj_hash, "")
+            return (obj_type, name.rsplit("/", 1)[-1], name, -size, obj_hash)
+
+        objects = sorted(
+            ((h,) + self._read_header(h) for h in hashes),
+            key=sort_key,
+        )
+        stats = PackStats(None, len(objects), 0)
+
+        def entries():
+            recent = deque(maxlen=max(window, 0))
+            for obj_hash, obj_type, size in objects:
+                if obj_type == "blob" and size > big_file_threshold:
+                    yield obj_hash, self._open_full_entry(obj_hash)
+                    continue
+                if obj_type != "blob" or window <= 0:
+                    yield obj_hash, self._full_entry(obj_hash)
+                    continue
+
+                data = self.load(obj_hash)
+                best = None
+                # Each base is indexed once, when it enters the window
+                for base_hash, base_data, base_depth, base_index in recent:
+                    if base_depth >= depth:
+                        continue
+                    delta = create_delta(base_data, data, base_index)
+                    if len(delta) < size // 2 and (best is None or len(delta) < len(best[1])):
+                        best = (base_hash, delta, base_depth + 1)
+
+                if best is None:
+                    yield obj_hash, self._full_entry(obj_hash)
+                    recent.append((obj_hash, data, 0, index_base(data)))
+                else:
+                    base_hash, delta, chain = best
+                    stats.deltas += 1
+                    yield obj_hash, (
+                        _encode_header("blob", size, "delta")
+                        + bytes.fromhex(base_hash)
+                        + zlib.compress(delta, self.compression_level)
+                    )
+                    recent.append((obj_hash, data, chain, index_base(data)))
+
+        stats.name = write_pack(self.pack_dir, entries(), self.durability != "none")
+
+        self._reload_packs()
+        for pack in old_packs:
+            if pack.path.stem == stats.name:
+                continue
+            pack.index.path.unlink()
+            pack.path.unlink()
+        for obj_path in loose.values():
+            obj_path.unlink()
+        for fan_dir in {p.parent for p in loose.values()}:
+            try:
+                fan_dir.rmdir()
+            except OSError:
+                pass  # new loose objects arrived meanwhile
+
+        return stats
+
+    def _full_entry(self, obj_hash: str) -> bytes:
+        """
+        Return a non-delta stored entry for an object, reusing the stored
+        bytes when possible.
+        """
+        raw = self._stored_entry(obj_hash)
+        header = _parse_header(raw)
+        if header is not None and header[2] != "delta":
+            return raw
+
+        obj_type, data = self.load_typed(obj_hash)
+        payload = _compress(data, self.compression, self.compression_level)
+        return _encode_header(obj_type, len(data), self.compression) + payload
+
+    def _open_full_entry(self, obj_hash: str) -> Union[bytes, BinaryIO]:
+        """
+        Like _full_entry, but return the stored entry as an open file when
+        it can be reused, so large objects are not read into memory.
+        """
+        f = self._open(obj_hash)
+        header = _parse_header(f.read(HEADER_PEEK))
+        if header is not None and header[2] != "delta":
+            f.seek(0)
+            return f
+        f.close()
+        return self._full_entry(obj_hash)
+
+    def migrate(self) -> int:
         """
-        return self._object_path(obj_hash).exists()
\ No newline at end of file
+        Rewrite legacy headerless objects in the current format.
+        Object hashes do not change. Returns the number of objects rewritten.
+        """
+        migrated = 0
+        if not self.objects_dir.exists():
+            return migrated
+
+        for obj_path in sorted(self.objects_dir.glob("??/*")):
+            if not obj_path.is_file() or obj_path.name.startswith("."):
+                continue  # skip in-flight temp files
+
+            raw = obj_path.read_bytes()
+            if _parse_header(raw) is not None:
+                continue
+
+            obj_type = _sniff_legacy_type(raw)
+            payload = _compress(raw, self.compression, self.compression_level)
+            header = _encode_header(obj_type, len(raw), self.compression)
+            atomic_write_bytes(obj_path, header + payload, self.durability != "none")
+            migrated += 1
+
+        return migrated
@@ -0,0 +1,196 @@
+"""
+Tree-to-tree diffs (commit vs commit, index vs HEAD) with rename detection.
+
+Changed paths come from trees.diff_trees, which never loads subtrees
+whose hashes are equal on both sides. Deleted and added files are then
+paired into renames: first exactly, by blob hash, then by content
+similarity, comparing chunk-hash fingerprints of the remaining
+candidates when there are no more than diff.rename_limit of them on
+each side.
+"""
+import io
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from .repo import Repository
+from .storage import ObjectStore
+from .objects import Blob, Commit
+from .index import Index
+from .commit import write_index_tree
+from .refs import resolve_commit
+from .trees import TreeChange, diff_trees
+from .linediff import diff_files, is_binary
+
+
+# Minimum similarity, in percent, for an inexact rename
+RENAME_THRESHOLD = 50
+# Binary content is fingerprinted in fixed-size chunks, text by line
+BINARY_CHUNK = 64
+
+
+@dataclass
+class FileChange:
+    """
+    status: "A" added, "D" deleted, "M" modified, "R" renamed.
+    """
+    status: str
+    old_path: Optional[str]
+    new_path: Optional[str]
+    old_hash: Optional[str]
+    new_hash: Optional[str]
+    similarity: int = 100
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path
+
+
+def _fingerprint(data: bytes) -> Dict[int, int]:
+    """
+    Map each chunk hash to the number of bytes in chunks with that hash.
+    """
+    if is_binary(data):
+        chunks = [data[i:i + BINARY_CHUNK] for i in range(0, len(data), BINARY_CHUNK)]
+    else:
+        chunks = data.splitlines(keepends=True)
+
+    counts: Dict[int, int] = {}
+    for chunk in chunks:
+        key = hash(chunk)
+        counts[key] = counts.get(key, 0) + len(chunk)
+    return counts
+
+
+def _similarity(old: Dict[int, int], new: Dict[int, int], old_size: int, new_size: int) -> int:
+    """
+    Percentage of the larger file made of chunks shared with the other.
+    """
+    if len(new) < len(old):
+        old, new = new, old
+    common = sum(min(size, new.get(key, 0)) for key, size in old.items())
+    return common * 100 // max(old_size, new_size, 1)
+
+
+def detect_renames(store: ObjectStore, changes: List[TreeChange], limit: int) -> List[FileChange]:
+    """
+    Turn tree changes into FileChanges, pairing deletions with additions.
+    """
+    result: List[FileChange] = []
+    deleted: Dict[str, str] = {}
+    added: Dict[str, str] = {}
+    for path, old_hash, new_hash in changes:
+        if old_hash and new_hash:
+            result.append(FileChange("M", path, path, old_hash, new_hash))
+        elif old_hash:
+            deleted[path] = old_hash
+        else:
+            added[path] = new_hash
+
+    # Exact renames: same blob hash
+    sources_by_hash: Dict[str, List[str]] = {}
+    for path, blob_hash in deleted.items():
+        sources_by_hash.setdefault(blob_hash, []).append(path)
+    for path, blob_hash in list(added.items()):
+        sources = sources_by_hash.get(blob_hash)
+        if sources:
+            source = sources.pop(0)
+            del deleted[source]
+            del added[path]
+            result.append(FileChange("R", source, path, blob_hash, blob_hash))
+
+    # Inexact renames, bounded by the candidate limit
+    if deleted and added and len(deleted) <= limit and len(added) <= limit:
+        sizes = {h: store.size_of(h) for h in set(deleted.values()) | set(added.values())}
+        fingerprints: Dict[str, Dict[int, int]] = {}
+
+        def fingerprint(blob_hash: str) -> Dict[int, int]:
+            if blob_hash not in fingerprints:
+                data = Blob.deserialize(store.load(blob_hash)).data
+                fingerprints[blob_hash] = _fingerprint(data)
+            return fingerprints[blob_hash]
+
+        candidates: List[Tuple[int, str, str]] = []
+        for source, old_hash in deleted.items():
+            for target, new_hash in added.items():
+                old_size, new_size = sizes[old_hash], sizes[new_hash]
+                if not old_size or not new_size:
+                    continue
+                # The size ratio bounds the best possible score
+                if min(old_size, new_size) * 100 < RENAME_THRESHOLD * max(old_size, new_size):
+                    continue
+                score = _similarity(fingerprint(old_hash), fingerprint(new_hash), old_size, new_size)
+                if score >= RENAME_THRESHOLD:
+                    candidates.append((score, source, target))
+
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+        for score, source, target in candidates:
+            if source in deleted and target in added:
+                result.append(FileChange("R", source, target, deleted.pop(source), added.pop(target), score))
+
+    result.extend(FileChange("D", path, None, h, None) for path, h in deleted.items())
+    result.extend(FileChange("A", None, path, None, h) for path, h in added.items())
+    result.sort(key=lambda c: c.path)
+    return result
+
+
+def _commit_tree(store: ObjectStore, commit_hash: Optional[str]) -> Optional[str]:
+    if not commit_hash:
+        return None
+    return Commit.read(store, commit_hash).tree
+
+
+def diff_commits(repo: Repository, old_rev: str, new_rev: str) -> List[FileChange]:
+    """
+    Changes between the trees of two commits (HEAD, branches or hashes).
+    """
+    store = ObjectStore(repo)
+    old_tree = _commit_tree(store, resolve_commit(repo, old_rev))
+    new_tree = _commit_tree(store, resolve_commit(repo, new_rev))
+    changes = list(diff_trees(store, old_tree, new_tree))
+    return detect_renames(store, changes, int(repo.config.get("diff.rename_limit")))
+
+
+def diff_index_vs_head(repo: Repository) -> List[FileChange]:
+    """
+    Staged changes: the index against the HEAD commit. The index tree
+    comes from its cache-tree, so only changed directories are compared.
+    """
+    store = ObjectStore(repo)
+    index = Index(repo)
+    index_tree = write_index_tree(index, store) if index.entries else None
+    head_tree = _commit_tree(store, repo.head_commit())
+    changes = list(diff_trees(store, head_tree, index_tree))
+    return detect_renames(store, changes, int(repo.config.get("diff.rename_limit")))
+
+
+def format_name_status(change: FileChange) -> str:
+    if change.status == "R":
+        return f"R{change.similarity:03d}\t{change.old_path}\t{change.new_path}"
+    return f"{change.status}\t{change.path}"
+
+
+def _open_blob(store: ObjectStore, blob_hash: Optional[str]) -> BinaryIO:
+    return store.open_object(blob_hash) if blob_hash else io.BytesIO()
+
+
+def format_change(store: ObjectStore, change: FileChange, context: int = 3) -> str:
+    """
+    Render a change as a git-style patch.
+    """
+    old_path = change.old_path or change.new_path
+    new_path = change.new_path or change.old_path
+    lines = [f"diff --git a/{old_path} b/{new_path}\n"]
+    if change.status == "A":
+        lines.append("new file\n")
+    elif change.status == "D":
+        lines.append("deleted file\n")
+    elif change.status == "R":
+        lines.append(f"similarity index {change.similarity}%\n")
+        lines.append(f"rename from {old_path}\n")
+        lines.append(f"rename to {new_path}\n")
+
+    if change.old_hash == change.new_hash:
+        return "".join(lines)  # exact rename
+    with _open_blob(store, change.old_hash) as old, _open_blob(store, change.new_hash) as new:
+        lines.append(diff_files(old, new, old_path, context, new_path))
+    return "".join(lines)
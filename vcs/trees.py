@@ -0,0 +1,133 @@
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from .storage import ObjectStore
+from .objects import Tree, TreeEntries, TreeEntry, entry_kind
+
+
+# (path, old blob hash or None, new blob hash or None)
+TreeChange = Tuple[str, Optional[str], Optional[str]]
+
+
+def _entries(store: ObjectStore, tree_hash: Optional[str]) -> Dict[str, TreeEntry]:
+    if tree_hash is None:
+        return {}
+    return Tree.read(store, tree_hash).entries
+
+
+def flatten_tree(
+    store: ObjectStore,
+    tree_hash: Optional[str],
+    prefix: str = "",
+    trees: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """
+    Return every blob under a tree as a flat mapping: "dir/file" -> blob hash.
+    If trees is given, it is filled with directory path -> tree hash
+    ("" for the root).
+    """
+    if trees is not None and tree_hash is not None:
+        trees[prefix[:-1]] = tree_hash
+
+    out: Dict[str, str] = {}
+    for name, entry in _entries(store, tree_hash).items():
+        path = prefix + name
+        if entry_kind(entry, store) == "tree":
+            out.update(flatten_tree(store, entry.hash, path + "/", trees))
+        else:
+            out[path] = entry.hash
+    return out
+
+
+def lookup_path(store: ObjectStore, tree_hash: Optional[str], path: str) -> Optional[str]:
+    """
+    Return the hash of the object at path inside a tree, or None.
+    Only the trees along the path are loaded.
+    """
+    for part in path.split("/"):
+        if tree_hash is None:
+            return None
+        entry = Tree.read(store, tree_hash).entries.get(part)
+        tree_hash = entry.hash if entry is not None else None
+    return tree_hash
+
+
+# (name, old entry or None, new entry or None)
+EntryChange = Tuple[str, Optional[TreeEntry], Optional[TreeEntry]]
+
+
+def changed_entries(old: Mapping[str, TreeEntry], new: Mapping[str, TreeEntry]) -> Iterator[EntryChange]:
+    """
+    Yield the entries that differ between two trees, in name order.
+    Encoded trees are merged record by record, so entries that did not
+    change are never decoded.
+    """
+    if not old or not new:
+        for name, entry in (old or new).items():
+            yield (name, entry, None) if old else (name, None, entry)
+        return
+
+    if not (isinstance(old, TreeEntries) and isinstance(new, TreeEntries)):
+        for name in sorted(old.keys() | new.keys()):
+            old_entry = old.get(name)
+            new_entry = new.get(name)
+            if old_entry is None or new_entry is None or old_entry.hash != new_entry.hash:
+                yield name, old_entry, new_entry
+        return
+
+    decode = TreeEntries.decode_record
+    old_records = old.records()
+    new_records = new.records()
+    old_item = next(old_records, None)
+    new_item = next(new_records, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            name, entry = decode(old_item[1])
+            yield name, entry, None
+            old_item = next(old_records, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            name, entry = decode(new_item[1])
+            yield name, None, entry
+            new_item = next(new_records, None)
+        else:
+            if old_item[1] != new_item[1]:
+                name, old_entry = decode(old_item[1])
+                new_entry = decode(new_item[1])[1]
+                if old_entry.hash != new_entry.hash:
+                    yield name, old_entry, new_entry
+            old_item = next(old_records, None)
+            new_item = next(new_records, None)
+
+
+def diff_trees(
+    store: ObjectStore,
+    old_hash: Optional[str],
+    new_hash: Optional[str],
+    prefix: str = "",
+) -> Iterator[TreeChange]:
+    """
+    Yield the blobs that differ between two trees, in path order.
+    Subtrees with identical hashes are skipped without being loaded.
+    A None tree hash stands for an empty tree.
+    """
+    if old_hash == new_hash:
+        return
+
+    for name, old_entry, new_entry in changed_entries(
+        _entries(store, old_hash), _entries(store, new_hash)
+    ):
+        path = prefix + name
+        old_kind = entry_kind(old_entry, store) if old_entry else None
+        new_kind = entry_kind(new_entry, store) if new_entry else None
+
+        old_blob = old_entry.hash if old_kind == "blob" else None
+        new_blob = new_entry.hash if new_kind == "blob" else None
+        if old_blob or new_blob:
+            yield path, old_blob, new_blob
+
+        if old_kind == "tree" or new_kind == "tree":
+            yield from diff_trees(
+                store,
+                old_entry.hash if old_kind == "tree" else None,
+                new_entry.hash if new_kind == "tree" else None,
+                path + "/",
+            )
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+# Values of core.durability:
+# - none: atomic renames only; a crash may lose recent writes
+# - batch: new objects are synced together at the end of each bulk
+#   operation, before anything refers to them
+# - full: every file is synced as soon as it is written
+DURABILITY_MODES = ("none", "batch", "full")
+
+
+def lstat_or_none(path) -> Optional[os.stat_result]:
+    """
+    Return the lstat result of path, or None if nothing is there: also
+    when one of its parent directories has been replaced by a file.
+    """
+    try:
+        return os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def fsync_dir(path: Path) -> None:
+    """
+    Flush a directory entry change (a create or rename) to disk.
+    Not every platform can open directories; there this does nothing.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_writer(path: Path, durable: bool = False) -> Iterator[BinaryIO]:
+    """
+    Open a temp file next to path for writing; on success it is renamed
+    over path, so readers see either the old or the new content, never a
+    partially written file. On error the temp file is removed.
+    With durable=True the data and the rename are also synced to disk
+    before returning.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    if durable:
+        fsync_dir(path.parent)
+
+
+def atomic_write_bytes(path: Path, data: bytes, durable: bool = False) -> None:
+    """
+    Write data to path atomically.
+    """
+    with atomic_writer(path, durable) as f:
+        f.write(data)
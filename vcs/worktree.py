@@ -0,0 +1,49 @@
+"""
+Working tree traversal.
+"""
+import os
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+
+from .repo import PYVCS_DIR
+
+
+# prune(rel_dir) -> True to skip a directory without descending into it
+Pruner = Callable[[str], bool]
+
+
+def iter_files(
+    root: Path,
+    prune: Optional[Pruner] = None,
+    prefix: str = "",
+) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    Yield (relative path, DirEntry) for every file under root, in the
+    sorted order of the full "dir/file" paths (the order of index keys).
+    Uses one scandir call per directory; repository metadata directories
+    and directories rejected by prune are never entered. Symlinked
+    directories are not followed.
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+    # Sort directories as "name/" so "a.txt" comes before "a/b"
+    keyed = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name == PYVCS_DIR:
+                continue
+            keyed.append((entry.name + "/", entry))
+        elif entry.is_file():
+            keyed.append((entry.name, entry))
+    keyed.sort(key=lambda item: item[0])
+
+    for key, entry in keyed:
+        rel_path = prefix + entry.name
+        if key[-1] != "/":
+            yield rel_path, entry
+        elif prune is None or not prune(rel_path):
+            yield from iter_files(Path(entry.path), prune, rel_path + "/")